@@ -0,0 +1,51 @@
+'''
+Set throughput of the descriptors in `import_customiser.typed`, against the
+equivalent `.type` descriptors in `import_customiser/types.type`
+
+Usage:
+python benchmarks/descriptor_set.py [COUNT]
+'''
+
+import sys
+from os.path import dirname
+from timeit import repeat
+
+sys.path.insert(0, dirname(dirname(__file__)))
+
+import import_customiser
+import_customiser.load(types=True)
+
+from import_customiser import typed, types
+from import_customiser.struct import Struct
+
+
+def make_user(module, slots: bool) -> type:
+    class User(Struct, slots=slots):
+        id = module.PositiveInteger()
+        score = module.NonNegativeFloat()
+        name = module.SizedString(minlen=1, maxlen=32)
+        email = module.SizedRegexString(maxlen=64, **{
+            'pattern' if module is typed else 'pat': r'[^@]+@[^@]+'})
+    return User
+
+
+def best(stmt: str, namespace: dict, count: int) -> float:
+    return min(repeat(stmt, globals=namespace, number=count, repeat=5)) / count
+
+
+def main(count: int = 100_000) -> None:
+    print(f'{"":28} {"construct (ns)":>15} {"p.email = v (ns)":>17} {"p.id = v (ns)":>14}')
+    for module in (types, typed):
+        for slots in (False, True):
+            User = make_user(module, slots)
+            user = User(1, 0.5, 'Bob', 'bob@example.com')
+            namespace = {'User': User, 'user': user}
+            label = f'{module.__name__.rpartition(".")[2]}{" slots" if slots else ""}'
+            construct = best('User(1, 0.5, "Bob", "bob@example.com")', namespace, count)
+            email = best('user.email = "bob@example.com"', namespace, count)
+            id_ = best('user.id = 2', namespace, count)
+            print(f'{label:28} {construct * 1e9:15.1f} {email * 1e9:17.1f} {id_ * 1e9:14.1f}')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,90 @@
+'''
+Start-up time of an application package whose modules use `from` and
+relative imports, imported eagerly, with `lazy=True` and with
+`lazy_from=True`
+
+The entry module imports every other module, and only a few are used
+
+Usage:
+python benchmarks/lazy_startup.py [MODULES]
+'''
+
+import subprocess
+import sys
+from os import mkdir
+from os.path import dirname, join
+from tempfile import TemporaryDirectory
+
+ROOT = dirname(dirname(__file__))
+
+MODULE = '''\
+from .mod{a} import function{a}
+from .mod{b} import Class{b}
+from . import mod{c}
+
+
+class Class{i}:
+{methods}
+
+
+def function{i}(x):
+    return x + {i}
+'''
+
+LEAF = '''\
+class Class{i}:
+{methods}
+
+
+def function{i}(x):
+    return x + {i}
+'''
+
+MAIN = '''\
+import sys
+from time import perf_counter
+sys.path.insert(0, {root!r})
+sys.path.insert(0, {path!r})
+start = perf_counter()
+import import_customiser
+import_customiser.load(**{options!r})
+from app.main import run
+run()
+print((perf_counter() - start) * 1000)
+'''
+
+
+def write_app(path: str, count: int) -> None:
+    app = join(path, 'app')
+    methods = '\n'.join(f'    def method{j}(self, x):\n        return x * {j}\n' for j in range(20))
+    mkdir(app)
+    with open(join(app, '__init__.py'), 'w'):
+        pass
+    for i in range(count):
+        if i < 3:
+            source = LEAF.format(i=i, methods=methods)
+        else:
+            source = MODULE.format(i=i, a=i - 1, b=i - 2, c=i - 3, methods=methods)
+        with open(join(app, f'mod{i}.py'), 'w') as f:
+            f.write(source)
+
+    imports = '\n'.join(f'from .mod{i} import function{i}' for i in range(count))
+    with open(join(app, 'main.py'), 'w') as f:
+        f.write(f'{imports}\n\n\ndef run():\n    return function{count - 1}(1)\n')
+
+
+def main(count: int = 300) -> None:
+    with TemporaryDirectory() as path:
+        write_app(path, count)
+        for label, options in (('eager', {}), ('lazy', {'lazy': True}), ('lazy_from', {'lazy_from': True})):
+            script = MAIN.format(root=ROOT, path=path, options=options)
+            times = []
+            for _ in range(5):
+                result = subprocess.run(
+                    [sys.executable, '-c', script], capture_output=True, text=True, check=True)
+                times.append(float(result.stdout))
+            print(f'{label:10} {min(times):8.1f} ms')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,61 @@
+'''
+Throughput of the module server when many workers boot at once, each
+fetching a directory's manifest and every module in it, or its bundle
+
+Usage:
+python benchmarks/module_server.py [WORKERS] [MODULES]
+'''
+
+import re
+import subprocess
+import sys
+import threading
+import time
+from http.client import HTTPConnection
+from os.path import dirname, join
+from tempfile import TemporaryDirectory
+
+ROOT = dirname(dirname(__file__))
+
+
+def boot(port: int, count: int, bundle: bool, results: list[int]) -> None:
+    conn = HTTPConnection('127.0.0.1', port, timeout=60)
+    paths = ['/__bundle__.zip'] if bundle else ['/'] + [f'/mod{i}.py' for i in range(count)]
+    received = 0
+    for path in paths:
+        conn.request('GET', path, headers={'Accept-Encoding': 'gzip'})
+        received += len(conn.getresponse().read())
+    conn.close()
+    results.append(received)
+
+
+def main(workers: int = 100, count: int = 50) -> None:
+    with TemporaryDirectory() as path:
+        for i in range(count):
+            with open(join(path, f'mod{i}.py'), 'w') as f:
+                f.write(f'VALUE = {i}\n' + ''.join(f'def function{j}(x):\n    return x * {j}\n' for j in range(20)))
+
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'import_customiser.server', path, '--bind', '127.0.0.1', '--port', '0', '--quiet'],
+            cwd=ROOT, stderr=subprocess.PIPE, text=True)
+        try:
+            port = int(re.search(r':(\d+)/', server.stderr.readline()).group(1))
+            for label, bundle in (('per file', False), ('bundle', True)):
+                results: list[int] = []
+                threads = [threading.Thread(target=boot, args=(port, count, bundle, results)) for _ in range(workers)]
+                start = time.perf_counter()
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                elapsed = time.perf_counter() - start
+                requests = workers * (1 if bundle else count + 1)
+                print(f'{label:10} {workers} workers in {elapsed * 1000:8.1f} ms, '
+                      f'{requests / elapsed:8.0f} requests/s, {sum(results) // workers:8} bytes each')
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,106 @@
+'''
+Time, connections and bytes taken to import modules from a local HTTP
+server, without a network cache, with an empty one, revalidating a full one,
+using a full one without revalidating, prefetching imports, and from a
+bundle
+
+Each module imports the next few, and the server counts the connections it
+accepts and the bytes of files it sends, and waits `LATENCY` milliseconds
+before each response
+
+Usage:
+python benchmarks/network_import.py [MODULES] [LATENCY]
+'''
+
+import subprocess
+import sys
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from os import listdir
+from os.path import dirname, join
+from tempfile import TemporaryDirectory
+
+ROOT = dirname(dirname(__file__))
+sys.path.insert(0, ROOT)
+
+from import_customiser.network_import import BUNDLE_NAME, write_bundle
+
+MAIN = '''\
+import sys
+from time import perf_counter
+sys.path.insert(0, {root!r})
+import import_customiser
+import_customiser.load(network=True, **{options!r})
+sys.path.append({url!r})
+start = perf_counter()
+import netmod0
+print((perf_counter() - start) * 1000)
+'''
+
+
+class Handler(SimpleHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Send headers and body together, rather than waiting on delayed ACKs
+    wbufsize = -1
+    connections = 0
+    sent = 0
+    latency = 0.0
+
+    def setup(self) -> None:
+        Handler.connections += 1
+        super().setup()
+
+    def do_GET(self) -> None:
+        time.sleep(self.latency)
+        if self.path.endswith('/'):
+            body = '\n'.join(listdir(self.directory)).encode()
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            Handler.sent += len(body)
+        else:
+            super().do_GET()
+
+    def copyfile(self, source, outputfile) -> None:
+        data = source.read()
+        outputfile.write(data)
+        Handler.sent += len(data)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+def main(count: int = 200, latency: float = 2) -> None:
+    Handler.latency = latency / 1000
+    with TemporaryDirectory() as path, TemporaryDirectory() as cache:
+        for i in range(count):
+            with open(join(path, f'netmod{i}.py'), 'w') as f:
+                f.write(''.join(f'import netmod{j}\n' for j in range(i * 4 + 1, min(i * 4 + 5, count))))
+                f.write(f'VALUE = {i}\n' + '# padding\n' * 50)
+
+        server = ThreadingHTTPServer(
+            ('127.0.0.1', 0), lambda *args: Handler(*args, directory=path))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f'http://127.0.0.1:{server.server_port}/'
+
+        for label, options in (
+                ('no cache', {}),
+                ('empty cache', {'network_cache': cache}),
+                ('revalidated', {'network_cache': cache}),
+                ('max_age', {'network_cache': cache, 'network_cache_max_age': 3600}),
+                ('prefetch', {'network_prefetch': True}),
+                ('bundle', {'network_bundles': True})):
+            if label == 'bundle':
+                write_bundle(path, join(path, BUNDLE_NAME))
+            Handler.connections = Handler.sent = 0
+            script = MAIN.format(root=ROOT, options=options, url=url)
+            result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True)
+            print(f'{label:12} {float(result.stdout):8.1f} ms {Handler.connections:4} connections '
+                  f'{Handler.sent:8} bytes')
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main(*(parse(arg) for parse, arg in zip((int, float), sys.argv[1:])))
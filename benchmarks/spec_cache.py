@@ -0,0 +1,66 @@
+'''
+Start-up time importing modules from the end of a long `sys.path`, without
+a spec cache, with a new one and with one saved by a previous run
+
+Usage:
+python benchmarks/spec_cache.py [DIRECTORIES] [FILES] [MODULES]
+'''
+
+import subprocess
+import sys
+from os import mkdir
+from os.path import dirname, join
+from tempfile import TemporaryDirectory
+
+ROOT = dirname(dirname(__file__))
+
+MAIN = '''\
+import sys
+from time import perf_counter
+sys.path.insert(0, {root!r})
+sys.path[1:1] = {dirs!r}
+start = perf_counter()
+import import_customiser
+import_customiser.load(**{options!r})
+for i in range({modules}):
+    __import__(f'target{{i}}')
+print((perf_counter() - start) * 1000)
+'''
+
+
+def write_path(path: str, directories: int, files: int, modules: int) -> list[str]:
+    dirs = []
+    for d in range(directories):
+        directory = join(path, f'dir{d}')
+        mkdir(directory)
+        dirs.append(directory)
+        for f in range(files):
+            open(join(directory, f'filler{d}_{f}.py'), 'w').close()
+
+    for i in range(modules):
+        with open(join(dirs[-1], f'target{i}.py'), 'w') as f:
+            f.write(f'VALUE = {i}\n')
+    return dirs
+
+
+def run(script: str) -> float:
+    result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True)
+    return float(result.stdout)
+
+
+def main(directories: int = 40, files: int = 300, modules: int = 200) -> None:
+    with TemporaryDirectory() as path:
+        dirs = write_path(path, directories, files, modules)
+        cache = join(path, 'specs.json')
+        plain = MAIN.format(root=ROOT, dirs=dirs, modules=modules, options={})
+        cached = MAIN.format(root=ROOT, dirs=dirs, modules=modules, options={'spec_cache': cache})
+
+        # Compile the modules first, so only finding them differs
+        run(plain)
+        print(f'{"no cache":16} {min(run(plain) for _ in range(5)):8.1f} ms')
+        print(f'{"new cache":16} {run(cached):8.1f} ms')
+        print(f'{"saved cache":16} {min(run(cached) for _ in range(5)):8.1f} ms')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,58 @@
+'''
+Memory and build time per row for a list of `Struct` instances and for a
+`StructArray` of the same rows
+
+Usage:
+python benchmarks/struct_array.py [COUNT]
+'''
+
+import sys
+import tracemalloc
+from os.path import dirname
+from time import perf_counter
+
+sys.path.insert(0, dirname(dirname(__file__)))
+
+import import_customiser
+import_customiser.load(types=True)
+
+from import_customiser.struct import Struct
+from import_customiser.struct_array import StructArray
+from import_customiser.types import Integer, PositiveFloat
+
+
+class Trade(Struct):
+    id = Integer()
+    quantity = Integer()
+    price = PositiveFloat()
+
+
+def measure(build, rows: list) -> tuple[float, float]:
+    start = perf_counter()
+    build(rows)
+    elapsed = perf_counter() - start
+
+    tracemalloc.start()
+    result = build(rows)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size / len(rows), elapsed / len(rows) * 1e9
+
+
+def main(count: int = 200_000) -> None:
+    rows = [(i, i % 100, 1.5 + i) for i in range(count)]
+    builds = {
+        'list[Trade]': lambda rows: [Trade(*row) for row in rows],
+        'StructArray': StructArray[Trade].from_rows,
+        'StructArray (unvalidated)': lambda rows: StructArray[Trade].from_rows(rows, validate=False),
+    }
+
+    print(f'{"":26} {"bytes/row":>10} {"build (ns/row)":>15}')
+    for name, build in builds.items():
+        size, elapsed = measure(build, rows)
+        print(f'{name:26} {size:10.1f} {elapsed:15.1f}')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
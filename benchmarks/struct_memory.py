@@ -0,0 +1,62 @@
+'''
+Memory per instance and attribute access time for `Struct`, with and
+without `slots=True`
+
+Usage:
+python benchmarks/struct_memory.py [COUNT]
+'''
+
+import sys
+import tracemalloc
+from os.path import dirname
+from timeit import repeat
+
+sys.path.insert(0, dirname(dirname(__file__)))
+
+import import_customiser
+import_customiser.load(types=True)
+
+from import_customiser.struct import Struct
+from import_customiser.types import Float, Integer
+
+
+class Point(Struct):
+    x = Integer()
+    y = Integer()
+    weight = Float()
+
+
+class SlottedPoint(Struct, slots=True):
+    x = Integer()
+    y = Integer()
+    weight = Float()
+
+
+def bytes_per_instance(cls: type, count: int) -> float:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    instances = [cls(i, i, 0.5) for i in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    # The list itself isn't part of the instances
+    return (after - before - sys.getsizeof(instances)) / len(instances)
+
+
+def ns_per_loop(stmt: str, number: int = 200_000, **globals) -> float:
+    return min(repeat(stmt, globals=globals, number=number, repeat=5)) / number * 1e9
+
+
+def main(count: int = 100_000) -> None:
+    print(f'{"":14} {"bytes/instance":>15} {"get (ns)":>9} {"set (ns)":>9} {"init (ns)":>10}')
+    for cls in (Point, SlottedPoint):
+        size = bytes_per_instance(cls, count)
+        p = cls(1, 2, 0.5)
+        get = ns_per_loop('p.x', p=p)
+        set_ = ns_per_loop('p.x = 3', p=p)
+        init = ns_per_loop('cls(1, 2, 0.5)', cls=cls)
+        print(f'{cls.__name__:14} {size:15.1f} {get:9.1f} {set_:9.1f} {init:10.1f}')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,60 @@
+'''
+Pickled size and round trip time per instance for lists of `Struct`
+instances, as sent to and from a `ProcessPoolExecutor`
+
+Usage:
+python benchmarks/struct_pickle.py [COUNT]
+'''
+
+import pickle
+import sys
+from os.path import dirname
+from time import perf_counter
+
+sys.path.insert(0, dirname(dirname(__file__)))
+
+import import_customiser
+import_customiser.load(types=True)
+
+from import_customiser.struct import Struct, StructBatch
+from import_customiser.types import Integer, PositiveFloat, String
+
+
+class Trade(Struct):
+    id = Integer()
+    quantity = Integer()
+    price = PositiveFloat()
+    symbol = String()
+
+
+class SlottedTrade(Struct, slots=True):
+    id = Integer()
+    quantity = Integer()
+    price = PositiveFloat()
+    symbol = String()
+
+
+def round_trip(obj) -> tuple[int, float]:
+    start = perf_counter()
+    data = pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+    pickle.loads(data)
+    return len(data), perf_counter() - start
+
+
+def main(count: int = 100_000) -> None:
+    print(f'{"":40} {"bytes/instance":>15} {"round trip (ns/instance)":>25}')
+    for cls in (Trade, SlottedTrade):
+        structs = [cls(i, i % 100, 1.5 + i, 'ABC') for i in range(count)]
+        cases = {
+            'list': structs,
+            'StructBatch': StructBatch(structs),
+            'StructBatch(trusted=True)': StructBatch(structs, trusted=True),
+        }
+        for name, obj in cases.items():
+            size, elapsed = min(round_trip(obj) for _ in range(3))
+            label = f'{cls.__name__} {name}'
+            print(f'{label:40} {size / count:15.1f} {elapsed / count * 1e9:25.1f}')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -15,7 +15,6 @@ limitations under the License.
 '''
 
 from collections import OrderedDict
-from functools import partial
 from typing import Callable, Union
 
 __all__ = []
@@ -47,16 +46,108 @@ class NoDuplicateOrderedDict(OrderedDict):
         return super().__setitem__(k, v)
 
 def load(**options):
-    get = partial(options.get, default=False)
-    if get('lazy'):
+    '''Load the requested parts of the package
+
+    Options:
+    - `lazy`: make imports lazy, including relative imports and submodules
+    imported with `from package import submodule`
+    - `lazy_from`: also make `from module import name` lazy in application
+    code, binding a proxy which loads the module when it's first used
+    (implies `lazy`)
+    - `lazy_profile`: a file to record the lazy modules loaded by this run
+    in, which are loaded in the background by the next run once the main
+    thread is idle (implies `lazy`)
+    - `prefetch_workers`: the number of threads which load the modules in
+    `lazy_profile` (2 by default)
+    - `spec_cache`: a file to cache where modules were found on the path in,
+    so that starting again in an unchanged environment doesn't search it
+    - `trace`: a file to write a trace of the time each module took to find,
+    read, parse, generate, compile and execute to at exit, as JSON with a
+    summary per module and Chrome trace events
+    - `trace_folded`: a file to write the same trace to at exit as folded
+    stacks, for flame graph tools
+    - `types`: enable importing `.type` files
+    - `structs`: enable importing `.struct` files (implies `types`)
+    - `cache`: the bytecode cache mode for generated code, one of
+    `'readwrite'` (the default), `'readonly'` or `'off'`
+    - `cache_invalidation`: `'timestamp'` (the default), `'checked-hash'` or
+    `'unchecked-hash'`
+    - `streaming`: generate `.type` and `.struct` modules element by element
+    as the file is parsed, for very large files
+    - `lazy_structs`: create the classes in `.struct` modules on first
+    access, rather than all of them when the module is imported
+    - `network`: enable importing modules from `http:` and `https:` URLs on
+    the path
+    - `pool_size`: the most connections open to each module host at once (4
+    by default)
+    - `pool_timeout`: seconds to wait for a module host (30 by default)
+    - `network_cache`: a directory to cache network modules and their
+    compiled code in, revalidating them with the server before they're used
+    - `network_cache_max_age`: seconds for which cached network modules are
+    used without revalidating them (0 by default)
+    - `network_cache_max_size`: bytes of network modules to keep cached,
+    evicting the least recently used (64 MiB by default)
+    - `network_offline`: use cached network modules, however old, when the
+    server can't be reached
+    - `network_bundles`: fetch each network path entry's modules in one
+    request, from the bundle `__bundle__.zip` at its URL where there is one
+    - `network_prefetch`: fetch the modules each network module imports
+    from the same server concurrently in the background
+    - `network_prefetch_workers`: the most modules prefetched at once (8 by
+    default), which is also limited by `pool_size`
+    '''
+
+    get = options.get
+    if get('spec_cache'):
+        from .spec_cache import install_spec_cache
+        install_spec_cache(get('spec_cache'))
+
+    if get('trace') or get('trace_folded'):
+        import atexit
+        from . import import_trace
+        import_trace.enable_trace()
+        if get('trace'):
+            atexit.register(import_trace.write_trace, get('trace'))
+        if get('trace_folded'):
+            atexit.register(import_trace.write_folded, get('trace_folded'))
+
+    if get('lazy') or get('lazy_from') or get('lazy_profile'):
         from . import lazy_import
+        if get('lazy_from'):
+            lazy_import.lazy_from = True
+        if get('lazy_profile'):
+            from . import prefetch
+            prefetch.prefetcher = prefetch.Prefetcher(get('lazy_profile'), get('prefetch_workers', 2))
     
+    from . import bytecode_cache
+    bytecode_cache.configure(get('cache'), get('cache_invalidation'))
+
     from . import descriptor
     from . import struct
     from . import import_utils
 
     if get('types') or get('structs'):
         from . import type_importer
+        if get('streaming'):
+            type_importer.TypeImporter.streaming = True
 
     if get('structs'):
         from . import struct_importer
+        if get('streaming'):
+            struct_importer.StructImporter.streaming = True
+        if get('lazy_structs'):
+            struct_importer.StructImporter.lazy = True
+
+    if get('network'):
+        from . import http_pool
+        from . import network_import
+        http_pool.configure(get('pool_size'), get('pool_timeout'))
+        if get('network_cache'):
+            from . import network_cache
+            network_cache.install_network_cache(
+                get('network_cache'), get('network_cache_max_age', 0),
+                get('network_cache_max_size', network_cache.MAX_SIZE), get('network_offline', False))
+        if get('network_bundles'):
+            network_import.use_bundles = True
+        if get('network_prefetch'):
+            network_import.start_network_prefetch(get('network_prefetch_workers', 8))
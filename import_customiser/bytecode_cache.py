@@ -0,0 +1,221 @@
+'''
+Copyright 2020 Jonathan Leeming
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+	http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+import sys
+from importlib.util import MAGIC_NUMBER, source_hash
+from marshal import dumps, loads
+from os import environ, getpid, makedirs, replace, stat, stat_result, unlink
+from os.path import basename, dirname, join
+from types import CodeType
+from typing import Callable, Optional
+
+from . import import_trace
+
+
+MODES = 'readwrite', 'readonly', 'off'
+'''Valid values for `mode`
+
+- `readwrite` loads cached code and writes it after a miss
+- `readonly` loads cached code but never writes, for read-only images
+- `off` ignores the cache entirely
+'''
+
+INVALIDATION_MODES = 'timestamp', 'checked-hash', 'unchecked-hash'
+'''Valid values for `invalidation_mode`, as in PEP 552'''
+
+mode: str = environ.get('IMPORT_CUSTOMISER_CACHE', 'readwrite')
+invalidation_mode: str = environ.get(
+    'IMPORT_CUSTOMISER_CACHE_INVALIDATION', 'timestamp')
+
+_FLAG_HASH = 0b01
+_FLAG_CHECK_SOURCE = 0b10
+_HEADER_SIZE = 16
+
+
+def configure(mode: Optional[str] = None, invalidation_mode: Optional[str] = None) -> None:
+    '''Set the cache mode and/or the invalidation mode for new cache files
+    '''
+
+    if mode is not None:
+        if mode not in MODES:
+            raise ValueError(f'Invalid cache mode: {mode!r}')
+        globals()['mode'] = mode
+    if invalidation_mode is not None:
+        if invalidation_mode not in INVALIDATION_MODES:
+            raise ValueError(
+                f'Invalid invalidation mode: {invalidation_mode!r}')
+        globals()['invalidation_mode'] = invalidation_mode
+
+
+def cache_from_source(filename: str, optimization: str = '') -> str:
+    '''Get the cache filename for the source at `filename`
+
+    Unlike `importlib.util.cache_from_source` the extension is kept, so
+    `types.type` and `types.py` in one directory don't share a cache file
+    '''
+
+    tag = sys.implementation.cache_tag
+    if tag is None:
+        raise NotImplementedError('sys.implementation.cache_tag is None')
+    if optimization:
+        tag += '.opt-' + optimization
+    return join(dirname(filename), '__pycache__', f'{basename(filename)}.{tag}.pyc')
+
+
+def _pack_header(flags: int, st: Optional[stat_result], source: bytes) -> bytes:
+    header = MAGIC_NUMBER + flags.to_bytes(4, 'little')
+    if flags & _FLAG_HASH:
+        return header + source_hash(source)
+    return header + \
+        (int(st.st_mtime) & 0xFFFFFFFF).to_bytes(4, 'little') + \
+        (st.st_size & 0xFFFFFFFF).to_bytes(4, 'little')
+
+
+def code_to_pyc(code: CodeType, st: stat_result, source: bytes, version: int = 0) -> bytes:
+    '''Serialise `code` with a PEP 552 style header
+
+    The upper bits of the flags word hold `version`, so that cache files
+    written by an older code generator are never loaded
+    '''
+
+    flags = version << 8
+    if invalidation_mode != 'timestamp':
+        flags |= _FLAG_HASH
+        if invalidation_mode == 'checked-hash':
+            flags |= _FLAG_CHECK_SOURCE
+    return _pack_header(flags, st, source) + dumps(code)
+
+
+def pyc_to_code(data: bytes, st: Optional[stat_result], get_source: Callable[[], bytes], version: int = 0) -> Optional[CodeType]:
+    '''Deserialise the code in `data` if it is still valid for the source
+
+    `get_source` is only called for checked-hash files
+    '''
+
+    if len(data) < _HEADER_SIZE or data[:4] != MAGIC_NUMBER:
+        return None
+
+    flags = int.from_bytes(data[4:8], 'little')
+    if flags >> 8 != version:
+        return None
+
+    if flags & _FLAG_HASH:
+        if flags & _FLAG_CHECK_SOURCE and source_hash(get_source()) != data[8:16]:
+            return None
+    elif data[8:16] != _pack_header(0, st, b'')[8:]:
+        return None
+
+    try:
+        code = loads(memoryview(data)[_HEADER_SIZE:])
+    except (EOFError, ValueError, TypeError):
+        return None
+
+    # Streamed modules are cached as a tuple of code objects, one per element
+    if isinstance(code, tuple) and all(isinstance(c, CodeType) for c in code):
+        return code
+    return code if isinstance(code, CodeType) else None
+
+
+def code_to_hash_pyc(code: CodeType, source: bytes, version: int = 0) -> bytes:
+    '''Serialise `code` with a checked-hash header, whatever the mode, for
+    code which is sent elsewhere rather than cached next to its source
+    '''
+    return _pack_header(version << 8 | _FLAG_HASH | _FLAG_CHECK_SOURCE, None, source) + dumps(code)
+
+
+def hash_pyc_to_code(data: bytes, source: bytes, version: int = 0) -> Optional[CodeType]:
+    '''Deserialise the code in the checked-hash `data` if it is valid for
+    `source`
+    '''
+
+    if int.from_bytes(data[4:8], 'little') & 0b11 != _FLAG_HASH | _FLAG_CHECK_SOURCE:
+        return None
+    return pyc_to_code(data, None, lambda: source, version)
+
+
+def write_pyc(cache: str, data: bytes) -> None:
+    '''Atomically write `data` to the cache file `cache`, ignoring errors
+    '''
+
+    tmp = f'{cache}.{getpid()}.tmp'
+    try:
+        makedirs(dirname(cache), exist_ok=True)
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        replace(tmp, cache)
+    except OSError:
+        # Unwritable directories are not an error, the same as for .pyc files
+        try:
+            unlink(tmp)
+        except OSError:
+            pass
+
+
+def get_code(
+    filename:       str,
+    source_to_code: Callable[[bytes, str], CodeType],
+    version:        int = 0,
+    optimization:   str = '',
+    file_to_code:   Optional[Callable[[str], CodeType]] = None
+) -> CodeType:
+    '''Get the code object for the source at `filename`
+
+    A valid cached code object is returned without reading the source (unless
+    it is checked-hash); otherwise `source_to_code` is called and, depending
+    on `mode`, its result is written to the cache.
+    `file_to_code`, if given, is called with `filename` instead of reading
+    the whole source for `source_to_code`
+    '''
+
+    source = None
+
+    def get_source() -> bytes:
+        nonlocal source
+        if source is None:
+            with import_trace.stage('read'), open(filename, 'rb') as f:
+                source = f.read()
+            import_trace.add_bytes(len(source))
+        return source
+
+    st = stat(filename)
+    cache = cache_from_source(filename, optimization)
+
+    if mode != 'off':
+        try:
+            with import_trace.stage('read'), open(cache, 'rb') as f:
+                data = f.read()
+        except OSError:
+            import_trace.cache_result(False)
+        else:
+            import_trace.add_bytes(len(data))
+            code = pyc_to_code(data, st, get_source, version)
+            import_trace.cache_result(code is not None)
+            if code is not None:
+                return code
+
+    if file_to_code is None:
+        source = get_source()
+        with import_trace.stage('generate'):
+            code = source_to_code(source, filename)
+    else:
+        with import_trace.stage('generate'):
+            code = file_to_code(filename)
+
+    if mode == 'readwrite' and not sys.dont_write_bytecode:
+        if invalidation_mode != 'timestamp':
+            get_source()
+        write_pyc(cache, code_to_pyc(code, st, source, version))
+    return code
@@ -0,0 +1,163 @@
+'''
+Copyright 2020 Jonathan Leeming
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+	http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+import sys
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from os import cpu_count, stat, walk
+from os.path import getmtime, join, splitext
+from typing import Iterable, Iterator, Optional, Sequence
+
+from . import bytecode_cache, load
+
+load(types=True, structs=True)
+
+from .import_utils import installed_importers
+
+
+def _find_sources(dirs: Iterable[str], extensions: Iterable[str]) -> Iterator[str]:
+    extensions = tuple('.' + ext for ext in extensions)
+    for dir_ in dirs:
+        for root, dirnames, filenames in walk(dir_):
+            dirnames[:] = sorted(d for d in dirnames if d != '__pycache__')
+            for filename in sorted(filenames):
+                if filename.endswith(extensions):
+                    yield join(root, filename)
+
+
+def _pyc_is_current(filename: str, version: int) -> bool:
+    try:
+        with open(bytecode_cache.cache_from_source(filename), 'rb') as f:
+            data = f.read()
+    except OSError:
+        return False
+
+    def get_source() -> bytes:
+        with open(filename, 'rb') as f:
+            return f.read()
+
+    return bytecode_cache.pyc_to_code(data, stat(filename), get_source, version) is not None
+
+
+def _py_is_current(filename: str, py_filename: str) -> bool:
+    try:
+        return getmtime(py_filename) >= getmtime(filename)
+    except OSError:
+        return False
+
+
+def _with_preamble(preamble: str, source: str) -> str:
+    # The generated code is on the lines of the schema it came from. The
+    # preamble takes the place of the blank lines at the start (the root
+    # element's) if there are enough of them, so it stays there
+    lines = preamble.count('\n')
+    if source.startswith('\n' * lines):
+        source = source[lines:]
+    return preamble + source
+
+
+def compile_file(filename: str, formats: Sequence[str] = ('pyc',), force: bool = False) -> Optional[str]:
+    '''Compile a single schema file
+
+    Returns the formats which were written, or `None` if it was up to date
+    '''
+
+    importer = installed_importers()[filename.rpartition('.')[2]]
+    py_filename = splitext(filename)[0] + '.py'
+
+    todo = [fmt for fmt in formats if force or not (
+        _pyc_is_current(filename, importer.cache_version) if fmt == 'pyc'
+        else _py_is_current(filename, py_filename))]
+    if not todo:
+        return None
+
+    st = stat(filename)
+    with open(filename, 'rb') as f:
+        data = f.read()
+
+    source = importer.generate_source(data)
+    if 'py' in todo:
+        with open(py_filename, 'w') as f:
+            f.write(_with_preamble(importer.preamble, source))
+    if 'pyc' in todo:
+        code = compile(source, filename, 'exec')
+        bytecode_cache.write_pyc(
+            bytecode_cache.cache_from_source(filename),
+            bytecode_cache.code_to_pyc(code, st, data, importer.cache_version))
+    return ', '.join(todo)
+
+
+def _compile_file(filename: str, formats: Sequence[str], force: bool, invalidation_mode: str) -> tuple[str, Optional[str], Optional[str]]:
+    # Runs in the worker processes, which may not have inherited the mode
+    bytecode_cache.configure(invalidation_mode=invalidation_mode)
+    try:
+        return filename, compile_file(filename, formats, force), None
+    except Exception as e:
+        return filename, None, f'{type(e).__name__}: {e}'
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    '''Ahead-of-time compiler for schema trees
+
+    Usage:
+    python -m import_customiser.compile [-j JOBS] [--format {pyc,py,both}] [-f] DIR...
+
+    `.pyc` output is written to `__pycache__`, where the importers load it
+    without parsing the schema (see `bytecode_cache`); `.py` output is
+    written next to each schema and imports the names the importer would
+    provide. Unchanged files are skipped unless `--force` is given.
+    '''
+
+    parser = ArgumentParser(
+        prog='python -m import_customiser.compile',
+        description='Pre-compile the schema files in a directory tree')
+    parser.add_argument('dirs', nargs='+', metavar='DIR')
+    parser.add_argument('-j', '--jobs', type=int, default=cpu_count() or 1,
+                        help='number of worker processes (default: all cores)')
+    parser.add_argument('--format', choices=('pyc', 'py', 'both'), default='pyc',
+                        help='what to generate (default: pyc)')
+    parser.add_argument('--invalidation-mode', choices=bytecode_cache.INVALIDATION_MODES,
+                        default=bytecode_cache.invalidation_mode)
+    parser.add_argument('-f', '--force', action='store_true',
+                        help='rebuild files which are up to date')
+    parser.add_argument('-q', '--quiet', action='store_true')
+    args = parser.parse_args(argv)
+
+    formats = ('pyc', 'py') if args.format == 'both' else (args.format,)
+    sources = list(_find_sources(args.dirs, installed_importers()))
+
+    worker = partial(_compile_file, formats=formats, force=args.force,
+                     invalidation_mode=args.invalidation_mode)
+    chunksize = max(1, len(sources) // (4 * max(1, args.jobs)))
+    errors = compiled = 0
+    with ProcessPoolExecutor(max(1, args.jobs)) as executor:
+        for filename, written, error in executor.map(worker, sources, chunksize=chunksize):
+            if error is not None:
+                errors += 1
+                print(f'{filename}: {error}', file=sys.stderr)
+            elif written is not None:
+                compiled += 1
+                if not args.quiet:
+                    print(f'Compiled {filename} ({written})')
+
+    if not args.quiet:
+        print(f'{compiled} compiled, {len(sources) - compiled - errors} up to date, {errors} failed')
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
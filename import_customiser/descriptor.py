@@ -14,17 +14,234 @@ See the License for the specific language governing permissions and
 limitations under the License.
 '''
 
-from typing import Any
+import ast
+import sys
+from array import array
+from functools import lru_cache
+from types import CodeType, FunctionType
+from typing import Any, Callable, Iterable, Optional
 from . import export
 
 
-def _make_setter(cls: type):
-    code = 'def __set_(self, instance, value):\n'
+def column_min(column):
+    '''The smallest value in `column`, for `column_code()`
+    '''
+    return column.min() if hasattr(column, 'min') else min(column)
+
+
+def column_max(column):
+    '''The largest value in `column`, for `column_code()`
+    '''
+    return column.max() if hasattr(column, 'max') else max(column)
+
+
+_ARRAY_TYPES = {**dict.fromkeys('bBhHiIlLqQ', int), 'f': float, 'd': float, 'u': str, 'w': str}
+_NUMPY_TYPES = {'b': bool, 'i': int, 'u': int, 'f': float, 'c': complex}
+
+
+def column_type(column) -> type:
+    '''The type of the values in `column` if it's an `array.array` or NumPy
+    array, or else `object`, for `column_code()`
+    '''
+    if isinstance(column, array):
+        return _ARRAY_TYPES.get(column.typecode, object)
+    dtype = getattr(column, 'dtype', None)
+    return _NUMPY_TYPES.get(dtype.kind, object) if dtype is not None else object
+
+
+@export
+class SchemaCode:
+    '''The lines of a `set_code()` or `column_code()` written in a schema,
+    and the line of it they start on
+
+    Calling it gives the lines, like the static methods it stands for. The
+    functions compiled from the lines are put on the same lines of the
+    schema file, so tracebacks through them point there
+    '''
+
+    __slots__ = 'filename', 'lineno', 'lines'
+
+    def __init__(self, lineno: int, lines: tuple[str, ...]) -> None:
+        # The file the class body using it was compiled from
+        self.filename = sys._getframe(1).f_code.co_filename
+        self.lineno = lineno
+        self.lines = lines
+
+    def __call__(self) -> tuple[str, ...]:
+        return self.lines
+
+
+Block = tuple[Optional[tuple[str, int]], tuple[str, ...]]
+'''Lines of code, and the file and line they start on if they came from a
+schema'''
+
+
+def code_blocks(cls: type, method: str = 'set_code') -> tuple[Block, ...]:
+    '''Get the lines of `method()` from every class in the MRO of `cls`
+    which defines it
+    '''
+
+    blocks = []
     for c in cls.__mro__:
-        if 'set_code' in c.__dict__:
-            for line in c.set_code():
-                code += '\t' + line + '\n'
-    return code
+        code = c.__dict__.get(method)
+        lines = tuple(getattr(c, method)()) if code is not None else ()
+        if lines:
+            location = (code.filename, code.lineno) if isinstance(code, SchemaCode) else None
+            blocks.append((location, lines))
+    return tuple(blocks)
+
+
+def set_lines(cls: type) -> list[str]:
+    '''Get the lines of `set_code()` from every class in the MRO of `cls`
+
+    They validate `value` for the descriptor `self` and `instance`
+    '''
+    return [line for _, lines in code_blocks(cls) for line in lines]
+
+
+def code_file(blocks: Iterable[Block], default: tuple[str, int] = ('<string>', 1)) -> tuple[str, int]:
+    '''Get the file to compile code made from `blocks` as, and the line it
+    starts on
+
+    That's the schema file the blocks from schemas came from, if there's just
+    the one, or else `default`
+    '''
+
+    locations = [location for location, _ in blocks if location is not None]
+    if len({filename for filename, _ in locations}) != 1:
+        return default
+    return locations[0]
+
+
+_LOCATION = 'lineno', 'col_offset', 'end_lineno', 'end_col_offset'
+
+
+def parse_block(block: Block, filename: str) -> list[ast.stmt]:
+    '''Parse the lines of `block`, on their lines of `filename` if they came
+    from there, or else without locations (so they're on the line of the
+    function they're put in)
+    '''
+
+    location, lines = block
+    if location is not None and location[0] == filename:
+        # Padded down to the line, which is quicker than moving the nodes
+        return ast.parse('\n' * (location[1] - 1) + '\n'.join(lines)).body
+
+    body = ast.parse('\n'.join(lines)).body
+    for stmt in body:
+        for node in ast.walk(stmt):
+            for attr in _LOCATION:
+                if hasattr(node, attr):
+                    delattr(node, attr)
+    return body
+
+
+def constant_names(cls: type) -> tuple[str, ...]:
+    '''Get the `constants` declared by every class in the MRO of `cls`
+    '''
+    names = dict.fromkeys(name for c in reversed(cls.__mro__)
+                          for name in c.__dict__.get('constants', ()))
+    return tuple(names)
+
+
+SETTER_CACHE_SIZE = 4096
+'''How many compiled `__set__` and `check_column` functions are kept, so
+descriptor classes with the same validation code share them'''
+
+
+def _located_code(make: Callable[..., CodeType], blocks: tuple[Block, ...], *args: Any) -> CodeType:
+    '''Get the code `make` compiles from `blocks`, in the file and on the
+    lines they came from
+
+    It's compiled with their lines relative to the first, and then moved, so
+    that classes with the same code share it wherever the code is
+    '''
+
+    filename, lineno = code_file(blocks)
+    located = [location is not None and location[0] == filename for location, _ in blocks]
+    offset = min((location[1] for (location, _), here in zip(blocks, located) if here), default=lineno) - 1
+    relative = tuple((('', location[1] - offset) if here else None, code)
+                     for (location, code), here in zip(blocks, located))
+    return _move_code(make(relative, lineno - offset, *args), filename, offset)
+
+
+def _move_code(code: CodeType, filename: str, offset: int) -> CodeType:
+    # Including the code of comprehensions and lambdas in it
+    consts = tuple(_move_code(const, filename, offset) if isinstance(const, CodeType) else const
+                   for const in code.co_consts)
+    return code.replace(co_filename=filename, co_firstlineno=code.co_firstlineno + offset, co_consts=consts)
+
+
+def _function_code(function: ast.FunctionDef, lineno: int) -> CodeType:
+    # Statements without lines of their own get the function's
+    function.lineno = function.end_lineno = lineno
+    function.body = function.body or [ast.Pass()]
+    code = compile(ast.fix_missing_locations(ast.Module([function], [])), '', 'exec')
+    return next(const for const in code.co_consts if isinstance(const, CodeType))
+
+
+@lru_cache(maxsize=SETTER_CACHE_SIZE)
+def _setter_code(blocks: tuple[Block, ...], lineno: int, store: tuple[str, ...]) -> CodeType:
+    '''def __set__(self, instance, value):
+        <set_code lines, from every class in the MRO>
+        <store_code lines>
+    '''
+
+    args = ast.arguments(
+        posonlyargs=[], args=[ast.arg(name) for name in ('self', 'instance', 'value')],
+        kwonlyargs=[], kw_defaults=[], defaults=[])
+    body = [stmt for block in blocks for stmt in parse_block(block, '')]
+    body += parse_block((None, store), '')
+    setter = ast.FunctionDef(name='__set__', args=args, body=body, decorator_list=[])
+    return _function_code(setter, lineno)
+
+
+@lru_cache(maxsize=SETTER_CACHE_SIZE)
+def _column_checker_code(blocks: tuple[Block, ...], lineno: int, vectorised: bool) -> CodeType:
+    '''def check_column(self, column):
+        <column_code lines, from every class in the MRO>
+
+    or, if a class in the MRO validates values but not columns:
+
+    def check_column(self, column):
+        instance = None
+        for value in column:
+            <set_code lines, from every class in the MRO>
+    '''
+
+    args = ast.arguments(
+        posonlyargs=[], args=[ast.arg('self'), ast.arg('column')],
+        kwonlyargs=[], kw_defaults=[], defaults=[])
+    body = [stmt for block in blocks for stmt in parse_block(block, '')]
+    if not vectorised:
+        body = [ast.Assign([ast.Name('instance', ast.Store())], ast.Constant(None)),
+                ast.For(ast.Name('value', ast.Store()), ast.Name('column', ast.Load()), body or [ast.Pass()], [])]
+
+    checker = ast.FunctionDef(name='check_column', args=args, body=body, decorator_list=[])
+    return _function_code(checker, lineno)
+
+
+def _make_function(cls: type, code: CodeType) -> FunctionType:
+    function = FunctionType(code, globals(), code.co_name)
+    function.__qualname__ = f'{cls.__qualname__}.{code.co_name}'
+    function.__module__ = cls.__module__
+    return function
+
+
+@export
+def setter_cache_info() -> dict[str, Any]:
+    '''Hits, misses and sizes of the caches of compiled descriptor methods
+    '''
+    return {'__set__': _setter_code.cache_info(),
+            'check_column': _column_checker_code.cache_info()}
+
+
+@export
+def setter_cache_clear() -> None:
+    '''Empty the caches of compiled descriptor methods
+    '''
+    _setter_code.cache_clear()
+    _column_checker_code.cache_clear()
 
 
 class DescriptorMeta(type):
@@ -34,21 +251,57 @@ class DescriptorMeta(type):
         if '__set__'  in clsdict:
             raise TypeError('Define the @staticmethod set_code(), not __set__()')
 
-        code = _make_setter(self)
-        exec(code, globals(), clsdict)
-        setattr(self, '__set__', clsdict['__set__'])
+        # Classes with the same lines, like most subclasses, share the code
+        blocks = code_blocks(self)
+        self.__set__ = _make_function(self, _located_code(_setter_code, blocks, tuple(self.store_code())))
+
+        classes = [c for c in self.__mro__ if 'set_code' in c.__dict__ or 'column_code' in c.__dict__]
+        if all('column_code' in c.__dict__ for c in classes):
+            code = _located_code(_column_checker_code, code_blocks(self, 'column_code'), True)
+        else:
+            code = _located_code(_column_checker_code, blocks, False)
+        self.check_column = _make_function(self, code)
 
 
 @export
 class Descriptor(metaclass=DescriptorMeta):
-    def __init__(self, name=None):
+    typecode: Optional[str] = None
+    '''The `array` typecode of a column of these values, if they have one'''
+    pack_format: Optional[str] = None
+    '''The `struct` format of these values in a binary record, if they have
+    one'''
+    constants: tuple[str, ...] = ()
+    '''Attributes used by `set_code()` which don't change once the descriptor
+    is made, so the code generated for a `Struct` binds their values once
+    rather than looking them up on every set'''
+
+    def __init__(self, name=None, pack_format=None):
         self.name = name
+        if pack_format is not None:
+            self.pack_format = pack_format
 
     @staticmethod
     def set_code():
+        '''Lines of code which validate `value`, run before `store_code()`
+        '''
+        return []
+
+    @staticmethod
+    def store_code():
+        '''Lines of code which store `value` on `instance`
+        '''
         return [
             'instance.__dict__[self.name] = value'
         ]
 
+    @staticmethod
+    def column_code():
+        '''Lines of code which validate all the values in `column` at once
+
+        Classes which define `set_code()` but not `column_code()` have their
+        columns validated value by value
+        '''
+        return []
+
     def __delete__(self, instance):
         raise AttributeError('Can\'t delete attributes')
@@ -0,0 +1,220 @@
+'''
+Copyright 2020 Jonathan Leeming
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+	http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Pooled, keep-alive HTTP connections for network imports
+
+Each host has a pool of up to `size` connections, which is shared by every
+finder and loader, so importing a package costs a few connections rather
+than one per module
+'''
+
+import gzip
+import ssl
+import zlib
+from http.client import HTTPConnection, HTTPException, HTTPMessage, HTTPSConnection
+from threading import BoundedSemaphore, Lock
+from typing import NamedTuple, Optional
+from urllib.parse import urljoin, urlsplit
+
+from . import export
+
+try:
+    import zstandard
+except ImportError:
+    # An optional dependency, without which responses are only gzipped
+    zstandard = None
+
+
+size: int = 4
+'''The most connections open to each host at once'''
+
+timeout: Optional[float] = 30.0
+'''Seconds to wait to connect to a host or for it to send data'''
+
+MAX_REDIRECTS = 5
+
+_REDIRECTS = 301, 302, 303, 307, 308
+
+# A connection which the server has closed since it was last used fails
+# like this on the next request, which is retried on a new connection
+_STALE = ConnectionResetError, BrokenPipeError, HTTPException
+
+ACCEPT_ENCODING = 'zstd, gzip' if zstandard is not None else 'gzip'
+
+_DECODE_ERRORS = (OSError, EOFError, zlib.error) + ((zstandard.ZstdError,) if zstandard is not None else ())
+
+
+def configure(pool_size: Optional[int] = None, pool_timeout: Optional[float] = None) -> None:
+    '''Set the size and/or timeout of pools created from now on
+    '''
+
+    if pool_size is not None:
+        if pool_size < 1:
+            raise ValueError(f'Invalid pool size: {pool_size!r}')
+        globals()['size'] = pool_size
+    if pool_timeout is not None:
+        globals()['timeout'] = pool_timeout
+
+
+class Response(NamedTuple):
+    status: int
+    headers: HTTPMessage
+    body: bytes
+    url: str
+
+
+@export
+class ConnectionPool:
+    '''Keep-alive connections to `host` (`host:port`) over `scheme`, of
+    which at most `size` are open at once
+    '''
+
+    def __init__(self, scheme: str, host: str, size: int = 4, timeout: Optional[float] = 30.0) -> None:
+        if scheme not in ('http', 'https'):
+            raise ValueError(f'Invalid scheme: {scheme!r}')
+        self.scheme = scheme
+        self.host = host
+        self.timeout = timeout
+        self.connections = 0
+        self._idle: list[HTTPConnection] = []
+        self._lock = Lock()
+        self._slots = BoundedSemaphore(size)
+
+    def _connect(self) -> HTTPConnection:
+        if self.scheme == 'https':
+            return HTTPSConnection(self.host, timeout=self.timeout, context=ssl.create_default_context())
+        return HTTPConnection(self.host, timeout=self.timeout)
+
+    def request(self, method: str, path: str, headers: Optional[dict[str, str]] = None) -> tuple[int, HTTPMessage, bytes]:
+        '''Send a request, and read the whole response on a pooled connection
+        '''
+
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError(f'No connection to {self.host} became free')
+        try:
+            while True:
+                with self._lock:
+                    reused = bool(self._idle)
+                    conn = self._idle.pop() if reused else None
+                    self.connections += not reused
+                if conn is None:
+                    conn = self._connect()
+                try:
+                    conn.request(method, path, headers=headers or {})
+                    response = conn.getresponse()
+                    body = response.read()
+                except _STALE:
+                    conn.close()
+                    if reused:
+                        continue
+                    raise
+                except BaseException:
+                    conn.close()
+                    raise
+
+                if response.will_close:
+                    conn.close()
+                else:
+                    with self._lock:
+                        self._idle.append(conn)
+                return response.status, response.headers, body
+        finally:
+            self._slots.release()
+
+    def close(self) -> None:
+        '''Close the idle connections
+        '''
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+_pools: dict[tuple[str, str], ConnectionPool] = {}
+_pools_lock = Lock()
+
+
+def _decode(body: bytes, encoding: Optional[str]) -> bytes:
+    if not encoding or encoding == 'identity':
+        return body
+    if encoding == 'gzip':
+        return gzip.decompress(body)
+    if encoding == 'zstd' and zstandard is not None:
+        return zstandard.ZstdDecompressor().decompressobj().decompress(body)
+    raise HTTPException(f'Unsupported content encoding: {encoding}')
+
+
+def get_pool(scheme: str, host: str) -> ConnectionPool:
+    '''The shared pool for `host` over `scheme`
+    '''
+
+    key = scheme, host
+    try:
+        return _pools[key]
+    except KeyError:
+        with _pools_lock:
+            if key not in _pools:
+                _pools[key] = ConnectionPool(scheme, host, size, timeout)
+            return _pools[key]
+
+
+def close_pools() -> None:
+    '''Close every pool's idle connections, and forget the pools
+    '''
+
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+def request(url: str, headers: Optional[dict[str, str]] = None, method: str = 'GET') -> Response:
+    '''Request `url` through the shared pools, following redirects, and
+    decompress the body
+    '''
+
+    headers = {'Accept-Encoding': ACCEPT_ENCODING, **(headers or {})}
+    for _ in range(MAX_REDIRECTS + 1):
+        parts = urlsplit(url)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        status, response_headers, body = get_pool(parts.scheme, parts.netloc).request(method, path, headers)
+
+        location = response_headers.get('Location')
+        if status not in _REDIRECTS or location is None:
+            try:
+                body = _decode(body, response_headers.get('Content-Encoding'))
+            except _DECODE_ERRORS as e:
+                raise HTTPException(f'Invalid response body: {e}') from e
+            return Response(status, response_headers, body, url)
+        url = urljoin(url, location)
+        if status == 303:
+            method = 'GET'
+    raise ImportError(f'Too many redirects from {url}')
+
+
+def get(url: str) -> bytes:
+    '''The body of `url`, raising ImportError unless the request succeeds
+    '''
+
+    try:
+        response = request(url)
+    except (OSError, HTTPException) as e:
+        raise ImportError(f'Cannot fetch {url}: {e}') from e
+    if response.status != 200:
+        raise ImportError(f'Cannot fetch {url}: HTTP {response.status}')
+    return response.body
@@ -0,0 +1,326 @@
+'''
+Copyright 2020 Jonathan Leeming
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+	http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Import-time tracing, like `python -X importtime` but split into the stages
+of the custom importers: find, read (or fetch), parse, generate, compile and
+exec, with the bytes read and bytecode cache hits and misses
+
+Usage:
+import_customiser.load(structs=True, trace='imports.json', trace_folded='imports.folded')
+
+The JSON file has a summary per module, and `traceEvents` for
+chrome://tracing or Perfetto. The folded file is the input format of
+flamegraph.pl and speedscope. While tracing is disabled, each hook costs a
+function call
+'''
+
+import json
+import sys
+import threading
+from collections import deque
+from os import getpid
+from time import perf_counter_ns
+from typing import Any, Iterator, Optional
+
+from . import export
+
+
+STAGES = 'find', 'read', 'fetch', 'parse', 'generate', 'compile', 'exec'
+'''The stages of an import which are timed'''
+
+MAX_ROOTS = 10000
+'''How many spans outside any other (modules imported from application
+code, and finds) are kept. Older ones are forgotten, so that tracing a
+long-running process doesn't use ever more memory'''
+
+enabled = False
+
+_local = threading.local()
+_roots: deque['_Frame'] = deque(maxlen=MAX_ROOTS)
+_origin = perf_counter_ns()
+
+
+class _Frame:
+    '''A timed span: a module, one of `STAGES` of the module it's in, or
+    finding the module `name`
+    '''
+
+    __slots__ = ('kind', 'name', 'start', 'end', 'children', 'bytes', 'cache', 'thread')
+
+    def __init__(self, kind: str, name: str) -> None:
+        self.kind = kind
+        self.name = name
+        self.start = perf_counter_ns()
+        self.end = self.start
+        self.children: list[_Frame] = []
+        self.bytes = 0
+        self.cache: Optional[str] = None
+        self.thread = threading.get_ident()
+
+    @property
+    def duration(self) -> int:
+        return self.end - self.start
+
+    @property
+    def self_time(self) -> int:
+        return self.duration - sum(child.duration for child in self.children)
+
+    @property
+    def label(self) -> str:
+        return f'find {self.name}' if self.kind == 'find' else self.name
+
+
+def _stack() -> list[_Frame]:
+    try:
+        return _local.stack
+    except AttributeError:
+        stack = _local.stack = []
+        return stack
+
+
+class _Span:
+    __slots__ = ('frame',)
+
+    def __init__(self, frame: _Frame) -> None:
+        self.frame = frame
+
+    def __enter__(self) -> _Frame:
+        stack = _stack()
+        if stack:
+            stack[-1].children.append(self.frame)
+        else:
+            _roots.append(self.frame)
+        stack.append(self.frame)
+        return self.frame
+
+    def __exit__(self, *_) -> None:
+        self.frame.end = perf_counter_ns()
+        _stack().pop()
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *_) -> None:
+        pass
+
+
+_NULL = _NullSpan()
+
+
+def module(name: str) -> Any:
+    '''Time loading the module `name`, unless it's already being timed
+    '''
+
+    if not enabled:
+        return _NULL
+    frame = _current_module()
+    if frame is not None and frame.name == name:
+        return _NULL
+    return _Span(_Frame('module', name))
+
+
+def stage(name: str) -> Any:
+    '''Time one of `STAGES` of the module being loaded
+    '''
+    return _Span(_Frame('stage', name)) if enabled else _NULL
+
+
+def _current_module() -> Optional[_Frame]:
+    for frame in reversed(_stack()):
+        if frame.kind == 'module':
+            return frame
+    return None
+
+
+def add_bytes(count: int) -> None:
+    '''Count bytes read for the module being loaded
+    '''
+    if enabled:
+        frame = _current_module()
+        if frame is not None:
+            frame.bytes += count
+
+
+def cache_result(hit: bool) -> None:
+    '''Record whether the module being loaded had valid cached bytecode
+    '''
+    if enabled:
+        frame = _current_module()
+        if frame is not None:
+            frame.cache = 'hit' if hit else 'miss'
+
+
+class _TimingFinder:
+    '''Wraps a meta path finder while tracing, so that the time it takes to
+    find each module is recorded
+
+    Everything else, such as `find_distributions`, is forwarded to the
+    finder, which the wrapper compares equal to so that code looking for it
+    in `sys.meta_path` still finds it
+    '''
+
+    def __init__(self, finder: Any) -> None:
+        self.finder = finder
+
+    def find_spec(self, name: str, path: Any = None, target: Any = None) -> Any:
+        find = getattr(self.finder, 'find_spec', None)
+        if find is None:
+            return None
+        with _Span(_Frame('find', name)) if enabled else _NULL:
+            return find(name, path, target)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.finder, name)
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, _TimingFinder):
+            other = other.finder
+        return self.finder == other
+
+    def __hash__(self) -> int:
+        return hash(self.finder)
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({self.finder!r})'
+
+
+@export
+def enable_trace() -> None:
+    '''Start tracing imports
+    '''
+
+    global enabled
+    enabled = True
+    for i, finder in enumerate(sys.meta_path):
+        if not isinstance(finder, _TimingFinder):
+            sys.meta_path[i] = _TimingFinder(finder)
+
+
+@export
+def disable_trace() -> None:
+    '''Stop tracing imports, keeping what was recorded
+    '''
+
+    global enabled
+    enabled = False
+    for i, finder in enumerate(sys.meta_path):
+        if isinstance(finder, _TimingFinder):
+            sys.meta_path[i] = finder.finder
+
+
+def clear() -> None:
+    '''Forget everything recorded
+    '''
+    _roots.clear()
+
+
+def _walk(frames: list[_Frame], path: tuple[_Frame, ...] = ()) -> Iterator[tuple[_Frame, ...]]:
+    for frame in frames:
+        yield path + (frame,)
+        yield from _walk(frame.children, path + (frame,))
+
+
+def _us(ns: int) -> float:
+    return round(ns / 1000, 1)
+
+
+def _module_summary(frame: _Frame, finds: dict[str, int]) -> dict[str, Any]:
+    stages = dict.fromkeys(STAGES, 0)
+    stages['find'] = finds.get(frame.name, 0)
+
+    # Stages within this module, but not within modules it imports
+    pending = list(frame.children)
+    while pending:
+        child = pending.pop()
+        if child.kind == 'stage':
+            stages[child.name] = stages.get(child.name, 0) + child.self_time
+            pending.extend(child.children)
+
+    return {
+        'module': frame.name,
+        'thread': frame.thread,
+        'start_us': _us(frame.start - _origin),
+        'duration_us': _us(frame.duration),
+        **{f'{name}_us': _us(ns) for name, ns in stages.items()},
+        'bytes_read': frame.bytes,
+        'cache': frame.cache,
+    }
+
+
+def summary() -> list[dict[str, Any]]:
+    '''A summary of each module loaded, in the order they started loading
+    '''
+
+    finds: dict[str, int] = {}
+    modules = []
+    for path in _walk(list(_roots)):
+        frame = path[-1]
+        if frame.kind == 'find':
+            finds[frame.name] = finds.get(frame.name, 0) + frame.duration
+        elif frame.kind == 'module':
+            modules.append(frame)
+    modules.sort(key=lambda frame: frame.start)
+    return [_module_summary(frame, finds) for frame in modules]
+
+
+def trace_events() -> list[dict[str, Any]]:
+    '''The recorded spans in the Trace Event Format
+    '''
+
+    pid = getpid()
+    events = []
+    for path in _walk(list(_roots)):
+        frame = path[-1]
+        args: dict[str, Any] = {}
+        if frame.kind == 'module':
+            args = {'bytes_read': frame.bytes, 'cache': frame.cache}
+        events.append({
+            'name': frame.label, 'cat': frame.kind, 'ph': 'X', 'pid': pid, 'tid': frame.thread,
+            'ts': (frame.start - _origin) / 1000, 'dur': frame.duration / 1000, 'args': args})
+    return events
+
+
+def folded() -> list[str]:
+    '''The self time of each stack of spans, in microseconds, as lines of
+    `parent;child value`
+    '''
+
+    totals: dict[str, int] = {}
+    for path in _walk(list(_roots)):
+        key = ';'.join(frame.label.replace(';', ':') for frame in path)
+        totals[key] = totals.get(key, 0) + path[-1].self_time
+    return [f'{stack} {ns // 1000}' for stack, ns in totals.items() if ns >= 1000]
+
+
+@export
+def write_trace(filename: str) -> None:
+    '''Write the module summaries and trace events to the JSON file
+    `filename`
+    '''
+    with open(filename, 'w') as f:
+        json.dump({'modules': summary(), 'traceEvents': trace_events()}, f)
+
+
+@export
+def write_folded(filename: str) -> None:
+    '''Write the stacks in the folded format of flame graph tools to
+    `filename`
+    '''
+    with open(filename, 'w') as f:
+        f.writelines(line + '\n' for line in folded())
@@ -14,28 +14,187 @@ See the License for the specific language governing permissions and
 limitations under the License.
 '''
 
-from os.path import exists, join
-from sys import meta_path, modules
-from sys import path as sys_path
-from types import ModuleType
+import pkgutil
+from importlib.abc import Loader
+from importlib.machinery import ModuleSpec
+from importlib.util import spec_from_file_location
+from os import listdir, stat
+from os.path import isdir, join
+from sys import modules, path_hooks, path_importer_cache
+from types import CodeType, ModuleType
+from typing import Any, Callable, Optional, Union
 
-from . import export
+from . import bytecode_cache, export, import_trace
 
 
-class ImportLoader:
-    def __init__(self, filename: str, populate_module: function[[ModuleType, str], ModuleType]) -> None:
+_importers: dict[str, type['ImportBase']] = {}
+'''The installed importers, by extension, in order of priority'''
+
+
+class _DirectoryIndex:
+    '''A cached listing of a directory
+
+    The listing is refreshed when the directory's mtime changes, so a lookup
+    costs one `stat` instead of one per candidate file. Entries with an
+    installed extension are indexed by module name, so the cost of a lookup
+    doesn't depend on the number of extensions
+    '''
+
+    def __init__(self, path: str) -> None:
+        self.path = path or '.'
+        self._mtime = None
+        self._modules: dict[str, str] = {}
+
+    def find(self, name: str) -> Optional[str]:
+        '''Get the filename of the module `name` in this directory, if any
+        '''
+        return self._refresh().get(name)
+
+    def modules(self) -> dict[str, str]:
+        '''Get the filenames of the modules in this directory, by name
+        '''
+        return dict(self._refresh())
+
+    def _refresh(self) -> dict[str, str]:
+        try:
+            mtime = stat(self.path).st_mtime
+        except OSError:
+            mtime = -1
+
+        if mtime != self._mtime:
+            try:
+                entries = listdir(self.path)
+            except OSError:
+                entries = []
+
+            # Lowest priority first, so that higher priorities overwrite it
+            priority = {ext: i for i, ext in enumerate(_importers)}
+            entries = (e for e in entries if e.rpartition('.')[2] in priority)
+            entries = sorted(entries, key=lambda e: priority[e.rpartition('.')[2]], reverse=True)
+            self._modules = {entry.rpartition('.')[0]: entry for entry in entries}
+            self._mtime = mtime
+
+        return self._modules
+
+    def invalidate(self) -> None:
+        self._mtime = None
+
+
+_directory_indices: dict[str, _DirectoryIndex] = {}
+
+
+@export
+def installed_importers() -> dict[str, type['ImportBase']]:
+    '''Get the installed importers, by extension
+    '''
+    return dict(_importers)
+
+
+def _get_directory_index(path: str) -> _DirectoryIndex:
+    try:
+        return _directory_indices[path]
+    except KeyError:
+        index = _directory_indices[path] = _DirectoryIndex(path)
+        return index
+
+
+class ImportLoader(Loader):
+    def __init__(self, filename: str, populate_module: Callable[[ModuleType, str], ModuleType]) -> None:
         self._filename = filename
         self.populate_module = populate_module
 
-    def load_module(self, fullname: str):
-        if fullname in modules:
-            return modules[fullname]
+    def create_module(self, spec: ModuleSpec) -> None:
+        return None
+
+    def exec_module(self, module: ModuleType) -> None:
+        with import_trace.module(module.__name__):
+            mod = self.populate_module(module, self._filename)
+        if mod is not module:
+            modules[module.__name__] = mod
+
+    def get_filename(self, fullname: str) -> str:
+        return self._filename
+
+
+class _ExtensionFinder:
+    '''Path entry finder for every installed extension
+
+    Wraps the finder the other path hooks create for the same directory, so
+    that Python modules are still found first and as usual
+    '''
+
+    def __init__(self, path: str, fallback) -> None:
+        self.path = path
+        self.fallback = fallback
+        self._index = _get_directory_index(path)
+        self._misses: set[str] = set()
 
-        mod = modules.setdefault(fullname, ModuleType(fullname))
-        mod.__file__ = self._filename
-        mod.__loader__ = self
-        mod = self.populate_module(mod, self._filename)
-        return mod
+    def __getattr__(self, name: str):
+        return getattr(self.fallback, name)
+
+    def find_spec(self, fullname: str, target: Optional[ModuleType] = None) -> Optional[ModuleSpec]:
+        spec = None
+        if self.fallback is not None:
+            spec = self.fallback.find_spec(fullname, target)
+            # A bare directory is only a namespace package if no module of
+            # the same name is found, as for `.py` files
+            if spec is not None and spec.loader is not None:
+                return spec
+
+        # Misses are remembered until the caches are invalidated, so files
+        # created at runtime need importlib.invalidate_caches(), as for the
+        # standard finders
+        if fullname in self._misses:
+            return spec
+
+        basename = self._index.find(fullname.rpartition('.')[2])
+        if basename is None:
+            self._misses.add(fullname)
+            return spec
+
+        importer = _importers[basename.rpartition('.')[2]]
+        filename = join(self.path, basename)
+        loader = ImportLoader(filename, importer.populate_module)
+        return spec_from_file_location(fullname, filename, loader=loader)
+
+    def invalidate_caches(self) -> None:
+        '''Called by `importlib.invalidate_caches()`
+        '''
+        self._index.invalidate()
+        self._misses.clear()
+        if self.fallback is not None:
+            self.fallback.invalidate_caches()
+
+
+def _iter_finder_modules(finder: _ExtensionFinder, prefix: str = ''):
+    # For pkgutil.iter_modules(), which only knows the standard finders
+    seen = set()
+    if finder.fallback is not None:
+        for name, ispkg in pkgutil.iter_importer_modules(finder.fallback, prefix):
+            seen.add(name)
+            yield name, ispkg
+    for name in sorted(finder._index.modules()):
+        if name.isidentifier() and prefix + name not in seen:
+            yield prefix + name, False
+
+
+pkgutil.iter_importer_modules.register(_ExtensionFinder, _iter_finder_modules)
+
+
+def _path_hook(path: str) -> _ExtensionFinder:
+    if not isinstance(path, str) or not isdir(path or '.'):
+        raise ImportError('Only directories are supported')
+
+    fallback = None
+    for hook in path_hooks:
+        if hook is _path_hook:
+            continue
+        try:
+            fallback = hook(path)
+        except ImportError:
+            continue
+        break
+    return _ExtensionFinder(path, fallback)
 
 
 @export
@@ -50,21 +209,73 @@ class ImportBase:
             def populate_module(module: ModuleType, filename: str) -> ModuleType:
                     # Do something to populate the module
                     return module
+
+    Foo.install()
+
+    Importers which generate Python code should instead override
+    `generate_source` and execute `get_code(filename)` in `populate_module`,
+    so that the generated code is cached in `__pycache__`. Names which
+    `populate_module` adds to the module before executing it should be
+    imported by `preamble`, for standalone `.py` files
     '''
 
     extension: str = ''
+    cache_version: int = 0
+    preamble: str = ''
+    streaming: bool = False
+    '''Generate code element by element with `stream_to_code`, for very large
+    files'''
 
     @classmethod
-    def find_module(cls, fullname, path=None):
-        for dirname in sys_path:
-            filename = join(dirname, fullname + '.' + cls.extension)
-            if exists(filename):
-                return ImportLoader(filename, cls.populate_module)
-        return None
+    def install(cls):
+        '''Register this importer with the shared path entry finder
+
+        All installed extensions are found in a single pass over `sys.path`
+        '''
+
+        _importers[cls.extension] = cls
+        if _path_hook not in path_hooks:
+            path_hooks.insert(0, _path_hook)
+
+        for path, finder in list(path_importer_cache.items()):
+            if isinstance(finder, _ExtensionFinder):
+                finder.invalidate_caches()
+            else:
+                del path_importer_cache[path]
 
     @classmethod
-    def install(cls):
-        meta_path.append(cls)
+    def get_code(cls, filename: str) -> CodeType:
+        '''Get the (possibly cached) code object for `filename`
+        '''
+        file_to_code = cls.stream_to_code if cls.streaming else None
+        return bytecode_cache.get_code(
+            filename, cls.source_to_code, cls.cache_version, file_to_code=file_to_code)
+
+    @staticmethod
+    def exec_code(code: Union[CodeType, tuple[CodeType, ...]], namespace: dict[str, Any]) -> None:
+        '''Execute code from `get_code`, which is a tuple for streamed files
+        '''
+
+        with import_trace.stage('exec'):
+            for c in code if isinstance(code, tuple) else (code,):
+                exec(c, namespace, namespace)
+
+    @classmethod
+    def generate_source(cls, data: bytes) -> str:
+        '''Generate the Python source of a module from the file's contents
+        '''
+        raise NotImplementedError(f'{cls.__name__} doesn\'t generate Python source')
+
+    @classmethod
+    def source_to_code(cls, data: bytes, filename: str) -> CodeType:
+        source = cls.generate_source(data)
+        with import_trace.stage('compile'):
+            return compile(source, filename, 'exec')
+
+    @classmethod
+    def stream_to_code(cls, filename: str) -> Union[CodeType, tuple[CodeType, ...]]:
+        with open(filename, 'rb') as f:
+            return cls.source_to_code(f.read(), filename)
 
     @staticmethod
     def populate_module(module: ModuleType, filename: str) -> ModuleType:
@@ -1,11 +1,17 @@
 
 import builtins
+import threading
 from functools import partial
-from importlib.machinery import ModuleSpec
-from importlib.util import find_spec
-from sys import modules
+from importlib.machinery import ExtensionFileLoader, ModuleSpec
+from importlib import import_module
+from importlib.util import find_spec, resolve_name
+from os.path import dirname
+from sys import meta_path, modules
+from sysconfig import get_path
 from types import ModuleType
-from typing import Any, Mapping, Sequence, Union
+from typing import Any, Mapping, Optional, Sequence, Union
+
+from . import import_trace
 
 original_import = __import__
 
@@ -15,6 +21,13 @@ class _Module(ModuleType):
 
 
 class _LazyModule(_Module):
+    '''A module which is executed, in place, when it's first used
+
+    Like `importlib.util.LazyLoader`, execution holds a lock for the module,
+    so the module runs exactly once however many threads use it, and no
+    thread sees it half-executed
+    '''
+
     def __init__(self, spec: ModuleSpec) -> None:
         super().__init__(spec.name)
         self.__file__ = spec.origin
@@ -23,11 +36,325 @@ class _LazyModule(_Module):
         self.__path__ = spec.submodule_search_locations
         self.__spec__ = spec
 
-    def __getattr__(self, name: str) -> Any:
-        self.__class__ = _Module
-        mod = self.__spec__.loader.load_module(self.__name__)
-        self = modules[self.__name__] = mod
-        return getattr(self, name)
+    def __getattribute__(self, name: str) -> Any:
+        get = partial(ModuleType.__getattribute__, self)
+        module_name = get('__name__')
+        with _module_lock(module_name):
+            # Loaded by another thread while this one waited, or being
+            # loaded by this one, in a circular import
+            if get('__class__') is _LazyModule and module_name not in _loading:
+                _exec_lazy(self, get('__spec__'))
+                with _module_locks_lock:
+                    _module_locks.pop(module_name, None)
+        return get(name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        # Before it's loaded, setting an attribute loads it first, so the
+        # value isn't overwritten by the module's code
+        if name not in _MODULE_ATTRS:
+            getattr(self, '__dict__')
+        ModuleType.__setattr__(self, name, value)
+
+
+_MODULE_ATTRS = frozenset(('__file__', '__package__', '__loader__', '__path__', '__spec__', '__class__'))
+_loading: set[str] = set()
+
+# A lock of our own for each lazy module until it's loaded, as
+# `importlib.util.LazyLoader` has, rather than the import system's private
+# ones. Reentrant, so that a circular use from the loading thread gets the
+# partial module
+_module_locks: dict[str, threading.RLock] = {}
+_module_locks_lock = threading.Lock()
+
+
+def _module_lock(name: str) -> threading.RLock:
+    with _module_locks_lock:
+        lock = _module_locks.get(name)
+        if lock is None:
+            lock = _module_locks[name] = threading.RLock()
+        return lock
+
+materialised: list[str] = []
+'''The names of the lazy modules which have been loaded, in order. Those
+loaded by a prefetcher are added when another thread first uses them'''
+
+
+class _Prefetching(threading.local):
+    # Set in prefetcher threads
+    active = False
+
+
+_prefetching = _Prefetching()
+_prefetched_lock = threading.Lock()
+
+
+class _PrefetchedModule(_Module):
+    '''A lazy module which was loaded by a prefetcher, and hasn't been used
+    by any other thread yet
+    '''
+
+    def __getattribute__(self, name: str) -> Any:
+        if not _prefetching.active:
+            with _prefetched_lock:
+                if type(self) is _PrefetchedModule:
+                    self.__class__ = _Module
+                    materialised.append(ModuleType.__getattribute__(self, '__name__'))
+        return ModuleType.__getattribute__(self, name)
+
+
+def _exec_lazy(module: _LazyModule, spec: ModuleSpec) -> None:
+    # Packages run before their submodules, as with a normal import
+    parent = modules.get(spec.parent) if spec.parent != spec.name else None
+    if type(parent) is _LazyModule:
+        getattr(parent, '__dict__')
+
+    _loading.add(spec.name)
+    try:
+        with import_trace.module(spec.name), import_trace.stage('exec'):
+            spec.loader.exec_module(module)
+    except BaseException:
+        # As with a failed import, it's not left in sys.modules
+        if modules.get(spec.name) is module:
+            del modules[spec.name]
+        raise
+    finally:
+        _loading.discard(spec.name)
+    if _prefetching.active:
+        module.__class__ = _PrefetchedModule
+    else:
+        module.__class__ = _Module
+        materialised.append(spec.name)
+
+
+class _LazyAttribute:
+    '''A stand-in for a name imported by `from <lazy module> import name`
+
+    The first time it's used, it gets the attribute (loading the module) and
+    replaces itself wherever it's bound in the importing module's globals, so
+    later uses there don't go through it. It can't stand in where its first
+    use needs the real object: identity checks (`is`), `except` clauses, and
+    C code which checks for a class
+    '''
+
+    __slots__ = ('_lazy_module', '_lazy_name', '_lazy_globals', '_lazy_value')
+
+    def __init__(self, module: ModuleType, name: str, globals: Optional[dict[str, Any]]) -> None:
+        set_ = partial(object.__setattr__, self)
+        set_('_lazy_module', module)
+        set_('_lazy_name', name)
+        set_('_lazy_globals', globals)
+
+    def _lazy_resolve(self) -> Any:
+        get = partial(object.__getattribute__, self)
+        try:
+            return get('_lazy_value')
+        except AttributeError:
+            pass
+
+        module, name = get('_lazy_module'), get('_lazy_name')
+        try:
+            value = getattr(module, name)
+        except AttributeError:
+            # As `from package import submodule` does
+            value = import_module(f'{module.__name__}.{name}')
+        object.__setattr__(self, '_lazy_value', value)
+
+        namespace = get('_lazy_globals')
+        if namespace is not None:
+            for key, bound in list(namespace.items()):
+                if bound is self:
+                    namespace[key] = value
+        return value
+
+    def __getattribute__(self, name: str) -> Any:
+        # `__mro_entries__` is looked up on the instance by `class`
+        if name in ('_lazy_resolve', '__mro_entries__'):
+            return object.__getattribute__(self, name)
+        return getattr(self._lazy_resolve(), name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(self._lazy_resolve(), name, value)
+
+    def __delattr__(self, name: str) -> None:
+        delattr(self._lazy_resolve(), name)
+
+    def __repr__(self) -> str:
+        return repr(self._lazy_resolve())
+
+    def __mro_entries__(self, bases: tuple[Any, ...]) -> tuple[Any, ...]:
+        # So it can be used as a base class
+        value = self._lazy_resolve()
+        if not isinstance(value, type) and hasattr(value, '__mro_entries__'):
+            return value.__mro_entries__(bases)
+        return value,
+
+    def __instancecheck__(self, instance: Any) -> bool:
+        return isinstance(instance, self._lazy_resolve())
+
+    def __subclasscheck__(self, subclass: type) -> bool:
+        return issubclass(subclass, self._lazy_resolve())
+
+
+def _forward(name: str) -> Any:
+    def method(self, *args, **kwargs):
+        return getattr(type(self._lazy_resolve()), name)(self._lazy_resolve(), *args, **kwargs)
+    method.__name__ = name
+    return method
+
+
+# Special methods are looked up on the type, so each needs forwarding
+for _name in (
+    '__call__', '__str__', '__bytes__', '__format__', '__hash__', '__bool__', '__dir__',
+    '__len__', '__iter__', '__reversed__', '__contains__', '__getitem__', '__setitem__', '__delitem__',
+    '__enter__', '__exit__', '__aenter__', '__aexit__', '__await__', '__fspath__', '__index__',
+    '__int__', '__float__', '__complex__', '__neg__', '__pos__', '__abs__', '__invert__',
+    '__eq__', '__ne__', '__lt__', '__le__', '__gt__', '__ge__',
+    '__add__', '__sub__', '__mul__', '__matmul__', '__truediv__', '__floordiv__', '__mod__',
+    '__pow__', '__lshift__', '__rshift__', '__and__', '__or__', '__xor__',
+    '__radd__', '__rsub__', '__rmul__', '__rmatmul__', '__rtruediv__', '__rfloordiv__',
+    '__rmod__', '__rpow__', '__rlshift__', '__rrshift__', '__rand__', '__ror__', '__rxor__',
+):
+    setattr(_LazyAttribute, _name, _forward(_name))
+del _name
+
+
+class _FromImport(ModuleType):
+    '''What `__import__` gives for `from <lazy module> import ...`
+
+    Its attributes are the lazy submodules which were imported, and
+    `_LazyAttribute`s for `names`. Anything else, including `__dict__` and
+    `dir()`, loads the module
+    '''
+
+    __slots__ = ('_module', '_names', '_globals')
+
+    def __init__(self, module: ModuleType, names: Sequence[str], globals: Optional[dict[str, Any]]) -> None:
+        # Without loading it
+        ModuleType.__init__(self, ModuleType.__getattribute__(module, '__name__'))
+        set_ = partial(ModuleType.__setattr__, self)
+        set_('_module', module)
+        set_('_names', frozenset(names))
+        set_('_globals', globals)
+
+    def __getattribute__(self, name: str) -> Any:
+        get = partial(ModuleType.__getattribute__, self)
+        if name in _FromImport.__slots__:
+            return get(name)
+
+        module = get('_module')
+        namespace = ModuleType.__getattribute__(module, '__dict__')
+        if name != '__dict__' and name in namespace:
+            return namespace[name]
+        if name in get('_names'):
+            return _LazyAttribute(module, name, get('_globals'))
+        return getattr(module, name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(self._module, name, value)
+
+    def __delattr__(self, name: str) -> None:
+        delattr(self._module, name)
+
+    def __dir__(self) -> list[str]:
+        return dir(self._module)
+
+    def __repr__(self) -> str:
+        return repr(self._module)
+
+
+lazy_from = False
+'''Whether `from <lazy module> import name` binds a `_LazyAttribute` rather
+than loading the module, in application code'''
+
+# In library code, only `import x` is lazy: `from` imports are often made for
+# their side effects, and C code which needs a real class, like
+# `ABCMeta.register()`, can't see through `_LazyAttribute`s
+_LIBRARY_PATHS = tuple({
+    *(get_path(name) for name in ('stdlib', 'platstdlib', 'purelib', 'platlib')),
+    dirname(__file__)
+})
+
+
+def _is_application(globals: Optional[Mapping[str, Any]]) -> bool:
+    # Calls without globals, like `__import__(name, fromlist=[...])` used to
+    # get the module itself, aren't import statements
+    if globals is None:
+        return False
+    filename = globals.get('__file__')
+    return not filename or not filename.startswith(_LIBRARY_PATHS)
+
+
+def _resolve_name(name: str, globals: Optional[Mapping[str, Any]], level: int) -> Optional[str]:
+    '''The absolute name of the module, or None if the package of a relative
+    import isn't known
+    '''
+
+    if level == 0:
+        return name
+
+    globals = globals or {}
+    package = globals.get('__package__')
+    if package is None and globals.get('__spec__') is not None:
+        package = globals['__spec__'].parent
+    if not package:
+        return None
+    return resolve_name('.' * level + name, package)
+
+
+def _module_spec(module: ModuleType) -> Optional[ModuleSpec]:
+    # Without loading a lazy module
+    return ModuleType.__getattribute__(module, '__dict__').get('__spec__')
+
+
+def _find_spec(name: str) -> Optional[ModuleSpec]:
+    parent_name = name.rpartition('.')[0]
+    if not parent_name:
+        return find_spec(name)
+
+    # Submodules are found on the package's path, so a lazy package isn't
+    # loaded to find them
+    parent = get_lazy(parent_name) or import_module(parent_name)
+    parent_spec = _module_spec(parent)
+    path = parent_spec and parent_spec.submodule_search_locations
+    if path is None:
+        return None
+
+    # As the import system does, so `PathFinder` can be replaced
+    for finder in meta_path:
+        find = getattr(finder, 'find_spec', None)
+        spec = find and find(name, path)
+        if spec is not None:
+            return spec
+    return None
+
+
+def get_lazy(name: str) -> Optional[ModuleType]:
+    '''The module called `name`, which is new and lazy if it wasn't imported
+    already, or None if it can't be lazy
+    '''
+
+    if name in modules:
+        return modules[name]
+
+    spec = _find_spec(name)
+    if not spec or spec.origin in ('built-in', 'frozen'):
+        return None
+
+    # Extension modules must be made by their loader, so they can't be
+    # executed into a lazy module
+    if not hasattr(spec.loader, 'exec_module') or isinstance(spec.loader, ExtensionFileLoader):
+        return None
+
+    # Another thread, like a prefetcher, may have made it meanwhile
+    with _module_lock(name):
+        if name in modules:
+            return modules[name]
+        module = modules[name] = _LazyModule(spec)
+
+    parent, _, child = name.rpartition('.')
+    if parent:
+        ModuleType.__getattribute__(modules[parent], '__dict__')[child] = module
+    return module
 
 
 def imp(
@@ -38,27 +365,44 @@ def imp(
     level:    int = 0,
     *,
     non_lazy: bool = False
-) -> _Module:
+) -> Union[_Module, _FromImport]:
     base_import = partial(original_import, name, globals,
                           locals, fromlist, level)
     if non_lazy:
         return base_import()
 
-    if level != 0 or fromlist:
+    # `from x import *` needs the names, and dunders like `__path__` are
+    # asked for by the import system, which needs the real values
+    fromlist = fromlist or ()
+    if name == '__future__' or any(item == '*' or item.startswith('__') for item in fromlist):
         return base_import()
 
-    if name in modules:
-        return modules[name]
+    if fromlist and not _is_application(globals):
+        return base_import()
 
-    spec = find_spec(name)
-    if not spec or spec.origin == 'built-in':
+    absolute = _resolve_name(name, globals, level)
+    if absolute is None or (level != 0 and not fromlist):
         return base_import()
 
-    if not hasattr(spec.loader, 'load_module'):
+    module = get_lazy(absolute)
+    if module is None:
         return base_import()
 
-    module = modules[name] = _LazyModule(spec)
-    return module
+    if not fromlist:
+        # `import a.b` gives `a`, which has the attribute `b`
+        return modules[absolute.partition('.')[0]]
+
+    # `from package import submodule` gives a lazy submodule
+    spec = _module_spec(module)
+    if spec is not None and spec.submodule_search_locations is not None:
+        namespace = ModuleType.__getattribute__(module, '__dict__')
+        for item in fromlist:
+            if item not in namespace:
+                get_lazy(f'{absolute}.{item}')
+
+    if type(module) is not _LazyModule:
+        return base_import()
+    return _FromImport(module, fromlist if lazy_from else (), globals)
 
 
 builtins.__import__ = imp
@@ -0,0 +1,268 @@
+'''
+Copyright 2020 Jonathan Leeming
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+	http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+An on-disk cache of network imports
+
+Responses are stored by the hash of their content, with an index from URL
+to hash and the `ETag` and `Last-Modified` validators, so an unchanged file
+is revalidated without downloading it again. Code compiled from a cached
+file is stored next to it
+'''
+
+import atexit
+import json
+import marshal
+import sys
+from hashlib import sha256
+from http.client import HTTPException
+from importlib.util import MAGIC_NUMBER
+from os import getpid, listdir, makedirs, replace, unlink
+from os.path import basename, join
+from threading import Lock, get_ident
+from time import time
+from types import CodeType
+from typing import Any, Optional
+
+from . import export, http_pool, import_trace
+
+
+CACHE_VERSION = 2
+
+MAX_SIZE = 64 * 1024 * 1024
+'''The default `max_size`'''
+
+cache: Optional['NetworkCache'] = None
+'''The cache installed by `load(network_cache=...)`'''
+
+
+def _write(filename: str, data: bytes) -> None:
+    # Unique to the thread, as two may write the same object at once
+    tmp = f'{filename}.{getpid()}.{get_ident()}.tmp'
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        replace(tmp, filename)
+    except OSError:
+        try:
+            unlink(tmp)
+        except OSError:
+            pass
+
+
+def _read(filename: str) -> Optional[bytes]:
+    try:
+        with open(filename, 'rb') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+@export
+class NetworkCache:
+    '''A cache of network imports in `directory`
+
+    Entries younger than `max_age` seconds are used without contacting the
+    server; older ones are revalidated. Once the files cached add up to more
+    than `max_size` bytes, the least recently used are evicted when the
+    index is saved. If `offline`, entries are still used, however old, when
+    the server can't be reached
+    '''
+
+    def __init__(self, directory: str, max_age: float = 0, max_size: int = MAX_SIZE,
+                 offline: bool = False) -> None:
+        self.directory = directory
+        self.max_age = max_age
+        self.max_size = max_size
+        self.offline = offline
+        self.hits = self.revalidated = self.misses = 0
+        self._objects = join(directory, 'objects')
+        self._index = join(directory, 'index.json')
+        self._lock = Lock()
+        self._dirty = False
+        self._orphans = False
+        makedirs(self._objects, exist_ok=True)
+        self._entries: dict[str, dict[str, Any]] = self._load()
+
+    def _load(self) -> dict[str, dict[str, Any]]:
+        try:
+            with open(self._index, 'rb') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(data, dict) or data.get('version') != CACHE_VERSION:
+            return {}
+        entries = data.get('entries')
+        return entries if isinstance(entries, dict) else {}
+
+    def _object(self, digest: str) -> str:
+        return join(self._objects, digest)
+
+    def _code_file(self, url: str, digest: str, version: int) -> str:
+        # Code objects hold the URL as their filename, so aren't shared
+        # between URLs with the same content
+        tag = sha256(url.encode()).hexdigest()[:16]
+        return join(self._objects, f'{digest}.{tag}.{version}.{sys.implementation.cache_tag}.pyc')
+
+    def _use(self, entry: dict[str, Any]) -> Optional[bytes]:
+        data = _read(self._object(entry['hash']))
+        if data is None or sha256(data).hexdigest() != entry['hash']:
+            return None
+        entry['used'] = time()
+        self._dirty = True
+        return data
+
+    def _store(self, url: str, response: http_pool.Response) -> bytes:
+        digest = sha256(response.body).hexdigest()
+        filename = self._object(digest)
+        if _read(filename) != response.body:
+            _write(filename, response.body)
+        now = time()
+        with self._lock:
+            old = self._entries.get(url)
+            if old is not None and old['hash'] != digest:
+                self._orphans = True
+            self._entries[url] = {
+                'hash': digest, 'size': len(response.body),
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'fetched': now, 'used': now,
+            }
+            self._dirty = True
+        return response.body
+
+    def fetch(self, url: str) -> bytes:
+        '''The body of `url`, from the cache if it's fresh or unchanged
+        '''
+
+        entry = self._entries.get(url)
+        if entry is not None and time() - entry['fetched'] < self.max_age:
+            data = self._use(entry)
+            if data is not None:
+                self.hits += 1
+                import_trace.cache_result(True)
+                return data
+
+        headers = {}
+        if entry is not None:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        try:
+            response = http_pool.request(url, headers)
+        except (OSError, HTTPException) as e:
+            data = self._use(entry) if entry is not None and self.offline else None
+            if data is None:
+                raise ImportError(f'Cannot fetch {url}: {e}') from e
+            self.hits += 1
+            import_trace.cache_result(True)
+            return data
+
+        if response.status == 304 and entry is not None:
+            data = self._use(entry)
+            if data is not None:
+                entry['fetched'] = time()
+                self.revalidated += 1
+                import_trace.cache_result(True)
+                return data
+            response = http_pool.request(url)
+
+        if response.status != 200:
+            raise ImportError(f'Cannot fetch {url}: HTTP {response.status}')
+        self.misses += 1
+        import_trace.cache_result(False)
+        return self._store(url, response)
+
+    def get_code(self, url: str, source: bytes, version: int = 0) -> Optional[CodeType]:
+        '''The code cached for `source` fetched from `url`, if any, which
+        was generated by version `version` of an importer
+        '''
+
+        data = _read(self._code_file(url, sha256(source).hexdigest(), version))
+        if data is None or data[:len(MAGIC_NUMBER)] != MAGIC_NUMBER:
+            return None
+        try:
+            return marshal.loads(data[len(MAGIC_NUMBER):])
+        except (EOFError, ValueError, TypeError):
+            return None
+
+    def set_code(self, url: str, source: bytes, code: CodeType, version: int = 0) -> None:
+        '''Cache `code` compiled from `source` fetched from `url`
+        '''
+
+        data = MAGIC_NUMBER + marshal.dumps(code)
+        filename = self._code_file(url, sha256(source).hexdigest(), version)
+        _write(filename, data)
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is not None:
+                entry['code'] = basename(filename)
+                entry['code_size'] = len(data)
+                self._dirty = True
+
+    def _evict(self) -> None:
+        # Least recently used first
+        entries = sorted(self._entries.items(), key=lambda item: item[1]['used'])
+        total = sum(entry['size'] + entry.get('code_size', 0) for _, entry in entries)
+        for url, entry in entries:
+            if total <= self.max_size:
+                break
+            del self._entries[url]
+            total -= entry['size'] + entry.get('code_size', 0)
+            self._orphans = True
+        if not self._orphans:
+            return
+        self._orphans = False
+
+        # Files which no entry refers to any more
+        live = set()
+        for entry in self._entries.values():
+            live.add(entry['hash'])
+            live.add(entry.get('code'))
+        for filename in listdir(self._objects):
+            if filename not in live and not filename.endswith('.tmp'):
+                try:
+                    unlink(join(self._objects, filename))
+                except OSError:
+                    pass
+
+    def save(self) -> None:
+        '''Evict entries over `max_size`, and write the index if it has
+        changed, ignoring errors
+        '''
+
+        if not self._dirty:
+            return
+        with self._lock:
+            try:
+                self._evict()
+            except OSError:
+                pass
+            data = json.dumps({'version': CACHE_VERSION, 'entries': self._entries}, separators=(',', ':'))
+            self._dirty = False
+        _write(self._index, data.encode())
+
+
+@export
+def install_network_cache(directory: str, max_age: float = 0, max_size: int = MAX_SIZE,
+                          offline: bool = False) -> NetworkCache:
+    '''Cache network imports in `directory`, saving the index at exit
+    '''
+
+    global cache
+    cache = NetworkCache(directory, max_age, max_size, offline)
+    atexit.register(cache.save)
+    return cache
@@ -14,24 +14,116 @@ See the License for the specific language governing permissions and
 limitations under the License.
 '''
 
+import sys
+from functools import partial
 from importlib.util import spec_from_loader
+from io import BytesIO
+from itertools import chain
+from os import listdir
+from os.path import isfile, join
 from sys import path_hooks
-from types import ModuleType
-from urllib.request import urlopen
-from xml.etree.ElementTree import fromstring
+from types import CodeType, ModuleType
+from typing import BinaryIO, Callable, Optional, Union
+from zipfile import ZIP_DEFLATED, BadZipFile, ZipFile
 
-from . import export
+from . import bytecode_cache, export, http_pool, import_trace, network_cache
+from .import_utils import ImportBase, installed_importers
 
 
 _allowed_protocols = 'http:', 'https:'
 
+BUNDLE_NAME = '__bundle__.zip'
+'''The bundle of a path entry, relative to its URL'''
+
+use_bundles = False
+'''Whether to look for a bundle before fetching a path entry's manifest'''
+
+# The `network_prefetch.GraphPrefetcher` once prefetching is started, which
+# is only imported then, as it needs asyncio
+_prefetcher = None
+
+def _fetch(url: str) -> bytes:
+    if network_cache.cache is not None:
+        return network_cache.cache.fetch(url)
+    return http_pool.get(url)
+
+def _fetch_bundle(baseuri: str) -> Optional[ZipFile]:
+    try:
+        return ZipFile(BytesIO(_fetch(baseuri.rstrip('/') + '/' + BUNDLE_NAME)))
+    except (ImportError, BadZipFile):
+        # No bundle, so each module is fetched on its own
+        return None
+
 def _url_hook(name: str):
     if not name.startswith(_allowed_protocols):
         raise ImportError('Invalid network protocol')
-    data: str = urlopen(name).read().decode('utf-8')
+    bundle = _fetch_bundle(name) if use_bundles else None
+    if bundle is not None:
+        return _UrlFinder(name, set(bundle.namelist()), bundle)
+    data: str = _fetch(name).decode('utf-8')
     filenames = set(data.split('\n'))
     return _UrlFinder(name, filenames)
 
+
+def _pyc_name(filename: str) -> str:
+    return f'__pycache__/{filename}.{sys.implementation.cache_tag}.pyc'
+
+def _compile_py(source: bytes, filename: str) -> CodeType:
+    with import_trace.stage('compile'):
+        return compile(source, filename, 'exec', dont_inherit=True)
+
+def _with_filename(code: CodeType, filename: str) -> CodeType:
+    # Code in bundles is compiled before its URL is known. This renames it
+    # as the import system's private `_imp._fix_co_filename()` would,
+    # including the code of its functions and classes
+    consts = tuple(_with_filename(const, filename) if isinstance(const, CodeType) else const
+                   for const in code.co_consts)
+    return code.replace(co_filename=filename, co_consts=consts)
+
+@export
+def write_bundle(directory: str, file: Union[str, BinaryIO], compiled: bool = True) -> None:
+    '''Write the files in `directory` to the bundle `file`, with the code of
+    `.py` files and files of installed importers compiled for this version
+    of Python if `compiled`
+
+    A bundle is a zip file, whose members are the manifest. Compiled code
+    is in checked-hash `.pyc` files in `__pycache__`, as in PEP 552
+    '''
+
+    with ZipFile(file, 'w', ZIP_DEFLATED) as bundle:
+        for name in sorted(listdir(directory)):
+            path = join(directory, name)
+            # Hidden files, like `.env`, aren't served
+            if name.startswith('.') or not isfile(path) or name == BUNDLE_NAME:
+                continue
+            with open(path, 'rb') as f:
+                source = f.read()
+            bundle.writestr(name, source)
+
+            if compiled:
+                pyc = compile_pyc(name, source)
+                if pyc is not None:
+                    bundle.writestr(_pyc_name(name), pyc)
+
+
+def compile_pyc(filename: str, source: bytes) -> Optional[bytes]:
+    '''The code of the file `filename` as a checked-hash `.pyc`, if it's a
+    `.py` file or a file of an installed importer which compiles
+    '''
+
+    extension = filename.rpartition('.')[2]
+    importer = installed_importers().get(extension)
+    try:
+        if extension == 'py':
+            return bytecode_cache.code_to_hash_pyc(_compile_py(source, filename), source)
+        if importer is not None:
+            code = importer.source_to_code(source, filename)
+            return bytecode_cache.code_to_hash_pyc(code, source, importer.cache_version)
+    except (SyntaxError, NotImplementedError, ValueError):
+        # Raised again when the module's imported
+        pass
+    return None
+
 loaders = {}
 @export
 def register_loader(extension: str):
@@ -42,15 +134,60 @@ def register_loader(extension: str):
 
 
 class _UrlFinder:
-    def __init__(self, baseuri, filenames) -> None:
+    def __init__(self, baseuri, filenames, bundle: Optional[ZipFile] = None) -> None:
         self.baseuri = baseuri
         self.filenames = filenames
+        self.bundle = bundle
 
-    def find_spec(self, modname, target=None):
-        for extension, loader in loaders.items():
+    def read(self, filename: str) -> Optional[bytes]:
+        '''The contents of `filename` in the bundle, if it's there
+        '''
+        if self.bundle is None or filename not in self.filenames:
+            return None
+        return self.bundle.read(filename)
+
+    def bundled_code(self, origin: str, source: bytes, version: int = 0) -> Optional[CodeType]:
+        '''The code compiled for `source` in the bundle, if it's there
+        '''
+        data = self.read(_pyc_name(origin.rpartition('/')[2]))
+        code = data and bytecode_cache.hash_pyc_to_code(data, source, version)
+        if isinstance(code, CodeType):
+            return _with_filename(code, origin)
+        return None
+
+    def locate(self, modname):
+        '''The URL and loader of the module `modname` if it's in the manifest
+        '''
+        for extension, loader in chain(loaders.items(), installed_importers().items()):
             if f'{modname}.{extension}' in self.filenames:
-                origin = self.baseuri = '/' + modname + '.' + extension
-                return spec_from_loader(modname, loader(), origin=origin)
+                if extension not in loaders:
+                    loader = partial(ImporterLoader, loader)
+                return self.baseuri.rstrip('/') + '/' + modname + '.' + extension, loader
+        return None, None
+
+    def find_spec(self, modname, target=None):
+        origin, loader = self.locate(modname)
+        if origin is not None:
+            spec = spec_from_loader(modname, loader(), origin=origin)
+            spec.loader_state = self
+            return spec
+
+
+def _locate_url(finder: _UrlFinder, modname: str):
+    return finder.locate(modname)[0]
+
+
+@export
+def start_network_prefetch(workers: int = 8) -> 'network_prefetch.GraphPrefetcher':
+    '''Fetch the modules each network module imports in the background
+    '''
+
+    global _prefetcher
+    from . import network_prefetch
+    if network_prefetch.prefetcher is None:
+        network_prefetch.prefetcher = network_prefetch.GraphPrefetcher(_fetch, _locate_url, workers)
+    _prefetcher = network_prefetch.prefetcher
+    return _prefetcher
 
 
 @export
@@ -59,15 +196,71 @@ class Loader:
         return None
 
     def get_module_contents(self, module: ModuleType):
-        return urlopen(module.__spec__.origin).read()
+        spec = module.__spec__
+        finder = spec.loader_state
+        if isinstance(finder, _UrlFinder) and finder.bundle is not None:
+            with import_trace.stage('read'):
+                data = finder.read(spec.origin.rpartition('/')[2])
+            import_trace.add_bytes(len(data))
+            return data
+
+        prefetcher = _prefetcher
+        with import_trace.stage('fetch'):
+            data = prefetcher and prefetcher.take(spec.origin)
+            if data is None:
+                data = _fetch(spec.origin)
+                # Modules which were prefetched have had their imports
+                # prefetched too
+                if prefetcher is not None and spec.origin.endswith('.py') and isinstance(spec.loader_state, _UrlFinder):
+                    prefetcher.prefetch(spec.loader_state, data)
+        import_trace.add_bytes(len(data))
+        return data
+
+
+def _module_code(module: ModuleType, source: bytes,
+                 source_to_code: Callable[[bytes, str], CodeType], version: int = 0) -> CodeType:
+    spec = module.__spec__
+    finder = spec.loader_state
+    if isinstance(finder, _UrlFinder) and finder.bundle is not None:
+        cache = None
+        code = finder.bundled_code(spec.origin, source, version)
+    else:
+        cache = network_cache.cache
+        code = cache and cache.get_code(spec.origin, source, version)
+
+    if code is None:
+        code = source_to_code(source, spec.origin)
+        if cache is not None:
+            cache.set_code(spec.origin, source, code, version)
+    return code
 
 
 @register_loader('py')
 class PyLoader(Loader):
     def exec_module(self, module: ModuleType):
-        code = super().get_module_contents(module)
-        compile(code, module.__spec__.origin, 'exec')
-        exec(code, module.__dict__)
+        with import_trace.module(module.__name__):
+            source = super().get_module_contents(module)
+            code = _module_code(module, source, _compile_py)
+            with import_trace.stage('exec'):
+                exec(code, module.__dict__)
+
+
+class ImporterLoader(Loader):
+    '''Loads network modules with the installed importer `importer`, which
+    generates code
+    '''
+
+    def __init__(self, importer: type[ImportBase]) -> None:
+        self.importer = importer
+
+    def exec_module(self, module: ModuleType):
+        importer = self.importer
+        with import_trace.module(module.__name__):
+            source = self.get_module_contents(module)
+            with import_trace.stage('generate'):
+                code = _module_code(module, source, importer.source_to_code, importer.cache_version)
+            exec(importer.preamble, module.__dict__)
+            importer.exec_code(code, module.__dict__)
 
 
 path_hooks.append(_url_hook)
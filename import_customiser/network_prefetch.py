@@ -0,0 +1,150 @@
+'''
+Copyright 2020 Jonathan Leeming
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+	http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Prefetching of the modules a network module imports
+
+When a module's source is fetched, the modules named by its import
+statements which are in the same manifest are fetched concurrently in the
+background, and so are the modules they import, so that each import finds
+its source already downloaded rather than waiting for it in turn
+'''
+
+import ast
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Iterator, Optional
+
+from . import export
+
+
+prefetcher: Optional['GraphPrefetcher'] = None
+'''The prefetcher started by `load(network_prefetch=True)`'''
+
+# What fetching a module can fail with, after which importing it fetches it
+# again itself, including being cancelled as the event loop stops
+_FAILURES = Exception, asyncio.CancelledError
+
+# Stands in for the bodies which have been taken, so they aren't kept, and
+# the modules aren't fetched again
+_TAKEN: Future = Future()
+_TAKEN.set_result(None)
+
+
+def imported_names(source: bytes) -> Iterator[str]:
+    '''The absolute names imported anywhere in `source`, including the
+    names imported from modules, which may be submodules
+    '''
+
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                yield alias.name
+        elif isinstance(node, ast.ImportFrom) and not node.level and node.module:
+            yield node.module
+            for alias in node.names:
+                yield f'{node.module}.{alias.name}'
+
+
+@export
+class GraphPrefetcher:
+    '''Fetches the import graph of network modules on an event loop in a
+    background thread, with at most `workers` fetches at once
+
+    `fetch(url)` is called on a pool of threads to download each module,
+    and `locate(finder, name)` gives the URL of the module `name` in a
+    finder's manifest, or None
+    '''
+
+    def __init__(self, fetch: Callable[[str], bytes], locate: Callable[[object, str], Optional[str]],
+                 workers: int = 8) -> None:
+        self.fetch = fetch
+        self.locate = locate
+        self.workers = workers
+        self._futures: dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _start(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                loop.set_default_executor(ThreadPoolExecutor(
+                    self.workers, thread_name_prefix='import_customiser-fetch'))
+                self._semaphore = asyncio.Semaphore(self.workers)
+                threading.Thread(target=loop.run_forever, name='import_customiser-prefetch',
+                                 daemon=True).start()
+                self._loop = loop
+            return self._loop
+
+    def _claim(self, url: str) -> Optional[Future]:
+        # Each URL is only fetched once, however many modules import it
+        with self._lock:
+            if url in self._futures:
+                return None
+            future = self._futures[url] = Future()
+            return future
+
+    def prefetch(self, finder: object, source: bytes) -> None:
+        '''Start fetching the modules which `source` imports from `finder`
+        '''
+
+        loop = self._start()
+        asyncio.run_coroutine_threadsafe(self._crawl(finder, source), loop)
+
+    async def _crawl(self, finder: object, source: bytes) -> None:
+        # Parsed on the event loop's thread, rather than the importing one
+        tasks = []
+        for name in set(imported_names(source)):
+            url = self.locate(finder, name)
+            future = url and self._claim(url)
+            if future is not None:
+                tasks.append(self._get(finder, url, future))
+        await asyncio.gather(*tasks)
+
+    async def _get(self, finder: object, url: str, future: Future) -> None:
+        # The future is always completed, so `take()` never waits forever
+        try:
+            async with self._semaphore:
+                data = await asyncio.get_running_loop().run_in_executor(None, self.fetch, url)
+        except _FAILURES as e:
+            future.set_exception(e)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            return
+        future.set_result(data)
+        if url.endswith('.py'):
+            await self._crawl(finder, data)
+
+    def take(self, url: str) -> Optional[bytes]:
+        '''The prefetched body of `url`, waiting for it if it's being
+        fetched, or None if it wasn't prefetched or fetching it failed
+        '''
+
+        with self._lock:
+            future = self._futures.get(url)
+        if future is None:
+            return None
+        try:
+            return future.result()
+        except _FAILURES:
+            return None
+        finally:
+            with self._lock:
+                self._futures[url] = _TAKEN
@@ -0,0 +1,173 @@
+'''
+Copyright 2020 Jonathan Leeming
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+	http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Profile-guided prefetching of lazy modules
+
+Each run records which lazy modules were loaded, in order, to a profile.
+The next run loads those modules on background threads once the main
+thread is idle, so they are ready before they are first used
+'''
+
+import atexit
+import json
+import sys
+import threading
+from importlib import import_module
+from os import getpid, replace, unlink
+from time import sleep
+try:
+    from time import clock_gettime, pthread_getcpuclockid
+except ImportError:
+    # Not on Windows, which falls back to watching the main thread's frame
+    pass
+from typing import Iterator, Optional
+
+from . import lazy_import
+
+
+PROFILE_VERSION = 1
+
+prefetcher: Optional['Prefetcher'] = None
+'''The `Prefetcher` started by `load(lazy_profile=...)`'''
+
+
+def load_profile(filename: str) -> list[str]:
+    '''The names of the modules in the profile `filename`, or none if it
+    doesn't exist or can't be read
+    '''
+
+    try:
+        with open(filename, 'rb') as f:
+            profile = json.load(f)
+    except (OSError, ValueError):
+        return []
+
+    if not isinstance(profile, dict) or profile.get('version') != PROFILE_VERSION:
+        return []
+    return [name for name in profile.get('modules', ()) if isinstance(name, str)]
+
+
+def save_profile(filename: str, names: list[str]) -> None:
+    '''Atomically write the profile `filename`, ignoring errors
+    '''
+
+    tmp = f'{filename}.{getpid()}.tmp'
+    try:
+        with open(tmp, 'w') as f:
+            json.dump({'version': PROFILE_VERSION, 'modules': names}, f, indent=1)
+        replace(tmp, filename)
+    except OSError:
+        try:
+            unlink(tmp)
+        except OSError:
+            pass
+
+
+def _cpu_clock(thread: threading.Thread) -> Optional[int]:
+    try:
+        return pthread_getcpuclockid(thread.ident)
+    except (NameError, OSError):
+        return None
+
+
+def wait_until_idle(interval: float = 0.05, busy: float = 0.1) -> bool:
+    '''Block until the main thread is idle for `interval` seconds, as it is
+    when it's waiting for I/O
+
+    Where threads' CPU time can be read, idle means using less than `busy`
+    of the CPU, or else staying at the same point in the same frame.
+    Returns False if the main thread has finished
+    '''
+
+    main = threading.main_thread()
+    clock = _cpu_clock(main)
+    last = None
+    while main.is_alive():
+        if clock is not None:
+            point = clock_gettime(clock)
+            idle = last is not None and point - last < interval * busy
+        else:
+            frame = sys._current_frames().get(main.ident)
+            if frame is None:
+                return False
+            point = id(frame), frame.f_lasti
+            del frame
+            idle = point == last
+
+        if idle:
+            return True
+        last = point
+        sleep(interval)
+    return False
+
+
+def prefetch_module(name: str) -> None:
+    '''Load the module `name`, through a lazy module where possible, so that
+    threads using it wait for it to finish loading
+    '''
+
+    try:
+        module = lazy_import.get_lazy(name)
+        if module is None:
+            import_module(name)
+        elif type(module) is lazy_import._LazyModule:
+            getattr(module, '__dict__')
+    except Exception:
+        # The module will raise again where it's used
+        pass
+
+
+def _worker(names: Iterator[str], lock: threading.Lock, interval: float) -> None:
+    # So the modules it loads aren't recorded until they're used
+    lazy_import._prefetching.active = True
+    while wait_until_idle(interval):
+        with lock:
+            name = next(names, None)
+        if name is None:
+            return
+        prefetch_module(name)
+
+
+class Prefetcher:
+    '''Records the lazy modules loaded by this run to the profile `filename`
+    at exit, and prefetches the ones it lists with `workers` threads
+    '''
+
+    def __init__(self, filename: str, workers: int = 2, interval: float = 0.05) -> None:
+        self.filename = filename
+        self.names = load_profile(filename)
+        self.threads: list[threading.Thread] = []
+
+        lazy_import.materialised.clear()
+        atexit.register(self.save)
+
+        names, lock = iter(self.names), threading.Lock()
+        for i in range(workers if self.names else 0):
+            thread = threading.Thread(
+                target=_worker, args=(names, lock, interval),
+                name=f'import_customiser-prefetch-{i}', daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def save(self) -> None:
+        '''Write the lazy modules loaded so far to the profile
+        '''
+        save_profile(self.filename, list(lazy_import.materialised))
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        '''Wait for prefetching to finish
+        '''
+        for thread in self.threads:
+            thread.join(timeout)
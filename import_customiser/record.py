@@ -0,0 +1,188 @@
+'''
+Copyright 2020 Jonathan Leeming
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+	http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+import struct
+from mmap import ACCESS_READ, mmap
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+from . import export
+from .descriptor import Descriptor
+
+
+BYTE_ORDERS = '@', '=', '<', '>', '!'
+'''Valid layouts, which are the byte order prefixes of the `struct` module'''
+
+
+def _is_text(desc: Descriptor) -> bool:
+    # 's' fields are bytes in the struct module, which descriptors for str
+    # values are given as UTF-8
+    return desc.pack_format.endswith('s') and getattr(desc, 'ty', str) is not bytes
+
+
+def _decode(value: bytes) -> str:
+    return value.rstrip(b'\0').decode()
+
+
+class _View:
+    '''A read-only view of one record in a buffer, with an attribute per field
+
+    Fields are unpacked from the buffer each time they're read
+    '''
+
+    __slots__ = ('_buffer', '_offset')
+    _layout: 'RecordLayout'
+
+    def __init__(self, buffer: memoryview, offset: int = 0) -> None:
+        self._buffer = buffer
+        self._offset = offset
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self._layout.unpack(self._buffer, self._offset))
+
+    def __repr__(self) -> str:
+        return self._layout.cls.__name__ + '(' + ', '.join(map(repr, self)) + ')'
+
+    def to_struct(self) -> Any:
+        '''Copy the record into a (validated) instance of the structure
+        '''
+        return self._layout.cls(*self)
+
+
+def _field_property(unpack_from: Callable, offset: int, text: bool) -> property:
+    if text:
+        def get(view: _View) -> Any:
+            return _decode(unpack_from(view._buffer, view._offset + offset)[0])
+    else:
+        def get(view: _View) -> Any:
+            return unpack_from(view._buffer, view._offset + offset)[0]
+    return property(get)
+
+
+class RecordLayout:
+    '''The fixed binary layout of a `Struct` class with a `layout`
+
+    Each field is packed with its descriptor's `pack_format`, in the byte
+    order `layout`
+    '''
+
+    def __init__(self, cls: type, layout: str) -> None:
+        if layout not in BYTE_ORDERS:
+            raise ValueError(f'Invalid layout: {layout!r}')
+
+        descriptors = cls._descriptors
+        missing = [name for name, desc in descriptors.items() if desc.pack_format is None]
+        if missing:
+            raise TypeError(f'{cls.__name__} fields have no pack_format: {", ".join(missing)}')
+
+        self.cls = cls
+        formats = [desc.pack_format for desc in descriptors.values()]
+        self._packer = struct.Struct(layout + ''.join(formats))
+        self.size = self._packer.size
+        self._text = [i for i, desc in enumerate(descriptors.values()) if _is_text(desc)]
+        # The struct module would cut longer values short
+        self._widths = [(i, struct.calcsize(fmt)) for i, fmt in enumerate(formats) if fmt.endswith('s')]
+
+        properties = {}
+        for i, (name, fmt) in enumerate(zip(descriptors, formats)):
+            # Where the field starts, after any alignment padding
+            offset = struct.calcsize(layout + ''.join(formats[:i + 1])) - struct.calcsize(layout + fmt)
+            unpack_from = struct.Struct(layout + fmt).unpack_from
+            properties[name] = _field_property(unpack_from, offset, i in self._text)
+
+        self.View = type(cls.__name__ + 'View', (_View,), {
+            '__slots__': (), '_layout': self, **properties})
+        self.View.__qualname__ = cls.__qualname__ + '.View'
+
+    def pack(self, instance: Any) -> bytes:
+        values = [getattr(instance, name) for name in self.cls._fields]
+        for i in self._text:
+            values[i] = values[i].encode()
+        for i, width in self._widths:
+            if len(values[i]) > width:
+                raise ValueError(
+                    f'{self.cls._fields[i]} must be at most {width} bytes (got {len(values[i])})')
+        return self._packer.pack(*values)
+
+    def unpack(self, buffer: Any, offset: int = 0) -> list[Any]:
+        values = list(self._packer.unpack_from(buffer, offset))
+        for i in self._text:
+            values[i] = _decode(values[i])
+        return values
+
+
+@export
+class RecordFile:
+    '''The records of a `Struct` class with a `layout`, stored back to back
+    in a file
+
+    The file is memory-mapped, and indexing or iterating gives views which
+    read fields from the map, so no rows are copied or turned into objects
+    until they're used
+
+    Usage:
+    with RecordFile(Point, 'points.bin') as points:
+        total = sum(point.x for point in points)
+    '''
+
+    def __init__(self, cls: type, filename: str) -> None:
+        if cls._record is None:
+            raise TypeError(f'{cls.__name__} has no binary layout')
+
+        self._layout = cls._record
+        with open(filename, 'rb') as f:
+            try:
+                self._mmap: Optional[mmap] = mmap(f.fileno(), 0, access=ACCESS_READ)
+            except ValueError:
+                # Empty files can't be mapped
+                self._mmap = None
+
+        self._buffer = memoryview(self._mmap if self._mmap is not None else b'')
+        self._length = len(self._buffer) // self._layout.size
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, index: int) -> _View:
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError('RecordFile index out of range')
+        return self._layout.View(self._buffer, index * self._layout.size)
+
+    def __iter__(self) -> Iterator[_View]:
+        View, buffer, size = self._layout.View, self._buffer, self._layout.size
+        return (View(buffer, offset) for offset in range(0, self._length * size, size))
+
+    def close(self) -> None:
+        '''Unmap the file, after which views of its records can't be read
+        '''
+        self._buffer.release()
+        if self._mmap is not None:
+            self._mmap.close()
+
+    def __enter__(self) -> 'RecordFile':
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    @staticmethod
+    def write(filename: str, records: Iterable[Any]) -> None:
+        '''Write instances of a `Struct` class with a `layout` to `filename`
+        '''
+        with open(filename, 'wb') as f:
+            for record in records:
+                f.write(record.to_bytes())
@@ -0,0 +1,298 @@
+'''
+Copyright 2020 Jonathan Leeming
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+	http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+A module server for network imports
+
+Usage:
+python -m import_customiser.server DIRECTORY [--bind ADDRESS] [--port PORT]
+
+Each directory's URL serves its manifest, and in it are its files, its
+bundle at `__bundle__.zip`, and the code of each `.py`, `.type` and
+`.struct` file compiled for this version of Python at
+`__pycache__/<file>.<cache tag>.pyc`. Responses have ETags, and are
+compressed with zstd (if `zstandard` is installed) or gzip. Responses are
+built once and kept until the files they're built from change
+'''
+
+import argparse
+import gzip
+import sys
+from hashlib import sha256
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from mimetypes import guess_type
+from os import listdir, stat
+from os.path import basename, isdir, join, realpath
+from threading import Lock
+from typing import Any, Callable, Optional
+from urllib.parse import unquote, urlsplit
+
+from . import export, load
+from .network_import import BUNDLE_NAME, compile_pyc, write_bundle
+
+try:
+    import zstandard
+except ImportError:
+    # An optional dependency, without which responses are only gzipped
+    zstandard = None
+
+
+COMPRESS_MIN_SIZE = 256
+'''Smaller responses aren't compressed'''
+
+
+class _Resource:
+    '''A response body, with its ETag and compressed forms'''
+
+    __slots__ = ('signature', 'body', 'etag', 'content_type', 'compressible', '_encoded')
+
+    def __init__(self, signature: Any, body: bytes, content_type: str, compressible: bool = True) -> None:
+        self.signature = signature
+        self.body = body
+        self.etag = f'"{sha256(body).hexdigest()[:32]}"'
+        self.content_type = content_type
+        self.compressible = compressible and len(body) >= COMPRESS_MIN_SIZE
+        self._encoded: dict[str, bytes] = {}
+
+    def encoded(self, encoding: str) -> bytes:
+        if encoding == 'identity':
+            return self.body
+        try:
+            return self._encoded[encoding]
+        except KeyError:
+            if encoding == 'zstd':
+                data = zstandard.ZstdCompressor().compress(self.body)
+            else:
+                data = gzip.compress(self.body, mtime=0)
+            self._encoded[encoding] = data
+            return data
+
+
+def _file_signature(filename: str) -> Optional[tuple[int, int]]:
+    try:
+        st = stat(filename)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _directory_files(directory: str) -> Optional[list[tuple[str, int, int]]]:
+    # The files in a directory and their signatures, which change with
+    # the manifest and the bundle
+    try:
+        names = sorted(listdir(directory))
+    except OSError:
+        return None
+    files = []
+    for name in names:
+        if name.startswith('.'):
+            continue
+        try:
+            st = stat(join(directory, name))
+        except OSError:
+            continue
+        if not isdir(join(directory, name)):
+            files.append((name, st.st_mtime_ns, st.st_size))
+    return files
+
+
+@export
+class ModuleServer(ThreadingHTTPServer):
+    '''Serves the modules in `directory` to `network_import`, with a thread
+    per connection
+
+    Bundles and files include compiled code if `bytecode`, and responses
+    are compressed if `compress`
+    '''
+
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, address: tuple[str, int], directory: str, bytecode: bool = True,
+                 compress: bool = True, quiet: bool = False) -> None:
+        self.directory = realpath(directory)
+        self.bytecode = bytecode
+        self.compress = compress
+        self.quiet = quiet
+        self._resources: dict[str, _Resource] = {}
+        self._lock = Lock()
+        super().__init__(address, _Handler)
+
+    def _cached(self, key: str, signature: Any, build: Callable[[], Optional[_Resource]]) -> Optional[_Resource]:
+        with self._lock:
+            resource = self._resources.get(key)
+        if resource is not None and resource.signature == signature:
+            return resource
+
+        # Built outside the lock, so a large bundle doesn't hold up others
+        resource = build()
+        with self._lock:
+            if resource is None:
+                self._resources.pop(key, None)
+            else:
+                self._resources[key] = resource
+        return resource
+
+    def resource(self, path: str) -> Optional[_Resource]:
+        '''The response for the URL path `path`, or None if there isn't one
+        '''
+
+        # Nothing outside the directory is served, nor are hidden files, which
+        # manifests and bundles leave out
+        parts = unquote(path).split('/')
+        if any(part.startswith('.') or '\\' in part or '\0' in part for part in parts):
+            return None
+        *dirs, name = [part for part in parts[:-1] if part] + [parts[-1]]
+        directory = join(self.directory, *dirs)
+
+        if not name:
+            files = _directory_files(directory)
+            if files is None:
+                return None
+            manifest = '\n'.join(name for name, _, _ in files).encode()
+            return self._cached(path, files, lambda: _Resource(files, manifest, 'text/plain; charset=utf-8'))
+
+        if name == BUNDLE_NAME:
+            files = _directory_files(directory)
+            if files is None:
+                return None
+            return self._cached(path, files, lambda: self._bundle(directory, files))
+
+        tag = f'.{sys.implementation.cache_tag}.pyc'
+        if dirs and dirs[-1] == '__pycache__' and name.endswith(tag):
+            filename = join(self.directory, *dirs[:-1], name[:-len(tag)])
+            signature = _file_signature(filename)
+            if signature is None or not self.bytecode:
+                return None
+            return self._cached(path, signature, lambda: self._pyc(filename, signature))
+
+        filename = join(directory, name)
+        signature = _file_signature(filename)
+        if signature is None or isdir(filename):
+            return None
+        return self._cached(path, signature, lambda: self._file(filename, signature))
+
+    def _bundle(self, directory: str, files: list[tuple[str, int, int]]) -> _Resource:
+        data = BytesIO()
+        write_bundle(directory, data, self.bytecode)
+        # Its members are already compressed
+        return _Resource(files, data.getvalue(), 'application/zip', compressible=False)
+
+    def _pyc(self, filename: str, signature: tuple[int, int]) -> Optional[_Resource]:
+        try:
+            with open(filename, 'rb') as f:
+                source = f.read()
+        except OSError:
+            return None
+        pyc = compile_pyc(basename(filename), source)
+        return pyc and _Resource(signature, pyc, 'application/x-python-code')
+
+    def _file(self, filename: str, signature: tuple[int, int]) -> Optional[_Resource]:
+        try:
+            with open(filename, 'rb') as f:
+                body = f.read()
+        except OSError:
+            return None
+        return _Resource(signature, body, guess_type(filename)[0] or 'application/octet-stream')
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'import_customiser'
+    # Send headers and body together, rather than waiting on delayed ACKs
+    wbufsize = -1
+
+    server: ModuleServer
+
+    def do_GET(self) -> None:
+        self._respond(True)
+
+    def do_HEAD(self) -> None:
+        self._respond(False)
+
+    def _encoding(self, resource: _Resource) -> str:
+        if not (self.server.compress and resource.compressible):
+            return 'identity'
+        accepted = set()
+        for item in self.headers.get('Accept-Encoding', '').split(','):
+            coding, _, params = item.partition(';')
+            if params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+                accepted.add(coding.strip().lower())
+        if zstandard is not None and 'zstd' in accepted:
+            return 'zstd'
+        if 'gzip' in accepted:
+            return 'gzip'
+        return 'identity'
+
+    def _respond(self, send_body: bool) -> None:
+        resource = self.server.resource(urlsplit(self.path).path)
+        if resource is None:
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+
+        encoding = self._encoding(resource)
+        etag = resource.etag if encoding == 'identity' else f'{resource.etag[:-1]}-{encoding}"'
+        matches = [tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')]
+        if etag in matches or '*' in matches:
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
+        body = resource.encoded(encoding)
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-Type', resource.content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Vary', 'Accept-Encoding')
+        if encoding != 'identity':
+            self.send_header('Content-Encoding', encoding)
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog='python -m import_customiser.server', description='Serve modules to network imports')
+    parser.add_argument('directory', help='the directory of modules to serve')
+    parser.add_argument('--bind', default='', help='the address to listen on (all by default)')
+    parser.add_argument('--port', type=int, default=8000, help='the port to listen on (8000 by default)')
+    parser.add_argument('--no-bytecode', action='store_true', help="don't serve compiled code")
+    parser.add_argument('--no-compress', action='store_true', help="don't compress responses")
+    parser.add_argument('--quiet', action='store_true', help="don't log requests")
+    args = parser.parse_args(argv)
+
+    # So that `.type` and `.struct` files can be compiled
+    load(structs=True)
+
+    with ModuleServer((args.bind, args.port), args.directory, not args.no_bytecode,
+                      not args.no_compress, args.quiet) as server:
+        host, port = server.server_address[:2]
+        print(f'Serving {server.directory} on http://{host or "0.0.0.0"}:{port}/', file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
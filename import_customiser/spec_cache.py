@@ -0,0 +1,248 @@
+'''
+Copyright 2020 Jonathan Leeming
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+	http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+A persistent cache of where modules were found on the path
+
+Each entry is checked against the mtimes of the directories searched to
+find it, which change whenever a file is added to, removed from or renamed
+in them, so a start-up in an unchanged environment doesn't scan the path
+'''
+
+import atexit
+import json
+import sys
+from importlib.machinery import (ExtensionFileLoader, ModuleSpec, PathFinder,
+                                 SourceFileLoader, SourcelessFileLoader)
+from importlib.util import spec_from_file_location
+from os import getcwd, getpid, replace, stat, unlink
+from os.path import dirname
+from threading import Lock
+from typing import Any, Optional, Sequence
+
+from . import export
+from .import_utils import ImportLoader, installed_importers
+
+
+CACHE_VERSION = 1
+
+_LOADERS = {
+    SourceFileLoader: 'source',
+    SourcelessFileLoader: 'sourceless',
+    ExtensionFileLoader: 'extension',
+}
+
+
+def _loader_kind(loader: Any) -> Optional[str]:
+    if type(loader) in _LOADERS:
+        return _LOADERS[type(loader)]
+    if isinstance(loader, ImportLoader):
+        return 'import:' + loader.get_filename('').rpartition('.')[2]
+    return None
+
+
+def _make_loader(kind: str, name: str, origin: str) -> Optional[Any]:
+    if kind.startswith('import:'):
+        importer = installed_importers().get(kind[len('import:'):])
+        return importer and ImportLoader(origin, importer.populate_module)
+    for loader, loader_kind in _LOADERS.items():
+        if loader_kind == kind:
+            return loader(name, origin)
+    return None
+
+
+@export
+class SpecCache:
+    '''A cache of module specs, stored in the JSON file `filename`
+
+    Entries are `name -> [origin, loader kind, submodule locations,
+    extensions, searched, packages]`. `searched` is the `[directory, mtime]`
+    of each path entry searched, up to and including the one the module was
+    found in (all of them for modules which weren't found), and `packages`
+    those of a package's own directories. Each directory is only stat'ed
+    once per process
+    '''
+
+    def __init__(self, filename: str) -> None:
+        self.filename = filename
+        self.hits = self.misses = 0
+        self._entries: dict[str, list[Any]] = self._load()
+        self._mtimes: dict[str, int] = {}
+        self._dirty = False
+        self._lock = Lock()
+
+    def _load(self) -> dict[str, list[Any]]:
+        try:
+            with open(self.filename, 'rb') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(data, dict) or data.get('version') != [CACHE_VERSION, sys.version]:
+            return {}
+        entries = data.get('entries')
+        return entries if isinstance(entries, dict) else {}
+
+    def save(self) -> None:
+        '''Write the cache file if it has changed, ignoring errors
+
+        An existing file is overwritten in place: replacing it would change
+        the mtime of its directory, which invalidates every entry that
+        searched it when it's on the path. Readers treat a partly written
+        file as empty
+        '''
+
+        if not self._dirty:
+            return
+        with self._lock:
+            data = json.dumps({'version': [CACHE_VERSION, sys.version], 'entries': self._entries},
+                              separators=(',', ':'))
+            self._dirty = False
+
+        try:
+            with open(self.filename, 'r+') as f:
+                f.write(data)
+                f.truncate()
+            return
+        except FileNotFoundError:
+            pass
+        except OSError:
+            return
+
+        tmp = f'{self.filename}.{getpid()}.tmp'
+        try:
+            with open(tmp, 'w') as f:
+                f.write(data)
+            replace(tmp, self.filename)
+        except OSError:
+            try:
+                unlink(tmp)
+            except OSError:
+                pass
+
+    def _mtime(self, directory: str) -> int:
+        try:
+            return self._mtimes[directory]
+        except KeyError:
+            try:
+                mtime = stat(directory).st_mtime_ns
+            except OSError:
+                mtime = -1
+            self._mtimes[directory] = mtime
+            return mtime
+
+    def invalidate(self) -> None:
+        '''Forget the directories' mtimes, so they're stat'ed again
+        '''
+        self._mtimes.clear()
+
+    def _valid(self, entry: list[Any], searched: list[str]) -> bool:
+        origin, _, _, extensions, dirs, packages = entry
+        # The same directories would be searched, in the same order, and
+        # none of them has changed
+        if origin is None and len(dirs) != len(searched):
+            return False
+        return (extensions == ','.join(installed_importers())
+                and [d for d, _ in dirs] == searched[:len(dirs)]
+                and all(self._mtime(d) == mtime for d, mtime in dirs + packages))
+
+    def _to_spec(self, name: str, entry: list[Any]) -> Optional[ModuleSpec]:
+        origin, kind, locations = entry[:3]
+        loader = _make_loader(kind, name, origin)
+        if loader is None:
+            return None
+        return spec_from_file_location(
+            name, origin, loader=loader, submodule_search_locations=locations)
+
+    def _record(self, name: str, spec: Optional[ModuleSpec], searched: list[str]) -> None:
+        packages = []
+        if spec is None:
+            origin, kind, locations, dirs = None, None, None, searched
+        else:
+            kind = _loader_kind(spec.loader)
+            origin, locations = spec.origin, spec.submodule_search_locations
+            if kind is None or origin is None:
+                return
+
+            # The path entry it's in, which is the parent of a package
+            found = dirname(origin)
+            if locations is not None:
+                found = dirname(found)
+            if found not in searched:
+                return
+            dirs = searched[:searched.index(found) + 1]
+            if locations is not None:
+                locations = packages = list(locations)
+
+        entry = [origin, kind, locations, ','.join(installed_importers()),
+                 [[d, self._mtime(d)] for d in dirs], [[d, self._mtime(d)] for d in packages]]
+        with self._lock:
+            self._entries[name] = entry
+            self._dirty = True
+
+    def find_spec(self, name: str, path: Optional[Sequence[str]] = None) -> Optional[ModuleSpec]:
+        '''Find the module `name` on `path` (`sys.path` by default) as
+        `PathFinder` does, from the cache if it's still valid
+        '''
+
+        searched = [entry or getcwd() for entry in (sys.path if path is None else path)
+                    if isinstance(entry, str)]
+        entry = self._entries.get(name)
+        if entry is not None and self._valid(entry, searched):
+            spec = None if entry[0] is None else self._to_spec(name, entry)
+            if spec is not None or entry[0] is None:
+                self.hits += 1
+                return spec
+
+        self.misses += 1
+        spec = PathFinder.find_spec(name, path)
+        self._record(name, spec, searched)
+        return spec
+
+
+class _CachedPathFinder:
+    '''Meta path finder which replaces `PathFinder`, and only has it search
+    the path when a `SpecCache` has no valid entry
+    '''
+
+    def __init__(self, cache: SpecCache) -> None:
+        self.cache = cache
+
+    def find_spec(self, name: str, path: Optional[Sequence[str]] = None, target: Any = None) -> Optional[ModuleSpec]:
+        return self.cache.find_spec(name, path)
+
+    def invalidate_caches(self) -> None:
+        self.cache.invalidate()
+        PathFinder.invalidate_caches()
+
+    @staticmethod
+    def find_distributions(*args: Any, **kwargs: Any) -> Any:
+        '''Find distributions for `importlib.metadata`, as `PathFinder` does
+        '''
+        return PathFinder.find_distributions(*args, **kwargs)
+
+
+@export
+def install_spec_cache(filename: str) -> SpecCache:
+    '''Find modules through a persistent `SpecCache` stored in `filename`,
+    which is saved at exit
+    '''
+
+    cache = SpecCache(filename)
+    finder = _CachedPathFinder(cache)
+    if PathFinder in sys.meta_path:
+        sys.meta_path[sys.meta_path.index(PathFinder)] = finder
+    else:
+        sys.meta_path.append(finder)
+    atexit.register(cache.save)
+    return cache
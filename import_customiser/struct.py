@@ -14,53 +14,455 @@ See the License for the specific language governing permissions and
 limitations under the License.
 '''
 
-from typing import Iterable, Type
+import ast
+import sys
+from functools import lru_cache
+from operator import attrgetter
+from typing import Any, Callable, Iterable, Optional, Type
+from weakref import WeakValueDictionary
 
 from . import NoDuplicateOrderedDict, export
-from .descriptor import Descriptor
+from .descriptor import Descriptor, code_blocks, code_file, constant_names, parse_block, set_lines
+from .record import RecordLayout
 
 
-def _get_fields(fields: Iterable[str], self: bool = False, cls: bool = False):
-    if self:
-        yield 'self'
-    if cls:
-        yield 'cls'
+def _arguments(*names: str) -> ast.arguments:
+    return ast.arguments(
+        posonlyargs=[], args=[ast.arg(name) for name in names],
+        kwonlyargs=[], kw_defaults=[], defaults=[])
 
-    yield from fields
 
+def _make_init(fields: Iterable[str], lineno: int) -> ast.Module:
+    args = _arguments('__self', *fields)
+    body = [ast.Assign([ast.Attribute(ast.Name('__self', ast.Load()), name, ast.Store())],
+                       ast.Name(name, ast.Load()))
+            for name in fields]
+    init = ast.FunctionDef(
+        name='__init__', args=args, body=body, decorator_list=[], lineno=lineno, end_lineno=lineno)
+    return ast.fix_missing_locations(ast.Module([init], []))
 
-def _make_init(fields: Iterable[str]):
-    code = f'def __init__(' + \
-        ', '.join(_get_fields(fields, self=True)) + '):\n'
-    for name in fields:
-        code += f'\tself.{name} = {name}\n'
-    return code
+
+# The generated code's own names start with `__`, which a field's name can't
+# (in a class body, it would be mangled), and descriptors' `self`,
+# `instance` and `value` are renamed to match
+_LOCALS = {name: '__' + name for name in ('self', 'instance', 'value')}
+
+
+class _RenameLocals(ast.NodeTransformer):
+    def visit_Name(self, node: ast.Name) -> ast.Name:
+        if node.id in _LOCALS:
+            return ast.copy_location(ast.Name(_LOCALS[node.id], node.ctx), node)
+        return node
+
+
+@lru_cache(maxsize=None)
+def _code_names(desc_type: type) -> frozenset[str]:
+    # The other names a descriptor's code uses, like `isinstance` or `len`
+    tree = ast.parse('\n'.join(set_lines(desc_type) + desc_type.store_code()))
+    return frozenset(node.id for node in ast.walk(tree)
+                     if isinstance(node, ast.Name) and node.id not in _LOCALS)
+
+
+def _reserved_fields(descriptors: dict[str, Descriptor]) -> list[str]:
+    # Fields which would hide those names as arguments of a fused __init__
+    used = frozenset().union(*(_code_names(type(desc)) for desc in descriptors.values()))
+    return [name for name in descriptors if name in used]
+
+
+def _set_field(
+    name: str, desc: Descriptor, slots: bool, filename: str, check: bool = True
+) -> list[ast.stmt]:
+    '''__self = __desc_<name>
+    <set lines, if check>
+    <store lines, or __store_<name>(__instance, __value) for slots>
+
+    with the descriptor's `self`, `instance` and `value` renamed, and the set
+    lines on their lines of `filename` if they came from there
+    '''
+
+    bind = ast.Assign([ast.Name('__self', ast.Store())], ast.Name('__desc_' + name, ast.Load()))
+    if slots:
+        store = [ast.Expr(ast.Call(
+            ast.Name('__store_' + name, ast.Load()),
+            [ast.Name('__instance', ast.Load()), ast.Name('__value', ast.Load())], []))]
+    else:
+        store = [_RenameLocals().visit(line) for line in ast.parse('\n'.join(type(desc).store_code())).body]
+    if not check:
+        return [bind, *store]
+
+    lines = [line for block in code_blocks(type(desc)) for line in parse_block(block, filename)]
+    lines = [_RenameLocals().visit(_BindConstants(name, _constants(desc)).visit(line)) for line in lines]
+    return [bind, *lines, *store]
+
+
+def _constants(desc: Descriptor) -> dict[str, Any]:
+    values = {}
+    for attr in constant_names(type(desc)):
+        try:
+            values[attr] = getattr(desc, attr)
+        except AttributeError:
+            pass
+    return values
+
+
+class _BindConstants(ast.NodeTransformer):
+    '''Replace `self.<constant>` with `__const_<field>_<constant>`, which the
+    factory binds to its value
+    '''
+
+    def __init__(self, field: str, constants: dict[str, Any]) -> None:
+        self.field = field
+        self.constants = constants
+
+    def visit_Attribute(self, node: ast.Attribute) -> ast.expr:
+        self.generic_visit(node)
+        if (isinstance(node.value, ast.Name) and node.value.id == 'self'
+                and node.attr in self.constants and isinstance(node.ctx, ast.Load)):
+            return ast.copy_location(ast.Name(f'__const_{self.field}_{node.attr}', ast.Load()), node)
+        return node
+
+
+def _fused_init(
+    descriptors: dict[str, Descriptor], slots: bool, filename: str, check: bool = True
+) -> ast.FunctionDef:
+    '''def __init__(__instance, <field>...):
+        __value = <field>
+        <_set_field(field)>
+        ...
+
+    or, without `check`:
+
+    def _from_unchecked(<field>...):
+        __instance = __new(__cls)
+        __value = <field>
+        <_set_field(field, check=False)>
+        ...
+        return __instance
+    '''
+
+    body = []
+    for name, desc in descriptors.items():
+        stmts = _set_field(name, desc, slots, filename, check)
+        if any(isinstance(node, ast.Return) for stmt in stmts for node in ast.walk(stmt)):
+            # A return would end __init__, so set it through the descriptor
+            # (or the validating __setattr__, for slots)
+            if slots:
+                set_ = ast.Call(ast.Name('__setattr', ast.Load()), [
+                    ast.Name('__instance', ast.Load()), ast.Constant(name), ast.Name(name, ast.Load())], [])
+            else:
+                set_ = ast.Call(
+                    ast.Attribute(ast.Name('__desc_' + name, ast.Load()), '__set__', ast.Load()),
+                    [ast.Name('__instance', ast.Load()), ast.Name(name, ast.Load())], [])
+            body.append(ast.Expr(set_))
+        else:
+            body.append(ast.Assign([ast.Name('__value', ast.Store())], ast.Name(name, ast.Load())))
+            body += stmts
+
+    if check:
+        return ast.FunctionDef(
+            name='__init__', args=_arguments('__instance', *descriptors), body=body, decorator_list=[])
+
+    new = ast.Call(ast.Name('__new', ast.Load()), [ast.Name('__cls', ast.Load())], [])
+    body.insert(0, ast.Assign([ast.Name('__instance', ast.Store())], new))
+    body.append(ast.Return(ast.Name('__instance', ast.Load())))
+    return ast.FunctionDef(
+        name='_from_unchecked', args=_arguments(*descriptors), body=body, decorator_list=[])
+
+
+def _fused_setattr(descriptors: dict[str, Descriptor], filename: str) -> ast.FunctionDef:
+    '''def __setattr(__instance, __name, __value):
+        if __name == <field>:
+            <_set_field(field)>
+            return
+        ...
+        __set_attr(__instance, __name, __value)
+    '''
+
+    args = '__instance', '__name', '__value'
+    body = []
+    for name, desc in descriptors.items():
+        test = ast.Compare(ast.Name('__name', ast.Load()), [ast.Eq()], [ast.Constant(name)])
+        body.append(ast.If(test, _set_field(name, desc, True, filename) + [ast.Return()], []))
+
+    set_attr = ast.Call(ast.Name('__set_attr', ast.Load()), [ast.Name(arg, ast.Load()) for arg in args], [])
+    return ast.FunctionDef(
+        name='__setattr', args=_arguments(*args),
+        body=body + [ast.Expr(set_attr)], decorator_list=[])
+
+
+def _make_methods(
+    cls: type, descriptors: dict[str, Descriptor], slots: bool, location: tuple[str, int]
+) -> dict[str, Callable]:
+    '''def _factory(__cls, __new, __set_attr, <__desc_field>..., <__store_field>..., <__const_field_constant>...):
+        <_fused_init()>
+        <_fused_init(check=False)>
+        <_fused_setattr(), for slots>
+        return {'__init__': __init__, '_from_unchecked': _from_unchecked, '__setattr__': __setattr}
+
+    Every field's validation is inlined, so constructing a structure is a
+    single Python call however many fields it has. Slots are stored through
+    their member descriptors, so they can only be made once `cls` exists.
+    The descriptors' `constants` are bound by the factory.
+    It's compiled as the schema file the fields' set lines came from, with
+    them on their own lines, or else as `location` (the class statement)
+    '''
+
+    filename, lineno = code_file(
+        (block for desc in descriptors.values() for block in code_blocks(type(desc))), location)
+    functions = {
+        '__init__': _fused_init(descriptors, slots, filename),
+        '_from_unchecked': _fused_init(descriptors, slots, filename, check=False)}
+    if slots:
+        functions['__setattr__'] = _fused_setattr(descriptors, filename)
+    for function in functions.values():
+        function.lineno = function.end_lineno = lineno
+    result = ast.Dict([ast.Constant(name) for name in functions],
+                      [ast.Name(f.name, ast.Load()) for f in functions.values()])
+
+    names = [*descriptors]
+    constants = {f'__const_{name}_{attr}': value for name, desc in descriptors.items()
+                 for attr, value in _constants(desc).items()}
+    factory = ast.FunctionDef(
+        name='_factory', body=[*functions.values(), ast.Return(result)], decorator_list=[],
+        lineno=lineno, end_lineno=lineno,
+        args=_arguments('__cls', '__new', '__set_attr', *('__desc_' + name for name in names),
+                        *('__store_' + name for name in names if slots), *constants))
+
+    namespace = {}
+    exec(compile(ast.fix_missing_locations(ast.Module([factory], [])), filename, 'exec'), namespace)
+    stores = [cls.__dict__[name].__set__ for name in names] if slots else []
+    methods = namespace['_factory'](
+        cls, cls.__new__, object.__setattr__, *descriptors.values(), *stores, *constants.values())
+
+    for name, method in methods.items():
+        method.__name__ = name
+        method.__qualname__ = f'{cls.__qualname__}.{name}'
+    return methods
+
+
+def _make_delattr(fields: Iterable[str]) -> Callable[[Any, str], None]:
+    fields = frozenset(fields)
+    del_attr = object.__delattr__
+
+    def __delattr__(self, name: str) -> None:
+        if name in fields:
+            raise AttributeError('Can\'t delete attributes')
+        del_attr(self, name)
+
+    return __delattr__
+
+
+def _frozen_setattr(self, name: str, value: Any) -> None:
+    raise AttributeError(f'Can\'t set attributes of frozen {type(self).__name__}')
+
+
+def _frozen_delattr(self, name: str) -> None:
+    raise AttributeError(f'Can\'t delete attributes of frozen {type(self).__name__}')
+
+
+def _make_eq_hash(get_values: Callable[[Any], tuple]) -> dict[str, Callable]:
+    def __eq__(self, other: Any) -> bool:
+        if type(other) is not type(self):
+            return NotImplemented
+        return get_values(self) == get_values(other)
+
+    def __hash__(self) -> int:
+        return hash(get_values(self))
+
+    return {'__eq__': __eq__, '__hash__': __hash__}
+
+
+def _values_getter(fields: list[str]) -> Callable[[Any], tuple]:
+    if len(fields) > 1:
+        return attrgetter(*fields)
+    if fields:
+        name = fields[0]
+        return lambda instance: (getattr(instance, name),)
+    return lambda instance: ()
 
 
 class _StructMeta(type):
     @classmethod
-    def __prepare__(*_) -> NoDuplicateOrderedDict:
+    def __prepare__(*_, **__) -> NoDuplicateOrderedDict:
         return NoDuplicateOrderedDict()
 
-    def __new__(cls: Type[type], clsname: str, bases: tuple[type, ...], clsdict: NoDuplicateOrderedDict) -> type:
-        fields = (key for key, val in clsdict.items()
-                  if isinstance(val, Descriptor))
+    def __new__(
+        cls:      Type[type],
+        clsname:  str,
+        bases:    tuple[type, ...],
+        clsdict:  NoDuplicateOrderedDict,
+        slots:    bool = False,
+        layout:   Optional[str] = None,
+        frozen:   bool = False,
+        intern:   bool = False
+    ) -> type:
+        # The class statement, where generated methods without lines of
+        # their own are put
+        frame = sys._getframe(1)
+        location = frame.f_code.co_filename, frame.f_lineno
+
+        fields = [key for key, val in clsdict.items()
+                  if isinstance(val, Descriptor)]
         for name in fields:
             clsdict[name].name = name
 
-        if fields:
-            init_code = _make_init(fields)
+        descriptors = {name: clsdict[name] for name in fields}
+        reserved = _reserved_fields(descriptors)
+        fused = not reserved
+        if fields and not fused:
+            if frozen:
+                raise TypeError(f'Frozen structures can\'t have fields named {", ".join(reserved)}')
+            init_code = compile(_make_init(fields, location[1]), location[0], 'exec')
             exec(init_code, globals(), clsdict)
 
-        clsobj = super().__new__(cls, clsname, bases, dict(clsdict))
+        if intern and not frozen:
+            raise TypeError('Only frozen structures can be interned')
+
+        if slots:
+            for name in fields:
+                del clsdict[name]
+            clsdict['__slots__'] = (*fields, '__weakref__') if intern else tuple(fields)
+            if not frozen:
+                clsdict['__delattr__'] = _make_delattr(fields)
+
+        get_values = _values_getter(fields)
+        if frozen:
+            clsdict['__setattr__'] = _frozen_setattr
+            clsdict['__delattr__'] = _frozen_delattr
+            clsdict.update(_make_eq_hash(get_values))
+
+        # Only interned classes pay for a Python level __call__
+        metaclass = _InternedStructMeta if intern else cls
+        clsobj = super().__new__(metaclass, clsname, bases, dict(clsdict))
+        if fields and (fused or slots):
+            methods = _make_methods(clsobj, descriptors, slots, location)
+            if not fused:
+                del methods['__init__'], methods['_from_unchecked']
+            else:
+                methods['_from_unchecked'] = staticmethod(methods['_from_unchecked'])
+            if frozen:
+                methods.pop('__setattr__', None)
+            for name, method in methods.items():
+                setattr(clsobj, name, method)
         setattr(clsobj, '_fields', fields)
+        setattr(clsobj, '_descriptors', descriptors)
+        setattr(clsobj, '_get_values', staticmethod(get_values))
+        setattr(clsobj, '_interned', WeakValueDictionary() if intern else None)
+        if layout is not None:
+            setattr(clsobj, '_record', RecordLayout(clsobj, layout))
         return clsobj
 
 
+class _InternedStructMeta(_StructMeta):
+    def __call__(cls, *args: Any, **kwargs: Any) -> Any:
+        # The instance is made first, so the values are validated (and any
+        # equal but invalid values, like 1.0 for an Integer, are rejected)
+        instance = super().__call__(*args, **kwargs)
+        table = cls._interned
+        if table is None:
+            return instance
+
+        key = cls._get_values(instance)
+        existing = table.get(key)
+        if existing is not None:
+            return existing
+        table[key] = instance
+        return instance
+
+
 @export
 class Struct(metaclass=_StructMeta):
+    '''Base class for structures of typed fields
+
+    `class Point(Struct, slots=True)` stores the fields in `__slots__`
+    rather than in a `__dict__`, which is smaller and faster to read.
+    `class Point(Struct, layout='<')` gives the structure a fixed binary
+    layout from its fields' `pack_format`s, in that byte order (see
+    `record`).
+    `class Currency(Struct, frozen=True)` can't be changed after it's made,
+    and is hashable and compared by its values; with `intern=True` as well,
+    making an instance equal to a live one returns that one instead
+    '''
+
+    __slots__ = ()
     _fields = []
+    _descriptors = {}
+    _interned: Optional[WeakValueDictionary] = None
+    _record: Optional[RecordLayout] = None
 
     def __repr__(self) -> str:
         args = ', '.join(repr(getattr(self, name)) for name in self._fields)
         return self.__class__.__name__ + '(' + args + ')'
+
+    def __reduce__(self) -> tuple:
+        # Unpickling calls the class, so the values are validated whichever
+        # way they're stored
+        return type(self), self._get_values(self)
+
+    @classmethod
+    def _from_unchecked(cls, *values: Any) -> 'Struct':
+        # Replaced by a generated version which doesn't validate the values
+        return cls(*values)
+
+    @classmethod
+    def _get_record(cls) -> RecordLayout:
+        if cls._record is None:
+            raise TypeError(f'{cls.__name__} has no binary layout')
+        return cls._record
+
+    def to_bytes(self) -> bytes:
+        return self._get_record().pack(self)
+
+    @classmethod
+    def from_bytes(cls, data: Any, offset: int = 0) -> 'Struct':
+        '''Unpack (and validate) an instance from a bytes-like object
+        '''
+        return cls(*cls._get_record().unpack(data, offset))
+
+    @classmethod
+    def view(cls, buffer: Any, offset: int = 0) -> Any:
+        '''Get a read-only view of the record at `offset` in `buffer`
+
+        Fields are read from the buffer when they're accessed, without
+        copying the record or validating it
+        '''
+        return cls._get_record().View(memoryview(buffer), offset)
+
+
+def _restore_batch(cls: Optional[type], columns: tuple[tuple, ...], trusted: bool, length: int = 0) -> 'StructBatch':
+    if cls is None:
+        return StructBatch(trusted=trusted)
+
+    # Interned instances have to go through the intern table
+    unchecked = trusted and cls._interned is None
+    make = cls._from_unchecked if unchecked else cls
+    if not columns:
+        # A class without fields
+        return StructBatch((make() for _ in range(length)), trusted)
+    return StructBatch(map(make, *columns), trusted)
+
+
+@export
+class StructBatch(list):
+    '''A list of instances of one `Struct` class, which pickles compactly
+
+    The class is pickled once and then the values of each field together,
+    rather than the class and the fields of every instance.
+    With `trusted=True` the values aren't validated again when unpickled,
+    which is only safe if they come from instances of the same class, e.g.
+    when sending work to a `ProcessPoolExecutor`
+    '''
+
+    def __init__(self, structs: Iterable[Struct] = (), trusted: bool = False) -> None:
+        super().__init__(structs)
+        self.trusted = trusted
+
+    def __reduce__(self) -> tuple:
+        if not self:
+            return _restore_batch, (None, (), self.trusted)
+
+        cls = type(self[0])
+        if any(type(st) is not cls for st in self):
+            raise TypeError('A StructBatch must only contain instances of one class')
+        columns = tuple(zip(*map(cls._get_values, self)))
+        return _restore_batch, (cls, columns, self.trusted, len(self))
@@ -0,0 +1,233 @@
+'''
+Copyright 2020 Jonathan Leeming
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+	http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+from array import array
+from typing import Any, Collection, Iterable, Iterator, Mapping, Sequence, Union
+
+from . import export
+from .descriptor import Descriptor
+from .struct import Struct
+
+
+BACKENDS = 'array', 'numpy'
+'''Valid values for the `backend` of a `StructArray`'''
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError('The numpy backend needs NumPy to be installed') from None
+    return numpy
+
+
+def _make_column(desc: Descriptor, values: Iterable[Any], backend: str):
+    typecode = desc.typecode
+    if typecode is None:
+        return list(values)
+
+    try:
+        if backend == 'numpy':
+            numpy = _numpy()
+            if isinstance(values, numpy.ndarray):
+                # Refuse lossy conversions, like array.array does
+                return values.astype(typecode, casting='safe')
+            return numpy.frombuffer(array(typecode, values), typecode)
+
+        if isinstance(values, array) and values.typecode == typecode:
+            return values[:]
+        return array(typecode, values)
+    except OverflowError:
+        raise ValueError(f'Must fit in an array of typecode {typecode!r}') from None
+
+
+class _Row:
+    '''A view of one row of a `StructArray`, with an attribute per field
+    '''
+
+    __slots__ = ('_array', '_index')
+    _fields: tuple[str, ...] = ()
+
+    def __init__(self, array_: 'StructArray', index: int) -> None:
+        self._array = array_
+        self._index = index
+
+    def __iter__(self) -> Iterator[Any]:
+        columns, index = self._array.columns, self._index
+        return (columns[name][index] for name in self._fields)
+
+    def __repr__(self) -> str:
+        return self._array.struct.__name__ + '(' + ', '.join(map(repr, self)) + ')'
+
+    def to_struct(self) -> Struct:
+        return self._array.struct(*self)
+
+
+def _column_property(name: str) -> property:
+    def get(row: _Row) -> Any:
+        return row._array.columns[name][row._index]
+
+    def set_(row: _Row, value: Any) -> None:
+        row._array.set(row._index, name, value)
+
+    return property(get, set_)
+
+
+_array_types: dict[type, type['StructArray']] = {}
+
+
+@export
+class StructArray:
+    '''Columnar storage for many instances of a `Struct` class
+
+    Usage:
+    points = StructArray[Point].from_rows([(1, 2), (3, 4)])
+    points[0].x         # 1, through a view of the row
+    points.columns['x'] # array('q', [1, 3])
+
+    Fields whose descriptor has a `typecode` are stored in an `array.array`,
+    or a NumPy array with `backend='numpy'`, and others in a list. Whole
+    columns are validated at once by the descriptors' `check_column()`, and
+    values which don't fit in the typecode, like ints of more than 64 bits
+    for an `Integer`, raise ValueError
+    '''
+
+    struct: type = Struct
+    Row: type = _Row
+
+    def __class_getitem__(cls, struct: type) -> type['StructArray']:
+        try:
+            return _array_types[struct]
+        except KeyError:
+            pass
+
+        if not isinstance(struct, type) or not issubclass(struct, Struct):
+            raise TypeError(f'Expected a Struct class (got {struct!r})')
+
+        fields = tuple(struct._fields)
+        row = type(struct.__name__ + 'Row', (_Row,), {
+            '__slots__': (), '_fields': fields,
+            **{name: _column_property(name) for name in fields}})
+        row.__qualname__ = f'StructArray[{struct.__qualname__}].Row'
+
+        array_type = type(cls.__name__, (cls,), {'struct': struct, 'Row': row})
+        array_type.__qualname__ = f'StructArray[{struct.__qualname__}]'
+        _array_types[struct] = array_type
+        return array_type
+
+    def __init__(self, columns: Mapping[str, Any]) -> None:
+        '''Wrap columns which are already built and validated
+
+        Use `from_columns`, `from_rows` or `from_structs` instead
+        '''
+
+        self.columns = dict(columns)
+        self._length = len(next(iter(self.columns.values()))) if self.columns else 0
+
+    @classmethod
+    def from_columns(
+        cls,
+        columns:  Mapping[str, Iterable[Any]],
+        backend:  str = 'array',
+        validate: bool = True
+    ) -> 'StructArray':
+        '''Build an array from an iterable of values for each field
+        '''
+
+        if cls.struct is Struct:
+            raise TypeError('Use StructArray[<Struct class>]')
+        if backend not in BACKENDS:
+            raise ValueError(f'Invalid backend: {backend!r}')
+
+        descriptors = cls.struct._descriptors
+        if columns.keys() != descriptors.keys():
+            raise TypeError(
+                f'Expected columns {", ".join(descriptors)} (got {", ".join(columns)})')
+
+        built = {}
+        for name, desc in descriptors.items():
+            values = columns[name]
+            if validate:
+                # Before they're converted, which would turn ints into
+                # floats for a column of floats, say
+                values = values if isinstance(values, Collection) else list(values)
+                desc.check_column(values)
+            built[name] = _make_column(desc, values, backend)
+
+        if len({len(column) for column in built.values()}) > 1:
+            raise ValueError('Columns must all be the same length')
+        return cls(built)
+
+    @classmethod
+    def from_rows(
+        cls,
+        rows:     Iterable[Sequence[Any]],
+        backend:  str = 'array',
+        validate: bool = True
+    ) -> 'StructArray':
+        '''Build an array from a sequence of values, in field order, per row
+        '''
+
+        fields = cls.struct._fields
+        rows = rows if isinstance(rows, Sequence) else list(rows)
+        if any(len(row) != len(fields) for row in rows):
+            raise TypeError(f'Rows must have {len(fields)} values')
+
+        columns = list(zip(*rows)) or [()] * len(fields)
+        return cls.from_columns(dict(zip(fields, columns)), backend, validate)
+
+    @classmethod
+    def from_structs(cls, structs: Iterable[Struct], backend: str = 'array') -> 'StructArray':
+        '''Build an array from instances of the `Struct` class
+
+        The values were validated when they were set, so they aren't again
+        '''
+
+        structs = structs if isinstance(structs, Sequence) else list(structs)
+        columns = {name: [getattr(st, name) for st in structs] for name in cls.struct._fields}
+        return cls.from_columns(columns, backend, validate=False)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[_Row, 'StructArray']:
+        if isinstance(index, slice):
+            return type(self)({name: column[index] for name, column in self.columns.items()})
+
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError('StructArray index out of range')
+        return self.Row(self, index)
+
+    def __iter__(self) -> Iterator[_Row]:
+        Row = self.Row
+        return (Row(self, index) for index in range(self._length))
+
+    def __repr__(self) -> str:
+        return f'{type(self).__qualname__}({len(self)} rows)'
+
+    def set(self, index: int, name: str, value: Any) -> None:
+        '''Validate `value` and store it in the field `name` of row `index`
+        '''
+
+        desc = self.struct._descriptors[name]
+        desc.check_column((value,))
+        self.columns[name][index] = _make_column(desc, (value,), 'array')[0]
+
+    def to_structs(self) -> list[Struct]:
+        struct = self.struct
+        return [struct(*values) for values in zip(*self.columns.values())]
@@ -14,98 +14,198 @@ See the License for the specific language governing permissions and
 limitations under the License.
 '''
 
-from types import ModuleType
-from xml.etree.ElementTree import Element, fromstring
+from io import BytesIO
+from threading import RLock
+from types import CodeType, ModuleType
+from typing import BinaryIO, Iterator, Union
+from xml.etree.ElementTree import Element, tostring
 
+from . import bytecode_cache, import_trace, type_importer
 from .import_utils import ImportBase
+from .xml_utils import Source, SourceLines, import_source, iter_elements, parse_xml
 
 from .struct import Struct
 
 
-def _xml_to_code(data: str):
-	root = fromstring(data)
+def _xml_to_code(data: Union[str, bytes]) -> str:
+	root, lines = parse_xml(data)
 
-	code = 'import type_importer\n'
+	source = Source()
+	for import_ in root.findall('import'):
+		source.add(lines[import_], import_source(import_), join=True)
+
+	structures = root.findall('structure')
+	if structures:
+		for st in structures:
+			_xml_struct_code(st, lines, source)
+	elif root.findall('field'):
+		_xml_struct_code(root, lines, source)
+
+	return str(source)
+
+
+def _element_source(elem: Element, lines: SourceLines) -> Source:
+	# An import or structure on its own, to be compiled on its lines of the file
+	source = Source(lines[elem])
+	if elem.tag == 'import':
+		source.add(lines[elem], import_source(elem))
+	else:
+		_xml_struct_code(elem, lines, source)
+	return source
+
+
+def _stream_xml_to_code(file: BinaryIO, filename: str) -> Iterator[CodeType]:
+	for elem, lines in iter_elements(file, ('import', 'structure')):
+		yield _element_source(elem, lines).compile(filename)
 
-	imports = root.findall('import')
-	for import_ in imports:
-		src = import_.get('src')
 
-		aliases = []
-		for alias in import_.findall('alias'):
-			name = alias.get('name')
-			as_name = alias.get('as')
+def _lazy_xml_to_code(data: Union[str, bytes]) -> str:
+	'''<imports>
+	__all__ = [<names>]
+	__lazy_structures__ = ((<name>, <lineno>, <xml>), ...)
+	'''
 
-			if as_name:
-				aliases.append(f'{name} as {as_name}')
-			else:
-				aliases.append(name)
+	if isinstance(data, str):
+		data = data.encode()
 
-		if len(aliases):
-			import_stmt = f'from {src} import ' + ', '.join(aliases)
+	source, structures = Source(), []
+	for elem, lines in iter_elements(BytesIO(data), ('import', 'structure'), roots=('structures',)):
+		if elem.tag == 'import':
+			source.add(lines[elem], import_source(elem), join=True)
 		else:
-			import_stmt = 'import ' + src
-		code += import_stmt + '\n'
+			elem.tail = None
+			structures.append((elem.get('name'), lines[elem], tostring(elem)))
 
-	structures = root.findall('structure')
-	if structures:
-		for st in structures:
-			code += _xml_struct_code(st)
-		return code
+	if not source.lines and not structures:
+		# A single structure, for which laziness would gain nothing
+		return _xml_to_code(data)
+
+	source.add(1, f'__all__ = {[name for name, _, _ in structures]!r}')
+	source.add(1, f'__lazy_structures__ = {tuple(structures)!r}')
+	return str(source)
+
+
+def _lazy_source_to_code(data: bytes, filename: str) -> CodeType:
+	return compile(_lazy_xml_to_code(data), filename, 'exec')
+
+
+def _names(code: CodeType) -> Iterator[str]:
+	# The names used by `code` and the code in it
+	yield from code.co_names
+	for const in code.co_consts:
+		if isinstance(const, CodeType):
+			yield from _names(const)
 
-	fields = root.findall('field')
-	if fields:
-		code += _xml_struct_code
-		return code
 
-	return None
+def _make_lazy(module: ModuleType) -> None:
+	'''Create the structures in `__lazy_structures__` on first access
 
+	Uses module `__getattr__` and `__dir__` (PEP 562), so `dir(module)`
+	still lists every structure
+	'''
 
-def _xml_struct_code(st: Element):
+	namespace = module.__dict__
+	pending = {name: (lineno, xml) for name, lineno, xml in namespace.pop('__lazy_structures__')}
+	# Reentrant, as creating a structure creates the ones it uses
+	lock = RLock()
+
+	def materialise(name: str) -> type:
+		with import_trace.module(f'{module.__name__}.{name}'):
+			lineno, xml = pending.pop(name)
+			with import_trace.stage('generate'):
+				source = _element_source(*parse_xml(xml, lineno))
+			with import_trace.stage('compile'):
+				code = source.compile(module.__file__)
+
+			# Structures used by this one have to exist before its body runs
+			for used in set(_names(code)):
+				if used in pending:
+					materialise(used)
+
+			with import_trace.stage('exec'):
+				exec(code, namespace)
+		return namespace[name]
+
+	def __getattr__(name: str) -> type:
+		with lock:
+			# Created by another thread while this one waited
+			if name in namespace:
+				return namespace[name]
+			if name not in pending:
+				raise AttributeError(f'module {module.__name__!r} has no attribute {name!r}')
+			return materialise(name)
+
+	def __dir__() -> list[str]:
+		with lock:
+			return sorted({*namespace, *pending})
+
+	namespace['__getattr__'] = __getattr__
+	namespace['__dir__'] = __dir__
+
+
+def _xml_struct_code(st: Element, lines: SourceLines, source: Source) -> None:
 	stname = st.get('name')
-	code = f'class {stname}(Struct):\n'
+	keywords = ''
+	for option in ('slots', 'frozen', 'intern'):
+		if st.get(option):
+			keywords += f', {option}={st.get(option)}'
+	if st.get('layout'):
+		keywords += f', layout={st.get("layout")!r}'
+
+	fields = st.findall('field')
+	str_format = st.find('str')
+	if not fields and str_format is None:
+		source.add(lines[st], f'class {stname}(Struct{keywords}): pass')
+		return
+	source.add(lines[st], f'class {stname}(Struct{keywords}):')
 
-	for field in st.findall('field'):
+	for field in fields:
 		name = field.get('name')
 		dtype = field.get('type')
 		kwargs = ', '.join(
 			f'{k}={v}' for k, v in field.items() if k not in ('type', 'name'))
-		code += f'\t{name} = {dtype}({kwargs})\n'
+		source.add(lines[field], f'{name} = {dtype}({kwargs})', 1, join=True)
 
-	str_format = st.find('str')
-	if str_format:
-		use_class = eval(str_format.get('class', 'False'))
+	if str_format is not None:
+		use_class = str_format.get('class', 'False') == 'True'
 
 		format_ = str_format.text
 		format_ = format_.replace('{', '{{').replace('}', '}}')
 		format_ = format_.replace('{' * 4, '{').replace('}' * 4, '}')
-		body = f'f\'{format_}\''
-
-		_repr_ = ''
-		_repr_ += '\tdef __repr__(self):\n'
-		_repr_ += '\t\treturn '
-
-		if use_class:
-			_repr_ += f'type(self).__name__ + \'(\' + '
-		_repr_ += body
+		_repr_ = f'f\'{format_}\''
 		if use_class:
-			_repr_ += ' + \')\'\n'
+			_repr_ = f'type(self).__name__ + \'(\' + {_repr_} + \')\''
 
-		code += _repr_
-
-	return code
+		source.add(lines[str_format], f'def __repr__(self): return {_repr_}', 1)
 
 
 class StructImporter(ImportBase):
 	extension = 'struct'
+	cache_version = 6
+	preamble = 'from import_customiser.struct import Struct\n'
+	lazy: bool = False
+	'''Create each structure on first access, for modules with many of them'''
+
+	generate_source = staticmethod(_xml_to_code)
+
+	@classmethod
+	def get_code(cls, filename: str) -> CodeType:
+		if not cls.lazy:
+			return super().get_code(filename)
+		return bytecode_cache.get_code(filename, _lazy_source_to_code, cls.cache_version, 'lazy')
 
 	@staticmethod
-	def populate_module(module: ModuleType, filename: str) -> ModuleType:
-		with open(filename, 'r') as f:
-			data = f.read()
-		code = _xml_to_code(data)
+	def stream_to_code(filename: str) -> tuple[CodeType, ...]:
+		with open(filename, 'rb') as f:
+			return tuple(_stream_xml_to_code(f, filename))
+
+	@classmethod
+	def populate_module(cls, module: ModuleType, filename: str) -> ModuleType:
+		code = cls.get_code(filename)
 		module.__dict__['Struct'] = Struct
-		exec(code, module.__dict__, module.__dict__)
+		cls.exec_code(code, module.__dict__)
+		if '__lazy_structures__' in module.__dict__:
+			_make_lazy(module)
 		return module
 
 
@@ -15,11 +15,14 @@ limitations under the License.
 '''
 
 from functools import partial
-from types import ModuleType
-from xml.etree.ElementTree import Element, parse, fromstring
+from operator import itemgetter
+from types import CodeType, ModuleType
+from typing import BinaryIO, Iterator, Optional, Union
+from xml.etree.ElementTree import Element
 
-from .descriptor import Descriptor
+from .descriptor import Descriptor, SchemaCode
 from .import_utils import ImportBase
+from .xml_utils import Source, SourceLines, code_lines, import_source, iter_elements, parse_xml
 
 
 def _get_types(root):
@@ -30,178 +33,176 @@ def _get_types(root):
 			yield from _get_types(node)
 
 
-def _dedent(txt):
-	txt = '\n'.join(line for line in txt.split('\n') if line.strip())
-	try:
-		start_pos = next(i for i, j in enumerate(txt) if j.strip())
-	except StopIteration:
-		start_pos = len(txt) - 1
-	return '\n'.join(line[start_pos:] for line in txt.split('\n'))
-
-
-def _indent(txt, n=1):
-	return '\t' * n + txt.replace('\n', '\n' + '\t' * n)
-
-
-def _escaped(txt: str):
-	swaps = {
-		'\\': '\\\\',
-		'\'': '\\\'',
-		'\t': '\\t',
-	}
-	for old, new in swaps.items():
-		txt = txt.replace(old, new)
-	return txt
-
-
-def _get_type(elem: Element):
+def _get_type(elem: Element) -> str:
 	elem_type = elem.get('type')
-	return '' if elem_type else (': ' + elem_type)
+	return f': {elem_type}' if elem_type else ''
 
 
 class _Field:
-	def __init__(self, field: Element) -> None:
+	def __init__(self, field: Element, lines: SourceLines) -> None:
+		self.line = lines[field]
 		self.name = field.get('name')
 		self.type = _get_type(field)
-		self.value = field.text
-
-	def __repr__(self) -> str:
-		return f'{self.name}{self.type} = {self.value}'
-
+		self.value = code_lines(field, lines)
 
-class _NoDefaultParameter:
-	def __bool__(self): return False
+	def write(self, source: Source) -> None:
+		start, lines = self.value
+		if len(lines) < 2:
+			value = lines[0] if lines else 'None'
+			source.add(self.line, f'{self.name}{self.type} = {value}', 1, join=True)
+			return
 
-
-NoDefaultParameter = _NoDefaultParameter()
+		# In brackets, so that each line of the value can stay on its own
+		source.add(start, f'{self.name}{self.type} = ({lines[0]}', 1)
+		for i, line in enumerate(lines[1:], 1):
+			source.continue_(start + i, line)
+		source.continue_(start, ')')
 
 
 class _Param:
-	def __init__(self, param: Element) -> None:
+	def __init__(self, param: Element, lines: SourceLines) -> None:
+		self.line = lines[param]
 		self.name = param.get('name')
 		self.type = _get_type(param)
-		self.default = param.get('default', NoDefaultParameter)
-		self.default = '' if self.default is NoDefaultParameter else (
-			' = ' + self.default)
-
-		self.initialiser = None
-		if param.text:
-			self.initialiser = _dedent(param.text)
-
-	def __repr__(self) -> str:
-		return self.initialiser if self.initialiser else f'self.{self.parameter} = {self.name}'
+		default = param.get('default')
+		self.default = '' if default is None else f' = {default}'
+		self.initialiser = code_lines(param, lines)
 
 	def __str__(self) -> str:
 		return self.name + self.type + self.default
 
+	def write(self, source: Source) -> None:
+		start, lines = self.initialiser
+		if not lines:
+			source.add(self.line, f'self.{self.name} = {self.name}', 2, join=True)
+		for i, line in enumerate(lines):
+			if line:
+				source.add(start + i, line, 2)
 
-class _Import:
-	def __init__(self, import_: Element) -> None:
-		''' New import code from struct_importer.py (factor out?)
-		'''
-		self.src = import_.get('src')
 
-		self.aliases = []
-		for alias in import_.findall('alias'):
-			name = alias.get('name')
-			as_name = alias.get('as')
+class _Type:
+	def __init__(self, elem: Element, lines: SourceLines) -> None:
+		self.line = lines[elem]
+		self.name = elem.get('name')
+		self.base = elem.get('base', 'Descriptor')
+		self.fields: list[_Field] = []
+		self.params: list[_Param] = []
+		self.imports: list[str] = []
+		# The line of the element, and the code in it
+		self.set_code: Optional[tuple[int, tuple[int, list[str]]]] = None
+		self.column_code: Optional[tuple[int, tuple[int, list[str]]]] = None
+
+		# In one pass, rather than a findall() for each tag (most types have
+		# no children at all)
+		for child in elem:
+			tag = child.tag
+			if tag == 'field':
+				self.fields.append(_Field(child, lines))
+			elif tag == 'param':
+				self.params.append(_Param(child, lines))
+			elif tag == 'import':
+				self.imports.append(import_source(child))
+			elif tag == 'set':
+				self.set_code = lines[child], code_lines(child, lines)
+			elif tag == 'column':
+				self.column_code = lines[child], code_lines(child, lines)
 
-			if as_name:
-				self.aliases.append(f'{name} as {as_name}')
-			else:
-				self.aliases.append(name)
+	def __str__(self) -> str:
+		return self.name + '(' + self.base + ')'
 
-	def __repr__(self) -> str:
-		if len(self.aliases):
-			import_stmt = f'from {self.src} import ' + ', '.join(self.aliases)
-		else:
-			import_stmt = 'import ' + self.src
-		return import_stmt
-		
+	def _write_init(self, source: Source) -> None:
+		'''def __init__(self, *args, <params>, **kwargs):
+			<initialisers>
+			super().__init__(*args, **kwargs)
+		'''
 
-_repr = partial(map, repr)
+		params = ', '.join(map(str, self.params))
+		source.add(self.params[0].line, f'def __init__(self, *args, {params}, **kwargs):', 1)
+		for param in self.params:
+			param.write(source)
+		source.add(self.params[-1].line, 'super().__init__(*args, **kwargs)', 2, join=True)
 
+	@staticmethod
+	def _write_code(name: str, line: int, code: tuple[int, list[str]], source: Source) -> None:
+		'''<name> = SchemaCode(<line>, (
+			<line>,
+			...))
 
-class _Type:
-	def __init__(self, elem: Element) -> None:
-		self.name = elem.get('name')
-		self.base = elem.get('base', 'Descriptor')
+		with each line of code on its own line, so `Descriptor` can compile
+		functions from it on the same lines
+		'''
 
-		self.fields = (_Field(field) for field in elem.findall('field'))
-		self.params = (_Param(param) for param in elem.findall('param'))
-		self.imports = (_Import(imp) for imp in elem.findall('import'))
+		start, lines = code
+		if not lines:
+			source.add(line, f'{name} = SchemaCode({line}, ())', 1, join=True)
+			return
 
-		self.set_code = elem.find('set')
-		if self.set_code:
-			self.set_code = _dedent(self.set_code.text)
+		source.add(line, f'{name} = SchemaCode({start}, (', 1)
+		for i, code_line in enumerate(lines):
+			source.continue_(start + i, repr(code_line) + ',')
+		source.continue_(start, '))')
 
-	def __str__(self) -> str:
-		return self.name + '(' + self.base + ')'
+	def write(self, source: Source) -> None:
+		# The body is written in the order of the XML, to keep its lines
+		body = [(field.line, field.write) for field in self.fields]
+		if self.params:
+			body.append((self.params[0].line, self._write_init))
+		if self.set_code is not None and self.set_code[1][1]:
+			body.append((self.set_code[0], partial(self._write_code, 'set_code', *self.set_code)))
+		if self.column_code is not None:
+			body.append((self.column_code[0], partial(self._write_code, 'column_code', *self.column_code)))
 
-	def __repr__(self) -> str:
-		code = ''
-		code = '\n'.join(map(repr, self.imports))
-		code += '\n'
-		code += 'class ' + str(self)
+		for import_ in self.imports:
+			source.add(self.line, import_, join=True)
+		if not body:
+			source.add(self.line, f'class {self}: pass')
+			return
+		source.add(self.line, f'class {self}:')
+		for _, write in sorted(body, key=itemgetter(0)):
+			write(source)
 
-		body = ''
 
-		if self.fields:
-			body += '\n'.join(_repr(self.fields))
-			body += '\n\n'
+def _stream_import(file: BinaryIO, filename: str) -> Iterator[CodeType]:
+	for elem, lines in iter_elements(file, ('type',), roots=('types', 'type')):
+		source = Source(lines[elem])
+		_Type(elem, lines).write(source)
+		yield source.compile(filename)
 
-		if self.params:
-			body += ', '.join(x for x in ('def __init__(self, *args',
-										  ', '.join(map(str, self.params)), '**kwargs):\n') if x)
-			body += _indent('\n'.join(_repr(self.params)))
-			body += '\n'
-			body += _indent('super().__init__(*args, **kwargs)')
-			body += '\n\n'
-
-		if self.set_code:
-			body += '@staticmethod\n'
-			body += 'def set_code():\n'
-			body += _indent('return [')
-			body += '\n'
-			body += _indent(',\n'.join(
-				f'\'{_escaped(line)}\'' for line in self.set_code.split('\n')), 2)
-			body += '\n'
-			body += _indent(']')
-			body += '\n\n'
-
-		code += _indent('\n' + body) if body else ' pass\n\n'
-		code += '\n'
-		return code
-
-
-def _import(data: str):
-	root = fromstring(data)
+
+def _import(data: Union[str, bytes]) -> str:
+	root, lines = parse_xml(data)
 
 	if root.tag == 'types':
-		types = (_Type(elem) for elem in _get_types(root))
+		types = (_Type(elem, lines) for elem in _get_types(root))
 	elif root.tag == 'type':
-		types = (_Type(root),)
+		types = (_Type(root, lines),)
 	else:
 		types = ()
 
-	types = _repr(types)
-	code = '\n'.join(types).split('\n')
-	code = map(lambda x: x.rstrip('\t'), code)
-	code = '\n'.join(line for line in code if line.strip())
-
-	return code
+	source = Source()
+	for type_ in types:
+		type_.write(source)
+	return str(source)
 
 
 class TypeImporter(ImportBase):
 	extension = 'type'
+	cache_version = 4
+	preamble = 'from import_customiser.descriptor import Descriptor, SchemaCode\n'
+
+	generate_source = staticmethod(_import)
 
 	@staticmethod
-	def populate_module(module: ModuleType, filename: str) -> ModuleType:
-		with open(filename, 'r') as f:
-			data = f.read()
-		code = _import(data)
+	def stream_to_code(filename: str) -> tuple[CodeType, ...]:
+		with open(filename, 'rb') as f:
+			return tuple(_stream_import(f, filename))
+
+	@classmethod
+	def populate_module(cls, module: ModuleType, filename: str) -> ModuleType:
+		code = cls.get_code(filename)
 		module.__dict__['Descriptor'] = Descriptor
-		exec(code, module.__dict__, module.__dict__)
+		module.__dict__['SchemaCode'] = SchemaCode
+		cls.exec_code(code, module.__dict__)
 		return module
 
 
@@ -0,0 +1,329 @@
+'''
+Copyright 2020 Jonathan Leeming
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+	http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+A library of common descriptors, which can be combined by inheritance like
+those of a `.type` file
+
+Their validation constants (types, bounds, compiled patterns) are bound
+into the code generated for a `Struct` when the class is made
+
+Usage, in a `.struct` file:
+<import src="import_customiser.typed">
+	<alias name="PositiveInteger" />
+	<alias name="Regex" />
+</import>
+<structure name="User">
+	<field name="id" type="PositiveInteger" />
+	<field name="email" type="Regex" pattern="r'[^@]+@[^@]+'" />
+</structure>
+'''
+
+import re
+from typing import Any, Iterable, Optional, Union
+
+from . import export
+from .descriptor import Descriptor
+
+
+@export
+class Typed(Descriptor):
+    '''Values must be instances of `ty`
+    '''
+
+    ty: Union[type, tuple[type, ...]] = object
+    constants = ('ty', 'type_name')
+
+    @property
+    def type_name(self) -> str:
+        types = self.ty if isinstance(self.ty, tuple) else (self.ty,)
+        return ' or '.join(ty.__qualname__ for ty in types)
+
+    @staticmethod
+    def set_code():
+        return [
+            'if not isinstance(value, self.ty):',
+            '    raise TypeError(f\'Expected {self.type_name} (got {type(value).__qualname__})\')'
+        ]
+
+    @staticmethod
+    def column_code():
+        # Arrays of values of a suitable type needn't be checked one by one
+        return [
+            'if not issubclass(column_type(column), self.ty):',
+            '    for value in column:',
+            '        if not isinstance(value, self.ty):',
+            '            raise TypeError(f\'Expected {self.type_name} (got {type(value).__qualname__})\')'
+        ]
+
+
+@export
+class Number(Typed):
+    '''Values must be instances of `ty`, but not `bool`, which is a subclass
+    of `int` but not a number
+    '''
+
+    # No complex here so that comparison operators (<, >, etc.) can be used
+    ty = int, float
+
+    @staticmethod
+    def set_code():
+        return [
+            'if value.__class__ is bool:',
+            '    raise TypeError(f\'Expected {self.type_name} (got bool)\')'
+        ]
+
+    @staticmethod
+    def column_code():
+        return [
+            'if column_type(column) is bool or (column_type(column) is object'
+            ' and any(value.__class__ is bool for value in column)):',
+            '    raise TypeError(f\'Expected {self.type_name} (got bool)\')'
+        ]
+
+
+@export
+class Integer(Number):
+    ty = int
+    typecode = 'q'
+    pack_format = 'q'
+
+
+@export
+class Float(Number):
+    typecode = 'd'
+    pack_format = 'd'
+
+
+@export
+class Boolean(Typed):
+    ty = bool
+    pack_format = '?'
+
+
+@export
+class String(Typed):
+    ty = str
+
+
+@export
+class Bytes(Typed):
+    ty = bytes
+
+
+@export
+class Sized(Descriptor):
+    '''Values must have a length of at least `minlen`, and at most `maxlen`
+    '''
+
+    constants = ('minlen', 'maxlen')
+
+    def __init__(self, *args, minlen: int = 0, maxlen: Optional[int] = None, **kwargs) -> None:
+        self.minlen = minlen
+        self.maxlen = maxlen
+        super().__init__(*args, **kwargs)
+
+    @staticmethod
+    def set_code():
+        return [
+            'if self.maxlen is not None and len(value) > self.maxlen:',
+            '    raise ValueError(f\'Must have length <= {self.maxlen} (got {len(value)})\')',
+            'if len(value) < self.minlen:',
+            '    raise ValueError(f\'Must have length >= {self.minlen} (got {len(value)})\')'
+        ]
+
+    @staticmethod
+    def column_code():
+        return [
+            'if len(column):',
+            '    if self.maxlen is not None and max(map(len, column)) > self.maxlen:',
+            '        raise ValueError(f\'Must have length <= {self.maxlen} (got {max(map(len, column))})\')',
+            '    if min(map(len, column)) < self.minlen:',
+            '        raise ValueError(f\'Must have length >= {self.minlen} (got {min(map(len, column))})\')'
+        ]
+
+
+@export
+class Range(Descriptor):
+    '''Values must be at least `min`, and at most `max`
+    '''
+
+    constants = ('min', 'max')
+
+    def __init__(self, *args, min: Any = None, max: Any = None, **kwargs) -> None:
+        self.min = min
+        self.max = max
+        super().__init__(*args, **kwargs)
+
+    @staticmethod
+    def set_code():
+        return [
+            'if self.min is not None and value < self.min:',
+            '    raise ValueError(f\'Must be >= {self.min} (got {value})\')',
+            'if self.max is not None and value > self.max:',
+            '    raise ValueError(f\'Must be <= {self.max} (got {value})\')'
+        ]
+
+    @staticmethod
+    def column_code():
+        return [
+            'if len(column):',
+            '    if self.min is not None and column_min(column) < self.min:',
+            '        raise ValueError(f\'Must be >= {self.min} (got {column_min(column)})\')',
+            '    if self.max is not None and column_max(column) > self.max:',
+            '        raise ValueError(f\'Must be <= {self.max} (got {column_max(column)})\')'
+        ]
+
+
+@export
+class Regex(Descriptor):
+    '''Values must match `pattern`, which is compiled once
+    '''
+
+    constants = ('match', 'pattern')
+
+    def __init__(self, *args, pattern: str, **kwargs) -> None:
+        self.pattern = pattern
+        self.match = re.compile(pattern).match
+        super().__init__(*args, **kwargs)
+
+    @staticmethod
+    def set_code():
+        return [
+            'if not self.match(value):',
+            '    raise ValueError(f\'{value!r} doesn\\\'t match the pattern {self.pattern!r}\')'
+        ]
+
+
+@export
+class OneOf(Descriptor):
+    '''Values must be one of `allowed`
+    '''
+
+    constants = ('allowed',)
+
+    def __init__(self, *args, allowed: Iterable[Any], **kwargs) -> None:
+        self.allowed = frozenset(allowed)
+        super().__init__(*args, **kwargs)
+
+    @staticmethod
+    def set_code():
+        return [
+            'if value not in self.allowed:',
+            '    raise ValueError(f\'Must be one of {", ".join(sorted(map(repr, self.allowed)))} (got {value!r})\')'
+        ]
+
+    @staticmethod
+    def column_code():
+        return [
+            'for value in set(column) - self.allowed:',
+            '    raise ValueError(f\'Must be one of {", ".join(sorted(map(repr, self.allowed)))} (got {value!r})\')'
+        ]
+
+
+@export
+class Positive(Descriptor):
+    @staticmethod
+    def set_code():
+        return ['if value <= 0: raise ValueError(f\'Must be > 0 (got {value})\')']
+
+    @staticmethod
+    def column_code():
+        return ['if len(column) and column_min(column) <= 0: '
+                'raise ValueError(f\'Must be > 0 (got {column_min(column)})\')']
+
+
+@export
+class Negative(Descriptor):
+    @staticmethod
+    def set_code():
+        return ['if value >= 0: raise ValueError(f\'Must be < 0 (got {value})\')']
+
+    @staticmethod
+    def column_code():
+        return ['if len(column) and column_max(column) >= 0: '
+                'raise ValueError(f\'Must be < 0 (got {column_max(column)})\')']
+
+
+@export
+class NonNegative(Descriptor):
+    @staticmethod
+    def set_code():
+        return ['if value < 0: raise ValueError(f\'Must be >= 0 (got {value})\')']
+
+    @staticmethod
+    def column_code():
+        return ['if len(column) and column_min(column) < 0: '
+                'raise ValueError(f\'Must be >= 0 (got {column_min(column)})\')']
+
+
+@export
+class NonPositive(Descriptor):
+    @staticmethod
+    def set_code():
+        return ['if value > 0: raise ValueError(f\'Must be <= 0 (got {value})\')']
+
+    @staticmethod
+    def column_code():
+        return ['if len(column) and column_max(column) > 0: '
+                'raise ValueError(f\'Must be <= 0 (got {column_max(column)})\')']
+
+
+@export
+class NonZero(Descriptor):
+    @staticmethod
+    def set_code():
+        return ['if value == 0: raise ValueError(f\'Must be != 0 (got {value})\')']
+
+    @staticmethod
+    def column_code():
+        return ['if 0 in column: raise ValueError(\'Must be != 0 (got 0)\')']
+
+
+@export
+class PositiveInteger(Integer, Positive): pass
+@export
+class NegativeInteger(Integer, Negative): pass
+@export
+class NonNegativeInteger(Integer, NonNegative): pass
+@export
+class NonPositiveInteger(Integer, NonPositive): pass
+@export
+class NonZeroInteger(Integer, NonZero): pass
+@export
+class RangeInteger(Integer, Range): pass
+
+@export
+class PositiveFloat(Float, Positive): pass
+@export
+class NegativeFloat(Float, Negative): pass
+@export
+class NonNegativeFloat(Float, NonNegative): pass
+@export
+class NonPositiveFloat(Float, NonPositive): pass
+@export
+class NonZeroFloat(Float, NonZero): pass
+@export
+class RangeFloat(Float, Range): pass
+
+@export
+class SizedString(String, Sized): pass
+@export
+class RegexString(String, Regex): pass
+@export
+class SizedRegexString(String, Sized, Regex): pass
+@export
+class OneOfString(String, OneOf): pass
+@export
+class SizedBytes(Bytes, Sized): pass
@@ -0,0 +1,230 @@
+'''
+Copyright 2020 Jonathan Leeming
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+	http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+from textwrap import dedent
+from types import CodeType
+from typing import BinaryIO, Container, Iterator, Optional, Union
+from xml.etree.ElementTree import Element, ParseError, TreeBuilder
+from xml.parsers.expat import ExpatError, ParserCreate
+
+from . import import_trace
+
+
+SourceLines = dict[Element, int]
+'''The line of the source each element starts on
+
+Kept apart from the elements, as making them from a subclass of `Element`
+which could hold it takes longer than the rest of the parse'''
+
+
+def parse_xml(data: Union[str, bytes], lineno: int = 1) -> tuple[Element, SourceLines]:
+    '''Parse `data` like `ElementTree.fromstring`, recording source lines
+
+    `lineno` is the line `data` starts on, for fragments of a larger file
+    '''
+
+    builder = TreeBuilder()
+    parser = ParserCreate()
+    parser.buffer_text = True
+    offset = lineno - 1
+    lines: SourceLines = {}
+
+    def start(tag: str, attrs: dict[str, str]) -> None:
+        lines[builder.start(tag, attrs)] = parser.CurrentLineNumber + offset
+
+    parser.StartElementHandler = start
+    parser.EndElementHandler = builder.end
+    parser.CharacterDataHandler = builder.data
+
+    with import_trace.stage('parse'):
+        try:
+            parser.Parse(data, True)
+        except ExpatError as e:
+            raise _parse_error(e) from None
+        return builder.close(), lines
+
+
+def iter_elements(
+    file:       BinaryIO,
+    tags:       Container[str],
+    roots:      Optional[Container[str]] = None,
+    chunk_size: int = 1 << 16
+) -> Iterator[tuple[Element, SourceLines]]:
+    '''Parse `file` incrementally, yielding each element in `tags` as it
+    closes, with the lines of the elements so far
+
+    Elements nested in a yielded element are yielded with it, not on their
+    own. Yielded elements are removed from the tree (and their lines
+    forgotten) afterwards, so memory use is bounded by the largest of them
+    rather than by the whole document.
+    If `roots` is given, nothing is yielded unless the root element's tag is
+    in it
+    '''
+
+    builder = TreeBuilder()
+    parser = ParserCreate()
+    parser.buffer_text = True
+    lines: SourceLines = {}
+
+    stack: list[Element] = []
+    closed: list[tuple[Optional[Element], Element]] = []
+    depth = 0  # The number of open elements in `tags`
+
+    def start(tag: str, attrs: dict[str, str]) -> None:
+        nonlocal depth
+        elem = builder.start(tag, attrs)
+        lines[elem] = parser.CurrentLineNumber
+        stack.append(elem)
+        if tag in tags:
+            depth += 1
+
+    def end(tag: str) -> None:
+        nonlocal depth
+        elem = builder.end(tag)
+        stack.pop()
+        if tag not in tags:
+            return
+        depth -= 1
+        root = stack[0] if stack else elem
+        if depth == 0 and (roots is None or root.tag in roots):
+            closed.append((stack[-1] if stack else None, elem))
+
+    parser.StartElementHandler = start
+    parser.EndElementHandler = end
+    parser.CharacterDataHandler = builder.data
+
+    while True:
+        chunk = file.read(chunk_size)
+        try:
+            parser.Parse(chunk, not chunk)
+        except ExpatError as e:
+            raise _parse_error(e) from None
+
+        for parent, elem in closed:
+            yield elem, lines
+            if parent is not None:
+                parent.remove(elem)
+                for child in elem.iter():
+                    del lines[child]
+        closed.clear()
+
+        if not chunk:
+            break
+
+
+def _parse_error(e: ExpatError) -> ParseError:
+    err = ParseError(str(e))
+    err.code, err.position = e.code, (e.lineno, e.offset)
+    return err
+
+
+class Source:
+    '''Python source generated from XML, with each line of code on the line
+    of the XML it came from, so that tracebacks point into the schema file
+
+    Lines are added in order. A statement for a line that's already taken
+    follows the statement there if it can (`a = 1; b = 2`), or else goes on
+    the next free line. `first` is the line of the XML the source starts on,
+    for code which is compiled element by element
+    '''
+
+    def __init__(self, first: int = 1) -> None:
+        self.first = first
+        self.lines: list[str] = []
+        self._join_indent: Optional[int] = None
+
+    def add(self, lineno: int, text: str, indent: int = 0, join: bool = False) -> None:
+        '''Add `text` on line `lineno`
+
+        Only simple statements can be joined to the one before them
+        '''
+
+        lines = self.lines
+        index = lineno - self.first
+        if index < len(lines) and join and indent == self._join_indent:
+            lines[-1] += '; ' + text
+            return
+        if index > len(lines):
+            lines += [''] * (index - len(lines))
+        lines.append('\t' * indent + text)
+        self._join_indent = indent if join else None
+
+    def continue_(self, lineno: int, text: str) -> None:
+        '''Add `text`, which continues the statement before it (inside
+        brackets), on line `lineno`
+        '''
+
+        lines = self.lines
+        index = lineno - self.first
+        if index < len(lines):
+            lines[-1] += text
+        else:
+            lines += [''] * (index - len(lines))
+            lines.append(text)
+        self._join_indent = None
+
+    def __str__(self) -> str:
+        return '\n'.join(self.lines) + '\n'
+
+    def compile(self, filename: str) -> CodeType:
+        '''Compile the source, keeping its lines if it starts after the first
+        '''
+        return _move_code(compile(str(self), filename, 'exec'), self.first - 1)
+
+
+def _move_code(code: CodeType, offset: int) -> CodeType:
+    # Move `code`, and the code of its functions and classes, down its file
+    if offset == 0:
+        return code
+    consts = tuple(_move_code(const, offset) if isinstance(const, CodeType) else const
+                   for const in code.co_consts)
+    return code.replace(co_firstlineno=code.co_firstlineno + offset, co_consts=consts)
+
+
+def code_lines(elem: Optional[Element], lines: SourceLines) -> tuple[int, list[str]]:
+    '''Get the dedented lines of code in the text of `elem`, without the
+    blank lines around them, and the line of the source the first is on
+    '''
+
+    text = elem.text if elem is not None else None
+    if not text:
+        return 0, []
+    if '\n' not in text:
+        # Like most, which needn't be dedented
+        text = text.strip()
+        return (lines[elem], [text]) if text else (0, [])
+
+    code = dedent(text).split('\n')
+    start = next((i for i, line in enumerate(code) if line), len(code))
+    while code and not code[-1]:
+        code.pop()
+    return lines[elem] + start, code[start:]
+
+
+def import_source(import_: Element) -> str:
+    '''Get the import statement for an `<import>` element
+
+    `<import src="a.b" />` is `import a.b`, and
+    `<import src="a"><alias name="b" as="c" /></import>` is `from a import b as c`
+    '''
+
+    src = import_.get('src')
+    aliases = [alias.get('name') + (f' as {alias.get("as")}' if alias.get('as') else '')
+               for alias in import_.findall('alias')]
+
+    if aliases:
+        return f'from {src} import ' + ', '.join(aliases)
+    return 'import ' + src
@@ -0,0 +1,50 @@
+import importlib
+import sys
+import threading
+
+import pytest
+
+import import_customiser
+from import_customiser import http_pool
+from import_customiser.server import ModuleServer
+
+
+@pytest.fixture
+def module_server():
+    '''Start a `ModuleServer` for a directory, which is stopped afterwards
+    '''
+
+    servers = []
+
+    def start(directory, **options):
+        server = ModuleServer(('127.0.0.1', 0), str(directory), quiet=True, **options)
+        server.url = f'http://127.0.0.1:{server.server_port}/'
+        threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    # Which is harmless for servers a test has stopped already
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def network_path(monkeypatch):
+    '''Import from a URL, forgetting the modules imported from it afterwards
+    '''
+
+    import_customiser.load(types=True, network=True)
+    monkeypatch.setattr(sys, 'path', list(sys.path))
+    monkeypatch.setattr(sys, 'path_importer_cache', dict(sys.path_importer_cache))
+    before = set(sys.modules)
+
+    def add(url):
+        sys.path.insert(0, url)
+        importlib.invalidate_caches()
+
+    yield add
+    for name in set(sys.modules) - before:
+        del sys.modules[name]
+    http_pool.close_pools()
@@ -0,0 +1,126 @@
+import os
+import sys
+
+import pytest
+
+from import_customiser import bytecode_cache
+from import_customiser.bytecode_cache import cache_from_source, get_code
+
+
+@pytest.fixture
+def source(tmp_path, monkeypatch):
+    monkeypatch.setattr(bytecode_cache, 'mode', 'readwrite')
+    monkeypatch.setattr(bytecode_cache, 'invalidation_mode', 'timestamp')
+    monkeypatch.setattr(sys, 'dont_write_bytecode', False)
+    path = tmp_path / 'module.type'
+    path.write_bytes(b'VALUE = 1\n')
+    return path
+
+
+class Compiler:
+    '''`source_to_code` which counts its calls
+    '''
+
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def __call__(self, data: bytes, filename: str):
+        self.calls += 1
+        return compile(data, filename, 'exec')
+
+
+def value(code) -> int:
+    namespace = {}
+    exec(code, namespace)
+    return namespace['VALUE']
+
+
+def test_hits_and_misses(source):
+    compiler = Compiler()
+    assert value(get_code(str(source), compiler)) == 1
+    assert os.path.exists(cache_from_source(str(source)))
+    assert value(get_code(str(source), compiler)) == 1
+    assert compiler.calls == 1
+
+    # Different size
+    source.write_bytes(b'VALUE = 22\n')
+    assert value(get_code(str(source), compiler)) == 22
+    assert compiler.calls == 2
+
+    # Same size, different mtime
+    source.write_bytes(b'VALUE = 33\n')
+    st = source.stat()
+    os.utime(source, (st.st_atime, st.st_mtime + 10))
+    assert value(get_code(str(source), compiler)) == 33
+    assert compiler.calls == 3
+    assert value(get_code(str(source), compiler)) == 33
+    assert compiler.calls == 3
+
+
+def test_versions_are_kept_apart(source):
+    compiler = Compiler()
+    get_code(str(source), compiler, version=1)
+    get_code(str(source), compiler, version=2)
+    assert compiler.calls == 2
+    get_code(str(source), compiler, version=2)
+    assert compiler.calls == 2
+
+
+def test_corrupt_cache_files_are_regenerated(source):
+    compiler = Compiler()
+    get_code(str(source), compiler)
+    cache = cache_from_source(str(source))
+    with open(cache, 'r+b') as f:
+        f.truncate(20)
+    assert value(get_code(str(source), compiler)) == 1
+    assert compiler.calls == 2
+    get_code(str(source), compiler)
+    assert compiler.calls == 2
+
+
+@pytest.mark.parametrize('mode', ['readonly', 'off'])
+def test_modes_which_dont_write(source, monkeypatch, mode):
+    monkeypatch.setattr(bytecode_cache, 'mode', mode)
+    compiler = Compiler()
+    get_code(str(source), compiler)
+    get_code(str(source), compiler)
+    assert compiler.calls == 2
+    assert not os.path.exists(cache_from_source(str(source)))
+
+
+def test_readonly_still_loads(source, monkeypatch):
+    compiler = Compiler()
+    get_code(str(source), compiler)
+    monkeypatch.setattr(bytecode_cache, 'mode', 'readonly')
+    get_code(str(source), compiler)
+    assert compiler.calls == 1
+
+
+@pytest.mark.parametrize('invalidation_mode, checked', [('checked-hash', True), ('unchecked-hash', False)])
+def test_hash_invalidation(source, monkeypatch, invalidation_mode, checked):
+    monkeypatch.setattr(bytecode_cache, 'invalidation_mode', invalidation_mode)
+    compiler = Compiler()
+    get_code(str(source), compiler)
+
+    # Hashes ignore the mtime
+    st = source.stat()
+    os.utime(source, (st.st_atime, st.st_mtime + 10))
+    get_code(str(source), compiler)
+    assert compiler.calls == 1
+
+    source.write_bytes(b'VALUE = 2\n')
+    assert value(get_code(str(source), compiler)) == (2 if checked else 1)
+    assert compiler.calls == (2 if checked else 1)
+
+
+def test_dont_write_bytecode_is_respected(source, monkeypatch):
+    monkeypatch.setattr(sys, 'dont_write_bytecode', True)
+    get_code(str(source), Compiler())
+    assert not os.path.exists(cache_from_source(str(source)))
+
+
+def test_invalid_configuration():
+    with pytest.raises(ValueError, match='Invalid cache mode'):
+        bytecode_cache.configure(mode='sometimes')
+    with pytest.raises(ValueError, match='Invalid invalidation mode'):
+        bytecode_cache.configure(invalidation_mode='never')
@@ -0,0 +1,87 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from import_customiser import bytecode_cache
+from import_customiser import compile as compile_module
+from import_customiser.compile import main
+from import_customiser.import_utils import ImportBase
+
+TYPES = '''\
+<types>
+	<type name="Even">
+		<set>
+			if value % 2: raise ValueError('Odd')
+		</set>
+	</type>
+</types>
+'''
+
+STRUCTS = '''\
+<structures>
+	<import src="aot_types"><alias name="Even" /></import>
+	<structure name="Pair">
+		<field name="a" type="Even" />
+		<field name="b" type="Even" />
+	</structure>
+</structures>
+'''
+
+
+@pytest.fixture
+def tree(tmp_path):
+    (tmp_path / 'aot_types.type').write_text(TYPES)
+    (tmp_path / 'pkg').mkdir()
+    (tmp_path / 'pkg' / 'aot_structs.struct').write_text(STRUCTS)
+    return tmp_path
+
+
+def test_compiles_a_tree(tree, capsys):
+    assert main([str(tree), '-j', '1']) == 0
+    assert capsys.readouterr().out.splitlines()[-1] == '2 compiled, 0 up to date, 0 failed'
+    for schema in (tree / 'aot_types.type', tree / 'pkg' / 'aot_structs.struct'):
+        assert os.path.exists(bytecode_cache.cache_from_source(str(schema)))
+    assert not (tree / 'aot_types.py').exists()
+
+    # Up to date, until forced
+    assert main([str(tree), '-j', '1']) == 0
+    assert capsys.readouterr().out.splitlines()[-1] == '0 compiled, 2 up to date, 0 failed'
+    assert main([str(tree), '-j', '1', '--force', '--quiet']) == 0
+    assert capsys.readouterr().out == ''
+
+
+def test_py_output_runs_without_the_importers(tree):
+    assert main([str(tree), '-j', '1', '--format', 'py', '-q']) == 0
+    assert not os.path.exists(bytecode_cache.cache_from_source(str(tree / 'aot_types.type')))
+
+    result = subprocess.run(
+        [sys.executable, '-c', 'from pkg.aot_structs import Pair; print(Pair(2, 4).b); Pair(2, 3)'],
+        cwd=tree, env={'PYTHONPATH': f'{os.path.dirname(os.path.dirname(__file__))}:{tree}'},
+        capture_output=True, text=True)
+    assert result.stdout.split() == ['4']
+    # On its line of the schema, which the .py file keeps
+    assert 'aot_types.py", line 4, in __init__' in result.stderr
+    assert result.stderr.rstrip().endswith('ValueError: Odd')
+
+
+def test_failures_are_reported(tree, capsys):
+    (tree / 'broken.type').write_text('<types><type name="Broken">')
+    assert main([str(tree), '-j', '1']) == 1
+    captured = capsys.readouterr()
+    assert 'broken.type: ParseError' in captured.err
+    assert captured.out.splitlines()[-1] == '2 compiled, 0 up to date, 1 failed'
+
+
+def test_jobs_default_without_a_cpu_count(tree, monkeypatch):
+    monkeypatch.setattr(compile_module, 'cpu_count', lambda: None)
+    assert main([str(tree), '-q']) == 0
+
+
+def test_importers_without_source_say_so():
+    class Opaque(ImportBase):
+        extension = 'opaque'
+
+    with pytest.raises(NotImplementedError, match='Opaque doesn\'t generate Python source'):
+        Opaque.source_to_code(b'', 'x.opaque')
@@ -0,0 +1,70 @@
+import import_customiser
+from import_customiser.descriptor import Descriptor
+
+
+def misses():
+    info = import_customiser.setter_cache_info()
+    return info['__set__'].misses, info['check_column'].misses
+
+
+def test_classes_with_the_same_code_share_it():
+    class Holder:
+        pass
+
+    before = misses()
+
+    class Odd(Descriptor):
+        @staticmethod
+        def set_code():
+            return ['if not value % 2: raise ValueError("Even")']
+
+    assert misses() == (before[0] + 1, before[1] + 1)
+
+    # Inheriting the same lines
+    class Odder(Odd):
+        pass
+
+    # The same lines in another class
+    class Uneven(Descriptor):
+        @staticmethod
+        def set_code():
+            return ['if not value % 2: raise ValueError("Even")']
+
+    assert misses() == (before[0] + 1, before[1] + 1)
+    assert Odder.__set__.__code__ == Uneven.__set__.__code__
+    assert Odder.__set__ is not Odd.__set__
+
+    Holder.odd = Uneven('odd')
+    holder = Holder()
+    holder.odd = 3
+    assert holder.odd == 3
+    Uneven('odd').check_column([1, 3])
+
+
+def test_the_caches_can_be_cleared():
+    class Small(Descriptor):
+        @staticmethod
+        def set_code():
+            return ['if value > 10: raise ValueError("Too big")']
+
+    import_customiser.setter_cache_clear()
+    info = import_customiser.setter_cache_info()
+    assert info['__set__'].currsize == info['check_column'].currsize == 0
+
+    # Classes made already keep their methods
+    class Holder:
+        small = Small('small')
+
+    holder = Holder()
+    holder.small = 1
+    assert holder.small == 1
+
+    before = misses()
+
+    class Smaller(Descriptor):
+        @staticmethod
+        def set_code():
+            return ['if value > 10: raise ValueError("Too big")']
+
+    assert misses() == (before[0] + 1, before[1] + 1)
+    assert import_customiser.setter_cache_info()['__set__'].currsize == 1
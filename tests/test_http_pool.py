@@ -0,0 +1,125 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from import_customiser import http_pool
+from import_customiser.http_pool import ConnectionPool
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self) -> None:
+        with self.server.lock:
+            self.server.connections += 1
+        super().setup()
+
+    def do_GET(self) -> None:
+        with self.server.lock:
+            self.server.active += 1
+            self.server.most_active = max(self.server.most_active, self.server.active)
+        try:
+            if self.path == '/redirect':
+                self.send_response(302)
+                self.send_header('Location', '/ok')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            if self.path == '/trickle':
+                # Slower than the timeout overall, but not between bytes
+                self.send_response(200)
+                self.send_header('Content-Length', '10')
+                self.end_headers()
+                for _ in range(10):
+                    time.sleep(0.1)
+                    self.wfile.write(b'.')
+                return
+            if self.path == '/slow':
+                time.sleep(0.2)
+            elif self.path == '/hang':
+                time.sleep(1)
+            body = self.path.encode()
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            # Without telling the client, as a server closing an idle
+            # connection does
+            self.close_connection = self.path == '/close'
+        finally:
+            with self.server.lock:
+                self.server.active -= 1
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+class Server(ThreadingHTTPServer):
+    daemon_threads = True
+    block_on_close = False
+
+
+@pytest.fixture
+def server():
+    server = Server(('127.0.0.1', 0), Handler)
+    server.lock = threading.Lock()
+    server.connections = server.active = server.most_active = 0
+    threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+    server.host = f'127.0.0.1:{server.server_port}'
+    yield server
+    http_pool.close_pools()
+    server.shutdown()
+    server.server_close()
+
+
+def test_connections_are_reused(server):
+    pool = ConnectionPool('http', server.host)
+    for path in ('/a', '/b', '/c'):
+        assert pool.request('GET', path)[::2] == (200, path.encode())
+    assert pool.connections == server.connections == 1
+
+
+def test_closed_idle_connections_are_replaced(server):
+    pool = ConnectionPool('http', server.host)
+    assert pool.request('GET', '/close')[0] == 200
+    time.sleep(0.1)
+    assert pool.request('GET', '/ok')[::2] == (200, b'/ok')
+    assert pool.connections == server.connections == 2
+
+
+def test_redirects_are_followed(server):
+    response = http_pool.request(f'http://{server.host}/redirect')
+    assert (response.status, response.body) == (200, b'/ok')
+    assert response.url == f'http://{server.host}/ok'
+
+
+def test_pool_size_limits_connections(server):
+    pool = ConnectionPool('http', server.host, size=2)
+    threads = [threading.Thread(target=pool.request, args=('GET', '/slow')) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert server.most_active == 2
+    assert pool.connections == server.connections == 2
+
+
+def test_timeouts(server):
+    with pytest.raises(OSError):
+        ConnectionPool('http', server.host, timeout=0.2).request('GET', '/hang')
+
+    pool = ConnectionPool('http', server.host, size=1, timeout=0.3)
+    thread = threading.Thread(target=pool.request, args=('GET', '/trickle'))
+    thread.start()
+    time.sleep(0.05)
+    with pytest.raises(TimeoutError, match='No connection'):
+        pool.request('GET', '/ok')
+    thread.join()
+
+
+def test_get_raises_import_error(server):
+    assert http_pool.get(f'http://{server.host}/ok') == b'/ok'
+    with pytest.raises(ImportError):
+        http_pool.get('http://127.0.0.1:1/unreachable')
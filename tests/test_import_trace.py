@@ -0,0 +1,98 @@
+import importlib.metadata
+import json
+import os
+import sys
+from importlib.machinery import PathFinder
+
+from import_customiser import bytecode_cache, import_trace
+from test_lazy_import import run
+
+
+def test_tracing_keeps_meta_path_finders_usable(tmp_path, monkeypatch):
+    (tmp_path / 'traced_target.py').write_text('VALUE = 1\n')
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setattr(sys, 'meta_path', list(sys.meta_path))
+    count = len(sys.meta_path)
+
+    import_trace.clear()
+    import_trace.enable_trace()
+    try:
+        assert len(sys.meta_path) == count
+        assert sys.meta_path.index(PathFinder) >= 0
+        assert importlib.metadata.version('pytest')
+        assert importlib.metadata.entry_points(group='console_scripts')
+
+        import traced_target
+        assert traced_target.VALUE == 1
+    finally:
+        import_trace.disable_trace()
+
+    assert PathFinder in sys.meta_path
+    assert not any(isinstance(finder, import_trace._TimingFinder) for finder in sys.meta_path)
+    assert any(event['name'] == 'find traced_target' for event in import_trace.trace_events())
+
+
+TYPES = '''\
+<types>
+	<type name="Even">
+		<set>
+			if value % 2: raise ValueError('Odd')
+		</set>
+	</type>
+</types>
+'''
+
+
+def test_trace_of_a_type_module(tmp_path):
+    schema = tmp_path / 'traced_types.type'
+    schema.write_text(TYPES)
+    trace, folded = tmp_path / 'trace.json', tmp_path / 'trace.folded'
+
+    # The trace is written at exit. The module is imported twice, first
+    # generating its code and then from the bytecode cache
+    run(tmp_path, f'''
+        import importlib, sys
+        import import_customiser
+        import_customiser.load(types=True, trace={str(trace)!r}, trace_folded={str(folded)!r})
+        import traced_types
+        del sys.modules['traced_types']
+        importlib.import_module('traced_types')
+    ''')
+
+    data = json.loads(trace.read_text())
+    miss, hit = [module for module in data['modules'] if module['module'] == 'traced_types']
+    assert (miss['cache'], hit['cache']) == ('miss', 'hit')
+    assert miss['bytes_read'] == len(TYPES)
+    assert hit['bytes_read'] == os.path.getsize(bytecode_cache.cache_from_source(str(schema)))
+    for stage in ('find', 'read', 'parse', 'generate', 'compile', 'exec'):
+        assert miss[f'{stage}_us'] > 0, stage
+    assert hit['parse_us'] == hit['generate_us'] == hit['compile_us'] == 0
+    assert hit['read_us'] > 0 and hit['exec_us'] > 0
+    assert miss['duration_us'] >= sum(miss[f'{stage}_us'] for stage in ('read', 'generate', 'exec'))
+
+    events = [event for event in data['traceEvents'] if event['ph'] == 'X']
+    assert {'traced_types', 'find traced_types', 'parse', 'generate', 'compile', 'exec'} <= {
+        event['name'] for event in events}
+    module_events = [event for event in events if event['name'] == 'traced_types']
+    assert [event['args']['cache'] for event in module_events] == ['miss', 'hit']
+
+    stacks = dict(line.rsplit(' ', 1) for line in folded.read_text().splitlines())
+    assert 'traced_types;generate;parse' in stacks
+    assert 'traced_types;exec' in stacks
+    assert all(int(value) > 0 for value in stacks.values())
+
+
+def test_only_the_latest_roots_are_kept():
+    import_trace.clear()
+    import_trace.enabled = True
+    try:
+        for i in range(import_trace.MAX_ROOTS + 5):
+            with import_trace.module(f'module{i}'):
+                pass
+    finally:
+        import_trace.enabled = False
+
+    modules = [module['module'] for module in import_trace.summary()]
+    assert len(modules) == import_trace.MAX_ROOTS
+    assert modules[0] == 'module5'
+    import_trace.clear()
@@ -0,0 +1,86 @@
+import json
+import os
+import pkgutil
+import sys
+
+import import_customiser
+from import_customiser import import_utils
+
+
+TYPE = b'''<types>
+	<type name="Checked">
+		<set>
+			if value is None:
+				raise TypeError('Expected a value')
+		</set>
+	</type>
+</types>
+'''
+
+
+def test_iter_modules_lists_python_and_custom_modules(tmp_path, monkeypatch):
+    import_customiser.load(types=True)
+    (tmp_path / 'plain.py').write_text('VALUE = 1\n')
+    (tmp_path / 'custom.type').write_bytes(TYPE)
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    names = {name for _, name, _ in pkgutil.iter_modules([str(tmp_path)])}
+    assert names == {'plain', 'custom'}
+
+    import custom
+    assert custom.Checked
+
+
+def test_iter_modules_still_lists_standard_modules():
+    import_customiser.load(types=True)
+    assert {'decoder', 'encoder', 'scanner', 'tool'} <= {name for _, name, _ in pkgutil.iter_modules(json.__path__)}
+    assert len(list(pkgutil.iter_modules(sys.path))) > 0
+
+
+def test_modules_shadow_directories_of_the_same_name(tmp_path, monkeypatch):
+    import_customiser.load(types=True)
+    (tmp_path / 'shadowed').mkdir()
+    (tmp_path / 'shadowed.type').write_bytes(TYPE)
+    (tmp_path / 'portion').mkdir()
+    monkeypatch.syspath_prepend(str(tmp_path))
+    try:
+        import shadowed
+        assert shadowed.__file__ == str(tmp_path / 'shadowed.type')
+        assert shadowed.Checked
+
+        # Without a module, the directory is still a namespace package
+        import portion
+        assert list(portion.__path__) == [str(tmp_path / 'portion')]
+    finally:
+        sys.modules.pop('shadowed', None)
+        sys.modules.pop('portion', None)
+
+
+def test_directory_listings_and_misses_are_cached(tmp_path, monkeypatch):
+    import_customiser.load(types=True)
+    listings = []
+
+    def listdir(path):
+        listings.append(path)
+        return os.listdir(path)
+
+    monkeypatch.setattr(import_utils, 'listdir', listdir)
+    finder = import_utils._path_hook(str(tmp_path))
+    (tmp_path / 'found.type').write_bytes(TYPE)
+    for name in ('found', 'missing', 'other', 'found'):
+        finder.find_spec(name)
+    assert finder.find_spec('found').origin == str(tmp_path / 'found.type')
+    assert listings == [str(tmp_path)]
+
+    # Misses are remembered even when the directory changes, until the caches
+    # are invalidated
+    (tmp_path / 'missing.type').write_bytes(TYPE)
+    st = tmp_path.stat()
+    os.utime(tmp_path, (st.st_atime, st.st_mtime + 10))
+    assert finder.find_spec('missing') is None
+    assert listings == [str(tmp_path)]
+
+    finder.invalidate_caches()
+    assert finder.find_spec('missing').origin == str(tmp_path / 'missing.type')
+    assert finder.find_spec('other') is None
+    assert listings == [str(tmp_path)] * 2
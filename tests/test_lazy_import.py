@@ -0,0 +1,74 @@
+import subprocess
+import sys
+from os.path import dirname
+from textwrap import dedent
+
+ROOT = dirname(dirname(__file__))
+
+
+def run(path, code):
+    # `load(lazy=True)` replaces `__import__` for the whole process
+    result = subprocess.run(
+        [sys.executable, '-c', dedent(code)], cwd=path, env={'PYTHONPATH': f'{ROOT}:{path}'},
+        capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    return result.stdout.split()
+
+
+def test_import_gives_modules(tmp_path):
+    (tmp_path / 'target.py').write_text('VALUE = 1\n')
+    (tmp_path / 'app.py').write_text(dedent('''\
+        from types import ModuleType
+        import target
+        for module in (__import__('fractions', fromlist=['']), __import__('target', globals(), None, ['VALUE'])):
+            print(isinstance(module, ModuleType), 'VALUE' in dir(module) or 'Fraction' in dir(module))
+    '''))
+    assert run(tmp_path, '''
+        import importlib
+        import import_customiser
+        import_customiser.load(lazy=True)
+        importlib.import_module('app')
+    ''') == ['True', 'True', 'True', 'True']
+
+
+def test_from_imports_stay_lazy(tmp_path):
+    (tmp_path / 'target.py').write_text('print("loaded")\ndef f():\n    return 1\n')
+    (tmp_path / 'app.py').write_text('from target import f\n')
+    assert run(tmp_path, '''
+        import import_customiser
+        import_customiser.load(lazy_from=True)
+        import app
+        print(type(vars(app)['f']).__name__)
+        print(app.f())
+    ''') == ['_LazyAttribute', 'loaded', '1']
+
+
+def test_lazy_module_runs_once_in_many_threads(tmp_path):
+    (tmp_path / 'slow.py').write_text(dedent('''\
+        import sys, time
+        sys.slow_runs = getattr(sys, 'slow_runs', 0) + 1
+        time.sleep(0.2)
+        VALUE = 1
+    '''))
+    assert run(tmp_path, '''
+        import sys, threading
+        import import_customiser
+        import_customiser.load(lazy=True)
+        import slow
+        barrier = threading.Barrier(16)
+        values, errors = [], []
+
+        def use():
+            barrier.wait()
+            try:
+                values.append(slow.VALUE)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=use) for _ in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        print(sys.slow_runs, len(values), sum(values), len(errors))
+    ''') == ['1', '16', '16', '0']
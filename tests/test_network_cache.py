@@ -0,0 +1,120 @@
+import json
+import os
+import threading
+import time
+from os import listdir
+
+import pytest
+
+from import_customiser import http_pool, network_cache
+from import_customiser.network_cache import NetworkCache, _write
+
+
+@pytest.fixture
+def served(tmp_path, module_server):
+    directory = tmp_path / 'served'
+    directory.mkdir()
+    for name in ('a', 'b', 'c'):
+        (directory / f'{name}.py').write_text(f'NAME = {name!r}\n' + '#' * 100 + '\n')
+    yield directory, module_server(directory)
+    http_pool.close_pools()
+
+
+def test_unchanged_files_are_revalidated(tmp_path, served):
+    directory, server = served
+    cache = NetworkCache(str(tmp_path / 'cache'))
+    url = server.url + 'a.py'
+    assert cache.fetch(url).startswith(b"NAME = 'a'")
+    assert cache.fetch(url).startswith(b"NAME = 'a'")
+    assert (cache.misses, cache.revalidated, cache.hits) == (1, 1, 0)
+
+    (directory / 'a.py').write_text('NAME = "changed"\n')
+    assert cache.fetch(url) == b'NAME = "changed"\n'
+    assert cache.misses == 2
+
+
+def test_fresh_entries_are_used_without_asking(tmp_path, served):
+    directory, server = served
+    cache = NetworkCache(str(tmp_path / 'cache'), max_age=3600)
+    url = server.url + 'a.py'
+    data = cache.fetch(url)
+    (directory / 'a.py').write_text('NAME = "changed"\n')
+    assert cache.fetch(url) == data
+    assert (cache.misses, cache.hits) == (1, 1)
+
+    # Even by another process, once the index is saved
+    cache.save()
+    later = NetworkCache(str(tmp_path / 'cache'), max_age=3600)
+    assert later.fetch(url) == data and later.hits == 1
+
+
+def test_least_recently_used_are_evicted(tmp_path, served):
+    _, server = served
+    cache = NetworkCache(str(tmp_path / 'cache'), max_age=3600, max_size=250)
+    for name in ('a', 'b', 'c', 'a'):
+        cache.fetch(server.url + f'{name}.py')
+        time.sleep(0.01)
+    cache.save()
+
+    with open(tmp_path / 'cache' / 'index.json') as f:
+        entries = json.load(f)['entries']
+    assert sorted(entries) == [server.url + 'a.py', server.url + 'c.py']
+    assert sorted(listdir(tmp_path / 'cache' / 'objects')) == sorted(entry['hash'] for entry in entries.values())
+
+
+def test_offline_fallback(tmp_path, served):
+    _, server = served
+    url = server.url + 'a.py'
+    online = NetworkCache(str(tmp_path / 'online'))
+    offline = NetworkCache(str(tmp_path / 'offline'), offline=True)
+    data = online.fetch(url)
+    assert offline.fetch(url) == data
+
+    server.shutdown()
+    server.server_close()
+    http_pool.close_pools()
+    with pytest.raises(ImportError):
+        online.fetch(url)
+    assert offline.fetch(url) == data
+    assert offline.hits == 1
+
+
+def test_compiled_code(tmp_path, served):
+    _, server = served
+    url = server.url + 'a.py'
+    cache = NetworkCache(str(tmp_path / 'cache'))
+    source = cache.fetch(url)
+    assert cache.get_code(url, source) is None
+
+    code = compile(source, url, 'exec')
+    cache.set_code(url, source, code, version=1)
+    assert cache.get_code(url, source, version=1) == code
+    assert cache.get_code(url, source, version=2) is None
+    assert cache.get_code(url, source + b'\n', version=1) is None
+    assert cache.get_code(server.url + 'b.py', source, version=1) is None
+
+    cache.save()
+    assert NetworkCache(str(tmp_path / 'cache')).get_code(url, source, version=1) == code
+
+
+def test_threads_writing_one_file(tmp_path, monkeypatch):
+    # Both threads have written their temporary file before either moves
+    # it into place, and neither write is lost
+    filename = str(tmp_path / 'object')
+    barrier = threading.Barrier(2)
+    replaced = []
+
+    def replace(source, target):
+        barrier.wait()
+        os.replace(source, target)
+        replaced.append(target)
+
+    monkeypatch.setattr(network_cache, 'replace', replace)
+    threads = [threading.Thread(target=_write, args=(filename, data)) for data in (b'a', b'b')]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert replaced == [filename, filename]
+    assert listdir(tmp_path) == ['object']
@@ -0,0 +1,84 @@
+import sys
+from io import BytesIO
+from zipfile import ZipFile
+
+import pytest
+
+from import_customiser import bytecode_cache, network_import
+from import_customiser.network_import import _url_hook, _UrlFinder, compile_pyc
+
+
+@pytest.fixture
+def served(tmp_path, module_server):
+    (tmp_path / 'bundled_mod.py').write_text('VALUE = 1\ndef function():\n    return VALUE\n')
+    return tmp_path, module_server(tmp_path)
+
+
+def test_modules_are_read_from_bundles(served, network_path, monkeypatch):
+    _, server = served
+    monkeypatch.setattr(network_import, 'use_bundles', True)
+    finder = _url_hook(server.url)
+    assert finder.bundle is not None and 'bundled_mod.py' in finder.filenames
+
+    network_path(server.url)
+    import bundled_mod
+    origin = server.url + 'bundled_mod.py'
+    assert bundled_mod.__spec__.loader_state.bundle is not None
+    assert bundled_mod.function() == 1
+    # Compiled without the URL, which is filled in
+    assert bundled_mod.function.__code__.co_filename == origin
+
+
+def test_manifests_are_used_without_a_bundle(served, network_path, monkeypatch):
+    _, server = served
+    monkeypatch.setattr(network_import, 'use_bundles', True)
+    monkeypatch.setattr(network_import, 'BUNDLE_NAME', 'missing.zip')
+    finder = _url_hook(server.url)
+    assert finder.bundle is None and 'bundled_mod.py' in finder.filenames
+
+    network_path(server.url)
+    import bundled_mod
+    assert bundled_mod.__spec__.loader_state.bundle is None
+    assert bundled_mod.VALUE == 1
+
+
+def bundle_finder(files):
+    data = BytesIO()
+    with ZipFile(data, 'w') as bundle:
+        for name, content in files.items():
+            bundle.writestr(name, content)
+    return _UrlFinder('http://example.invalid/', set(files), ZipFile(data))
+
+
+def test_stale_or_mismatched_bytecode_is_rejected():
+    old, new = b'VALUE = 1\n', b'VALUE = 2\n'
+    pyc = f'__pycache__/mod.py.{sys.implementation.cache_tag}.pyc'
+    origin = 'http://example.invalid/mod.py'
+
+    finder = bundle_finder({'mod.py': old, pyc: compile_pyc('mod.py', old)})
+    code = finder.bundled_code(origin, old)
+    assert code is not None and code.co_filename == origin
+    assert finder.bundled_code(origin, new) is None
+    assert finder.bundled_code(origin, old, version=1) is None
+
+    # For another version of Python, or without a checked hash
+    wrong_magic = b'\0\0\0\0' + compile_pyc('mod.py', old)[4:]
+    assert bundle_finder({pyc: wrong_magic}).bundled_code(origin, old) is None
+    unchecked = bytecode_cache.code_to_hash_pyc(compile(old, 'mod.py', 'exec'), old)
+    unchecked = unchecked[:4] + b'\1\0\0\0' + unchecked[8:]
+    assert bundle_finder({pyc: unchecked}).bundled_code(origin, old) is None
+    assert bundle_finder({'mod.py': old}).bundled_code(origin, old) is None
+
+
+def test_stale_bytecode_in_a_bundle_is_recompiled(tmp_path, module_server, network_path, monkeypatch):
+    pyc = f'__pycache__/stale_mod.py.{sys.implementation.cache_tag}.pyc'
+    with ZipFile(tmp_path / 'stale.zip', 'w') as bundle:
+        bundle.writestr('stale_mod.py', 'VALUE = 2\n')
+        bundle.writestr(pyc, compile_pyc('stale_mod.py', b'VALUE = 1\n'))
+
+    # The server builds its own bundles, so this one is served as a file
+    monkeypatch.setattr(network_import, 'use_bundles', True)
+    monkeypatch.setattr(network_import, 'BUNDLE_NAME', 'stale.zip')
+    network_path(module_server(tmp_path).url)
+    import stale_mod
+    assert stale_mod.VALUE == 2
@@ -0,0 +1,75 @@
+import asyncio
+import subprocess
+import sys
+import time
+
+from import_customiser.network_prefetch import GraphPrefetcher, imported_names
+
+from test_lazy_import import ROOT
+
+
+SOURCES = {
+    'a': b'import b\nfrom c import d\n',
+    'b': b'import missing\n',
+    'c': b'',
+    'c.d': b'VALUE = 1\n',
+}
+
+
+def prefetcher(fetch):
+    return GraphPrefetcher(fetch, lambda finder, name: f'mem://{name}.py' if name in SOURCES else None)
+
+
+def test_imported_names():
+    assert sorted(imported_names(SOURCES['a'])) == ['b', 'c', 'c.d']
+    assert list(imported_names(b'from . import x\nimport (')) == []
+
+
+def wait_for(urls, count):
+    # URLs are only claimed once the crawl reaches them
+    deadline = time.monotonic() + 10
+    while len(urls) < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_the_import_graph_is_fetched_once():
+    fetched = []
+
+    def fetch(url):
+        fetched.append(url)
+        return SOURCES[url[6:-3]]
+
+    graph = prefetcher(fetch)
+    graph.prefetch(None, SOURCES['a'])
+    wait_for(fetched, 3)
+    assert graph.take('mem://b.py') == SOURCES['b']
+    assert graph.take('mem://c.d.py') == SOURCES['c.d']
+    assert graph.take('mem://c.d.py') is None
+    assert graph.take('mem://a.py') is None
+    assert sorted(fetched) == ['mem://b.py', 'mem://c.d.py', 'mem://c.py']
+
+
+def test_failed_fetches_are_fetched_again():
+    tried = []
+
+    def fetch(url):
+        tried.append(url)
+        if url == 'mem://b.py':
+            raise asyncio.CancelledError()
+        raise ImportError(url)
+
+    graph = prefetcher(fetch)
+    graph.prefetch(None, SOURCES['a'])
+    wait_for(tried, 3)
+    assert graph.take('mem://b.py') is None
+    assert graph.take('mem://c.py') is None
+
+
+def test_asyncio_is_only_imported_to_prefetch():
+    result = subprocess.run([sys.executable, '-c', (
+        'import sys, import_customiser.network_import as n\n'
+        'print("asyncio" in sys.modules)\n'
+        'n.start_network_prefetch()\n'
+        'print("asyncio" in sys.modules)\n'
+    )], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert result.stdout.split() == ['False', 'True']
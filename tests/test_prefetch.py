@@ -0,0 +1,23 @@
+import json
+
+from test_lazy_import import run
+
+
+def test_profile_keeps_only_modules_used(tmp_path):
+    (tmp_path / 'used.py').write_text('VALUE = 1\n')
+    (tmp_path / 'unused.py').write_text('VALUE = 2\n')
+    profile = tmp_path / 'profile.json'
+
+    # Importing `prefetch` loads `lazy_import`, which replaces `__import__`,
+    # so it's only imported in the subprocess
+    assert run(tmp_path, f'''
+        import import_customiser
+        from import_customiser import prefetch
+        prefetch.save_profile({str(profile)!r}, ['used', 'unused'])
+        import_customiser.load(lazy=True, lazy_profile={str(profile)!r})
+        prefetch.prefetcher.join()
+        import used, unused
+        print(type(unused).__name__, used.VALUE)
+    ''') == ['_PrefetchedModule', '1']
+    names = json.loads(profile.read_text())['modules']
+    assert 'used' in names and 'unused' not in names
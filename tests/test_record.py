@@ -0,0 +1,73 @@
+import struct
+
+import pytest
+
+from import_customiser.record import RecordFile
+from import_customiser.struct import Struct
+from import_customiser.typed import Boolean, Bytes, Float, Integer, String
+
+
+class Native(Struct, layout='@'):
+    flag = Boolean()
+    count = Integer()
+    name = String(pack_format='8s')
+
+
+class Little(Struct, layout='<'):
+    flag = Boolean()
+    count = Integer()
+    data = Bytes(pack_format='4s')
+    weight = Float()
+
+
+def test_native_alignment():
+    record = Native(True, 7, 'abc')
+    data = record.to_bytes()
+    assert len(data) == struct.calcsize('@?q8s') > struct.calcsize('<?q8s')
+    assert repr(Native.from_bytes(data)) == "Native(True, 7, 'abc')"
+
+    view = Native.view(data)
+    assert (view.flag, view.count, view.name) == (True, 7, 'abc')
+    assert list(view) == [True, 7, 'abc']
+
+
+def test_round_trip_at_an_offset():
+    record = Little(False, -3, b'xy', 0.5)
+    data = b'pad' + record.to_bytes()
+    # Bytes keep the padding that fills their width
+    assert repr(Little.from_bytes(data, 3)) == repr(Little(False, -3, b'xy\0\0', 0.5))
+    assert list(Little.view(data, 3)) == [False, -3, b'xy\0\0', 0.5]
+
+
+def test_text_fields():
+    assert Native.from_bytes(Native(True, 1, '12345678').to_bytes()).name == '12345678'
+    assert Native.from_bytes(Native(True, 1, 'aaaaaaé').to_bytes()).name == 'aaaaaaé'
+    for text in ('123456789', 'aaaaaaaé'):
+        with pytest.raises(ValueError, match='name must be at most 8 bytes'):
+            Native(True, 1, text).to_bytes()
+    with pytest.raises(ValueError):
+        Little(True, 1, b'12345', 0.0).to_bytes()
+
+
+def test_record_file(tmp_path):
+    filename = str(tmp_path / 'records.bin')
+    RecordFile.write(filename, (Native(i % 2 == 0, i, f'n{i}') for i in range(5)))
+    with RecordFile(Native, filename) as records:
+        assert len(records) == 5
+        assert [record.count for record in records] == [0, 1, 2, 3, 4]
+        assert records[-1].name == 'n4'
+        assert records[-5].to_struct().count == 0
+        with pytest.raises(IndexError):
+            records[5]
+        with pytest.raises(IndexError):
+            records[-6]
+
+
+def test_empty_record_file(tmp_path):
+    filename = str(tmp_path / 'empty.bin')
+    RecordFile.write(filename, [])
+    with RecordFile(Native, filename) as records:
+        assert len(records) == 0
+        assert list(records) == []
+        with pytest.raises(IndexError):
+            records[-1]
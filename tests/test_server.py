@@ -0,0 +1,115 @@
+import gzip
+import sys
+from http.client import HTTPConnection
+from io import BytesIO
+from zipfile import ZipFile
+
+import pytest
+
+from import_customiser import bytecode_cache
+from import_customiser.import_utils import installed_importers
+
+
+TYPE = '''<types>
+	<type name="Checked">
+		<set>
+			if value is None:
+				raise TypeError('Expected a value')
+		</set>
+	</type>
+</types>
+'''
+
+
+@pytest.fixture
+def server(tmp_path, module_server, network_path):
+    # `network_path` installs the importers that compile `.type` files
+    (tmp_path / 'served.py').write_text('VALUE = 1\n' + '# padding\n' * 50)
+    (tmp_path / 'served_types.type').write_text(TYPE)
+    (tmp_path / '.env').write_text('SECRET=1\n')
+    return module_server(tmp_path)
+
+
+def get(server, path, headers=None):
+    conn = HTTPConnection('127.0.0.1', server.server_port, timeout=10)
+    conn.request('GET', path, headers=headers or {})
+    response = conn.getresponse()
+    body = response.read()
+    conn.close()
+    return response, body
+
+
+def test_modules_are_imported_from_the_server(server, network_path):
+    network_path(server.url)
+    import served
+    import served_types
+    assert served.VALUE == 1
+    assert served.__spec__.origin == server.url + 'served.py'
+    assert served_types.Checked
+
+
+def test_unchanged_responses_are_not_sent_again(server):
+    response, body = get(server, '/served.py')
+    etag = response.getheader('ETag')
+    assert response.status == 200 and etag
+    response, body = get(server, '/served.py', {'If-None-Match': etag})
+    assert (response.status, body) == (304, b'')
+    response, _ = get(server, '/served.py', {'If-None-Match': '"other"'})
+    assert response.status == 200
+
+
+def test_responses_are_compressed(server):
+    plain, body = get(server, '/served.py')
+    response, compressed = get(server, '/served.py', {'Accept-Encoding': 'gzip'})
+    assert response.getheader('Content-Encoding') == 'gzip'
+    assert gzip.decompress(compressed) == body
+    assert response.getheader('ETag') != plain.getheader('ETag')
+    response, _ = get(server, '/served.py', {'Accept-Encoding': 'gzip;q=0'})
+    assert response.getheader('Content-Encoding') is None
+
+
+def test_bytecode_is_served(server, tmp_path):
+    tag = sys.implementation.cache_tag
+    response, pyc = get(server, f'/__pycache__/served.py.{tag}.pyc')
+    assert response.status == 200
+    code = bytecode_cache.hash_pyc_to_code(pyc, (tmp_path / 'served.py').read_bytes())
+    namespace = {}
+    exec(code, namespace)
+    assert namespace['VALUE'] == 1
+
+    response, pyc = get(server, f'/__pycache__/served_types.type.{tag}.pyc')
+    version = installed_importers()['type'].cache_version
+    assert bytecode_cache.hash_pyc_to_code(pyc, TYPE.encode(), version) is not None
+    assert get(server, f'/__pycache__/missing.py.{tag}.pyc')[0].status == 404
+
+
+def test_bundles(server):
+    response, body = get(server, '/__bundle__.zip')
+    assert response.status == 200
+    names = ZipFile(BytesIO(body)).namelist()
+    tag = sys.implementation.cache_tag
+    assert {'served.py', 'served_types.type', f'__pycache__/served.py.{tag}.pyc'} <= set(names)
+
+
+def test_bundles_change_with_their_files(server, tmp_path):
+    response, _ = get(server, '/__bundle__.zip')
+    (tmp_path / 'added.py').write_text('ADDED = 1\n')
+    changed, body = get(server, '/__bundle__.zip', {'If-None-Match': response.getheader('ETag')})
+    assert changed.status == 200 and 'added.py' in ZipFile(BytesIO(body)).namelist()
+
+
+def test_hidden_files_are_not_served(server):
+    assert get(server, '/served.py')[0].status == 200
+    assert get(server, '/.env')[0].status == 404
+    assert get(server, '/%2Eenv')[0].status == 404
+    assert get(server, '/')[1].split() == [b'served.py', b'served_types.type']
+    assert '.env' not in ZipFile(BytesIO(get(server, '/__bundle__.zip')[1])).namelist()
+
+
+def test_imports_through_bundles(server, network_path, monkeypatch):
+    from import_customiser import network_import
+    monkeypatch.setattr(network_import, 'use_bundles', True)
+    network_path(server.url)
+    import served_types
+    assert served_types.__spec__.loader_state.bundle is not None
+    assert served_types.Checked
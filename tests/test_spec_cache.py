@@ -0,0 +1,25 @@
+import importlib.metadata
+import sys
+from importlib.machinery import PathFinder
+
+from import_customiser.spec_cache import _CachedPathFinder, install_spec_cache
+
+
+def test_distributions_are_still_found(tmp_path, monkeypatch):
+    monkeypatch.setattr(sys, 'meta_path', list(sys.meta_path))
+    install_spec_cache(str(tmp_path / 'specs.json'))
+    assert PathFinder not in sys.meta_path
+    assert any(isinstance(finder, _CachedPathFinder) for finder in sys.meta_path)
+
+    assert importlib.metadata.version('pytest')
+
+
+def test_modules_are_found_from_the_cache(tmp_path, monkeypatch):
+    (tmp_path / 'cached_target.py').write_text('VALUE = 1\n')
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setattr(sys, 'meta_path', list(sys.meta_path))
+    cache = install_spec_cache(str(tmp_path / 'specs.json'))
+
+    assert cache.find_spec('cached_target').origin == str(tmp_path / 'cached_target.py')
+    assert cache.find_spec('cached_target').origin == str(tmp_path / 'cached_target.py')
+    assert cache.hits == 1
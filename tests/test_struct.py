@@ -0,0 +1,126 @@
+import pytest
+
+from import_customiser.struct import Struct
+from import_customiser.typed import Integer, PositiveInteger, String
+
+
+@pytest.mark.parametrize('slots', [False, True])
+def test_fields_named_like_generated_code(slots):
+    class B(Struct, slots=slots):
+        instance = Integer()
+        x = PositiveInteger()
+        value = String()
+        self = Integer()
+
+    b = B(1, 2, 'a', 3)
+    assert (b.instance, b.x, b.value, b.self) == (1, 2, 'a', 3)
+    assert B(instance=1, x=2, value='a', self=3).instance == 1
+    b.instance = 4
+    assert b.instance == 4
+    with pytest.raises(ValueError):
+        B(1, 0, 'a', 3)
+    with pytest.raises(TypeError, match='Expected str'):
+        b.value = 1
+
+
+@pytest.mark.parametrize('slots', [False, True])
+def test_fields_named_like_names_validation_uses(slots):
+    class P(Struct, slots=slots):
+        type = String()
+
+    assert P('x').type == 'x'
+    with pytest.raises(TypeError, match='Expected str'):
+        P(1)
+
+
+class Point(Struct, slots=True):
+    x = Integer()
+    y = PositiveInteger()
+
+
+def test_slotted_fields_are_got_set_and_validated():
+    point = Point(1, 2)
+    assert (point.x, point.y) == (1, 2)
+    assert Point(y=3, x=-1).y == 3
+    assert Point.__slots__ == ('x', 'y')
+    assert not hasattr(point, '__dict__')
+    assert repr(point) == 'Point(1, 2)'
+
+    point.x = 5
+    assert point.x == 5
+    with pytest.raises(TypeError, match='Expected int'):
+        point.x = 'a'
+    with pytest.raises(ValueError):
+        point.y = 0
+    # Failed sets leave the old values
+    assert (point.x, point.y) == (5, 2)
+
+    with pytest.raises(ValueError):
+        Point(1, -2)
+    with pytest.raises(TypeError):
+        Point(1)
+
+
+def test_slotted_structures_have_no_other_attributes():
+    point = Point(1, 2)
+    with pytest.raises(AttributeError):
+        point.z = 1
+    with pytest.raises(AttributeError, match='Can\'t delete'):
+        del point.x
+    assert point.x == 1
+
+
+@pytest.mark.parametrize('slots', [False, True])
+def test_frozen_structures_are_hashable_values(slots):
+    class Money(Struct, slots=slots, frozen=True):
+        amount = Integer()
+        currency = String()
+
+    money = Money(1, 'GBP')
+    with pytest.raises(AttributeError, match='frozen Money'):
+        money.amount = 2
+    with pytest.raises(AttributeError, match='frozen Money'):
+        del money.amount
+    assert (money.amount, money.currency) == (1, 'GBP')
+
+    assert money == Money(1, 'GBP') and money is not Money(1, 'GBP')
+    assert money != Money(1, 'EUR')
+    assert len({money, Money(1, 'GBP'), Money(2, 'GBP')}) == 2
+    with pytest.raises(TypeError):
+        Money('1', 'GBP')
+
+    class Other(Struct, frozen=True):
+        amount = Integer()
+        currency = String()
+
+    assert money != Other(1, 'GBP')
+
+
+@pytest.mark.parametrize('slots', [False, True])
+def test_interned_structures_are_shared(slots):
+    class Currency(Struct, slots=slots, frozen=True, intern=True):
+        code = String()
+        digits = Integer()
+
+    gbp = Currency('GBP', 2)
+    assert Currency('GBP', 2) is gbp
+    assert Currency(code='GBP', digits=2) is gbp
+    assert Currency('JPY', 0) is not gbp
+    # Equal, but invalid
+    with pytest.raises(TypeError):
+        Currency('GBP', 2.0)
+
+    # Only while they're alive
+    assert len(Currency._interned) == 1
+    del gbp
+    assert len(Currency._interned) == 0
+
+
+def test_invalid_frozen_structures():
+    with pytest.raises(TypeError, match='Only frozen'):
+        class Interned(Struct, intern=True):
+            x = Integer()
+
+    with pytest.raises(TypeError, match='fields named isinstance'):
+        class Reserved(Struct, frozen=True):
+            isinstance = Integer()
@@ -0,0 +1,49 @@
+import pytest
+
+import import_customiser
+from import_customiser.struct_array import StructArray
+
+
+STRUCT = '''<structures>
+	<import src="import_customiser.types">
+		<alias name="Integer" />
+		<alias name="StrongFloat" />
+	</import>
+	<structure name="Sample">
+		<field name="count" type="Integer" />
+		<field name="weight" type="StrongFloat" />
+	</structure>
+</structures>
+'''
+
+
+@pytest.fixture
+def Sample(tmp_path, monkeypatch):
+    import_customiser.load(structs=True)
+    (tmp_path / 'array_target.struct').write_text(STRUCT)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    import array_target
+    return array_target.Sample
+
+
+def test_columns_are_checked_like_fields(Sample):
+    with pytest.raises(TypeError):
+        Sample(1, 1)
+    with pytest.raises(TypeError):
+        StructArray[Sample].from_rows([(1, 1)])
+    with pytest.raises(TypeError):
+        StructArray[Sample].from_columns({'count': [1], 'weight': (w for w in [1])})
+
+    samples = StructArray[Sample].from_rows([(1, 0.5)])
+    with pytest.raises(TypeError):
+        samples[0].weight = 2
+    samples[0].weight = 2.0
+    assert list(samples[0]) == [1, 2.0]
+
+
+def test_values_too_large_for_a_column(Sample):
+    assert Sample(2 ** 70, 0.5).count == 2 ** 70
+    with pytest.raises(ValueError):
+        StructArray[Sample].from_rows([(2 ** 70, 0.5)])
+    with pytest.raises(ValueError):
+        StructArray[Sample].from_rows([(1, 0.5)])[0].count = 2 ** 70
@@ -0,0 +1,79 @@
+import random
+import threading
+from types import ModuleType
+
+import pytest
+
+import import_customiser
+from import_customiser import bytecode_cache
+from import_customiser.struct_importer import StructImporter
+
+
+def test_lazy_structures_from_many_threads(tmp_path, monkeypatch):
+    import_customiser.load(structs=True)
+    monkeypatch.setattr(StructImporter, 'lazy', True)
+    names = [f'S{i}' for i in range(300)]
+    (tmp_path / 'lazy_structs_target.struct').write_text(
+        '<structures>\n'
+        '\t<import src="import_customiser.types"><alias name="Integer" /></import>\n'
+        + ''.join(f'\t<structure name="{name}"><field name="a" type="Integer" /></structure>\n' for name in names)
+        + '</structures>\n')
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    import lazy_structs_target
+    barrier = threading.Barrier(8)
+    errors, seen = [], []
+
+    def use() -> None:
+        order = random.sample(names, len(names))
+        barrier.wait()
+        try:
+            seen.append([getattr(lazy_structs_target, name) for name in order])
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=use) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    classes = {name: getattr(lazy_structs_target, name) for name in names}
+    assert all(cls is classes[cls.__name__] for found in seen for cls in found)
+    assert set(names) <= set(dir(lazy_structs_target))
+
+
+def test_streamed_structures_match_whole_ones(tmp_path, monkeypatch):
+    import_customiser.load(structs=True)
+    monkeypatch.setattr(bytecode_cache, 'mode', 'off')
+    path = tmp_path / 'streamed_structs.struct'
+    path.write_text(
+        '<structures>\n'
+        '\t<import src="import_customiser.types">\n'
+        '\t\t<alias name="Integer" />\n'
+        '\t\t<alias name="String" />\n'
+        '\t</import>\n'
+        '\t<!-- Between the elements -->\n'
+        '\t<structure name="Point">\n'
+        '\t\t<field name="x" type="Integer" />\n'
+        '\t\t<field name="y" type="Integer" />\n'
+        '\t</structure>\n'
+        '\t<structure name="Label"><field name="text" type="String" /></structure>\n'
+        '</structures>\n')
+
+    modules = []
+    for streaming in (False, True):
+        monkeypatch.setattr(StructImporter, 'streaming', streaming)
+        module = StructImporter.populate_module(ModuleType('streamed_structs'), str(path))
+        modules.append(module)
+        assert (module.Point(1, 2).y, module.Label('a').text) == (2, 'a')
+        with pytest.raises(TypeError):
+            module.Point('1', 2)
+
+    whole, streamed = (
+        {name: (list(cls._descriptors), cls.__init__.__code__.co_filename, cls.__init__.__code__.co_firstlineno)
+         for name, cls in vars(module).items() if getattr(cls, '__module__', None) == module.__name__}
+        for module in modules)
+    assert whole == streamed
+    assert list(whole) == ['Point', 'Label']
@@ -0,0 +1,71 @@
+import pickle
+
+import pytest
+
+from import_customiser.struct import Struct, StructBatch
+from import_customiser.typed import Integer, PositiveInteger, String
+
+
+class Trade(Struct):
+    id = PositiveInteger()
+    symbol = String()
+
+
+class SlottedTrade(Struct, slots=True):
+    id = PositiveInteger()
+    symbol = String()
+
+
+class Empty(Struct):
+    pass
+
+
+class Currency(Struct, frozen=True, intern=True):
+    code = String()
+    digits = Integer()
+
+
+def round_trip(value):
+    return pickle.loads(pickle.dumps(value))
+
+
+@pytest.mark.parametrize('cls', [Trade, SlottedTrade])
+def test_structs(cls):
+    trade = round_trip(cls(1, 'ABC'))
+    assert type(trade) is cls and (trade.id, trade.symbol) == (1, 'ABC')
+
+
+@pytest.mark.parametrize('cls', [Trade, SlottedTrade])
+@pytest.mark.parametrize('trusted', [False, True])
+def test_batches(cls, trusted):
+    batch = round_trip(StructBatch([cls(i, f'S{i}') for i in range(1, 4)], trusted))
+    assert type(batch) is StructBatch and batch.trusted is trusted
+    assert [(trade.id, trade.symbol) for trade in batch] == [(1, 'S1'), (2, 'S2'), (3, 'S3')]
+    assert len(round_trip(StructBatch(trusted=trusted))) == 0
+
+
+def test_batches_of_structs_without_fields():
+    for trusted in (False, True):
+        batch = round_trip(StructBatch([Empty(), Empty()], trusted))
+        assert [type(empty) for empty in batch] == [Empty, Empty]
+
+
+def test_only_trusted_batches_skip_validation():
+    invalid = StructBatch([Trade._from_unchecked(-1, 'ABC')])
+    with pytest.raises(ValueError):
+        round_trip(invalid)
+    invalid.trusted = True
+    assert round_trip(invalid)[0].id == -1
+
+
+def test_batches_of_one_class():
+    with pytest.raises(TypeError):
+        pickle.dumps(StructBatch([Trade(1, 'A'), SlottedTrade(1, 'A')]))
+
+
+@pytest.mark.parametrize('trusted', [False, True])
+def test_interned_structs(trusted):
+    usd = Currency('USD', 2)
+    assert round_trip(usd) is usd
+    batch = round_trip(StructBatch([usd, Currency('JPY', 0)], trusted))
+    assert batch[0] is usd and batch[1] is Currency('JPY', 0)
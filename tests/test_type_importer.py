@@ -0,0 +1,158 @@
+import os
+import sys
+import traceback
+from types import FunctionType, ModuleType
+
+import pytest
+
+import import_customiser
+from import_customiser import bytecode_cache
+from import_customiser.descriptor import SchemaCode
+from import_customiser.struct import Struct
+from import_customiser.struct_importer import StructImporter
+from import_customiser.type_importer import TypeImporter
+from import_customiser.typed import Integer
+
+TYPES = '''\
+<types>
+	<type name="Even">
+		<set>
+			if value % 2:
+				raise ValueError('Odd')
+		</set>
+	</type>
+
+	<type name="Short">
+		<set>
+			if len(value) &gt; 2: raise ValueError('Too long')
+		</set>
+		<column>
+			if max(map(len, column)) &gt; 2:
+				raise ValueError('Too long')
+		</column>
+	</type>
+</types>
+'''
+EVEN_LINE = 5
+SHORT_LINE = 11
+COLUMN_LINE = 15
+
+
+@pytest.fixture(params=[False, True], ids=['whole', 'streamed'])
+def schema(request, tmp_path, monkeypatch):
+    '''Import `TYPES` as `schema_types`, with the file's path
+    '''
+
+    import_customiser.load(structs=True)
+    monkeypatch.setattr(TypeImporter, 'streaming', request.param)
+    monkeypatch.setattr(StructImporter, 'streaming', request.param)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    path = tmp_path / 'schema_types.type'
+    path.write_text(TYPES)
+    yield path
+    for name in ('schema_types', 'schema_structs'):
+        sys.modules.pop(name, None)
+
+
+def where(error):
+    frame = traceback.extract_tb(error.__traceback__)[-1]
+    return frame.filename, frame.lineno, frame.line
+
+
+def test_set_code_is_on_its_lines(schema):
+    import schema_types
+
+    class Holder:
+        even = schema_types.Even('even')
+        short = schema_types.Short('short')
+
+    with pytest.raises(ValueError) as error:
+        Holder().even = 1
+    assert where(error.value) == (str(schema), EVEN_LINE, "raise ValueError('Odd')")
+
+    with pytest.raises(ValueError) as error:
+        Holder().short = 'abc'
+    assert where(error.value)[:2] == (str(schema), SHORT_LINE)
+
+
+def test_column_code_is_on_its_lines(schema):
+    import schema_types
+
+    # Checked value by value, with the set code
+    with pytest.raises(ValueError) as error:
+        schema_types.Even('even').check_column([2, 3])
+    assert where(error.value)[:2] == (str(schema), EVEN_LINE)
+
+    with pytest.raises(ValueError) as error:
+        schema_types.Short('short').check_column(['a', 'abc'])
+    assert where(error.value)[:2] == (str(schema), COLUMN_LINE)
+
+
+@pytest.mark.parametrize('slots', [False, True])
+def test_struct_methods_are_on_the_set_code_lines(schema, slots):
+    import schema_types
+
+    class Pair(Struct, slots=slots):
+        even = schema_types.Even()
+        short = schema_types.Short()
+
+    with pytest.raises(ValueError) as error:
+        Pair(1, 'a')
+    assert where(error.value)[:2] == (str(schema), EVEN_LINE)
+
+    pair = Pair(2, 'a')
+    with pytest.raises(ValueError) as error:
+        pair.short = 'abc'
+    assert where(error.value)[:2] == (str(schema), SHORT_LINE)
+
+
+def test_struct_file_methods_are_on_the_set_code_lines(schema):
+    (schema.parent / 'schema_structs.struct').write_text(
+        '<structures>\n'
+        '\t<import src="schema_types"><alias name="Even" /></import>\n'
+        '\t<structure name="Count"><field name="n" type="Even" /></structure>\n'
+        '</structures>\n')
+    import schema_structs
+
+    with pytest.raises(ValueError) as error:
+        schema_structs.Count(1)
+    assert where(error.value)[:2] == (str(schema), EVEN_LINE)
+
+
+def test_methods_without_schema_code_are_on_the_class_line():
+    class Plain(Struct):
+        # Named like a name the descriptor's code uses, so __init__ isn't fused
+        isinstance = Integer()
+
+    line = Plain.__init__.__code__.co_firstlineno
+    assert Plain.__init__.__code__.co_filename == __file__
+    assert line == test_methods_without_schema_code_are_on_the_class_line.__code__.co_firstlineno + 1
+
+
+def summary(value):
+    '''What a generated class defines, comparably
+    '''
+
+    if isinstance(value, SchemaCode):
+        return 'SchemaCode', value.filename, value.lineno, value.lines
+    if isinstance(value, FunctionType):
+        code = value.__code__
+        return 'function', code.co_filename, code.co_firstlineno, code.co_varnames, value.__defaults__, value.__kwdefaults__
+    return value
+
+
+def test_streamed_types_match_whole_ones(monkeypatch):
+    import_customiser.load(structs=True)
+    filename = os.path.join(os.path.dirname(import_customiser.__file__), 'types.type')
+    monkeypatch.setattr(bytecode_cache, 'mode', 'off')
+    modules = []
+    for streaming in (False, True):
+        monkeypatch.setattr(TypeImporter, 'streaming', streaming)
+        module = TypeImporter.populate_module(ModuleType('import_customiser.types'), filename)
+        modules.append({
+            name: ([base.__name__ for base in cls.__bases__], {key: summary(value) for key, value in vars(cls).items()})
+            for name, cls in vars(module).items() if getattr(cls, '__module__', None) == module.__name__})
+
+    assert modules[0] == modules[1]
+    assert modules[0]['Integer'][0] == ['Number']
+    assert len(modules[0]) > 20
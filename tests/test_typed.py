@@ -0,0 +1,158 @@
+import sys
+from array import array
+
+import pytest
+
+import import_customiser
+from import_customiser import typed
+
+ACCEPTS = [
+    (typed.Typed, {}, [object(), 1, 'a']),
+    (typed.Number, {}, [1, 1.5, -2]),
+    (typed.Integer, {}, [0, -3, 2 ** 70]),
+    (typed.Float, {}, [1.5, 2]),
+    (typed.Boolean, {}, [True, False]),
+    (typed.String, {}, ['', 'a']),
+    (typed.Bytes, {}, [b'', b'a']),
+    (typed.Sized, {'minlen': 1, 'maxlen': 2}, ['a', [1, 2], b'ab']),
+    (typed.Range, {'min': 1, 'max': 3}, [1, 2.5, 3]),
+    (typed.Regex, {'pattern': r'\d+$'}, ['1', '123']),
+    (typed.OneOf, {'allowed': 'ab'}, ['a', 'b']),
+    (typed.Positive, {}, [1, 0.5]),
+    (typed.Negative, {}, [-1, -0.5]),
+    (typed.NonNegative, {}, [0, 1]),
+    (typed.NonPositive, {}, [0, -1]),
+    (typed.NonZero, {}, [1, -1]),
+    (typed.PositiveInteger, {}, [1]),
+    (typed.NegativeInteger, {}, [-1]),
+    (typed.NonNegativeInteger, {}, [0]),
+    (typed.NonPositiveInteger, {}, [0]),
+    (typed.NonZeroInteger, {}, [-1]),
+    (typed.RangeInteger, {'min': 0, 'max': 9}, [0, 9]),
+    (typed.PositiveFloat, {}, [0.5]),
+    (typed.NegativeFloat, {}, [-0.5]),
+    (typed.NonNegativeFloat, {}, [0.0]),
+    (typed.NonPositiveFloat, {}, [0.0]),
+    (typed.NonZeroFloat, {}, [0.5]),
+    (typed.RangeFloat, {'min': 0.5, 'max': 1.5}, [0.5, 1]),
+    (typed.SizedString, {'maxlen': 2}, ['ab']),
+    (typed.RegexString, {'pattern': '[a-z]+$'}, ['ab']),
+    (typed.SizedRegexString, {'maxlen': 2, 'pattern': '[a-z]+$'}, ['ab']),
+    (typed.OneOfString, {'allowed': ['x', 'y']}, ['x']),
+    (typed.SizedBytes, {'minlen': 1}, [b'a']),
+]
+ACCEPTS_BY_CLASS = {cls: values for cls, _, values in ACCEPTS}
+
+REJECTS = [
+    (typed.Number, {}, [(1j, TypeError), ('1', TypeError), (True, TypeError)]),
+    (typed.Integer, {}, [(1.0, TypeError), (True, TypeError), (False, TypeError)]),
+    (typed.Float, {}, [('1', TypeError), (True, TypeError)]),
+    (typed.Boolean, {}, [(1, TypeError)]),
+    (typed.String, {}, [(b'a', TypeError)]),
+    (typed.Bytes, {}, [('a', TypeError)]),
+    (typed.Sized, {'minlen': 1, 'maxlen': 2}, [('', ValueError), ('abc', ValueError)]),
+    (typed.Range, {'min': 1, 'max': 3}, [(0, ValueError), (3.5, ValueError)]),
+    (typed.Regex, {'pattern': r'\d+$'}, [('a1', ValueError)]),
+    (typed.OneOf, {'allowed': 'ab'}, [('c', ValueError)]),
+    (typed.Positive, {}, [(0, ValueError)]),
+    (typed.Negative, {}, [(0, ValueError)]),
+    (typed.NonNegative, {}, [(-1, ValueError)]),
+    (typed.NonPositive, {}, [(1, ValueError)]),
+    (typed.NonZero, {}, [(0, ValueError)]),
+    (typed.PositiveInteger, {}, [(0, ValueError), (1.0, TypeError), (True, TypeError)]),
+    (typed.NonNegativeInteger, {}, [(False, TypeError)]),
+    (typed.RangeInteger, {'min': 0, 'max': 9}, [(10, ValueError)]),
+    (typed.PositiveFloat, {}, [(-0.5, ValueError)]),
+    (typed.SizedString, {'maxlen': 2}, [('abc', ValueError), (b'a', TypeError)]),
+    (typed.SizedRegexString, {'maxlen': 2, 'pattern': '[a-z]+$'}, [('abc', ValueError), ('A', ValueError)]),
+    (typed.OneOfString, {'allowed': ['x', 'y']}, [('z', ValueError)]),
+    (typed.SizedBytes, {'minlen': 1}, [(b'', ValueError)]),
+]
+
+
+def holder(cls, kwargs):
+    class Holder:
+        value = cls('value', **kwargs)
+    return Holder
+
+
+@pytest.mark.parametrize('cls, kwargs, values', ACCEPTS, ids=[c.__name__ for c, _, _ in ACCEPTS])
+def test_valid_values_are_set(cls, kwargs, values):
+    Holder = holder(cls, kwargs)
+    for value in values:
+        instance = Holder()
+        instance.value = value
+        assert instance.value is value
+    Holder.value.check_column(values)
+
+
+@pytest.mark.parametrize('cls, kwargs, values', REJECTS, ids=[c.__name__ for c, _, _ in REJECTS])
+def test_invalid_values_are_refused(cls, kwargs, values):
+    Holder = holder(cls, kwargs)
+    for value, error in values:
+        with pytest.raises(error):
+            Holder().value = value
+        with pytest.raises(error):
+            Holder.value.check_column([*ACCEPTS_BY_CLASS.get(cls, []), value])
+
+
+def test_columns_of_arrays():
+    integer = typed.Integer('value')
+    integer.check_column(array('q', [1, 2]))
+    with pytest.raises(TypeError):
+        integer.check_column(array('d', [1.0]))
+
+    positive = typed.PositiveInteger('value')
+    with pytest.raises(ValueError, match='got 0'):
+        positive.check_column(array('q', [3, 0]))
+
+
+def test_constants_are_bound_into_structures():
+    from import_customiser.struct import Struct
+
+    class Tag(Struct, slots=True):
+        name = typed.SizedRegexString(maxlen=3, pattern='[a-z]+$')
+
+    tag = Tag('ab')
+    # Bound when the class was made
+    Tag._descriptors['name'].maxlen = 1
+    tag.name = 'abc'
+    with pytest.raises(ValueError, match='length <= 3'):
+        tag.name = 'abcd'
+
+
+def test_types_in_a_struct_file(tmp_path, monkeypatch):
+    import_customiser.load(structs=True)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    (tmp_path / 'typed_structs.struct').write_text('''\
+<structures>
+	<import src="import_customiser.typed">
+		<alias name="PositiveInteger" />
+		<alias name="SizedRegexString" />
+		<alias name="OneOfString" />
+		<alias name="RangeFloat" />
+	</import>
+	<structure name="User">
+		<field name="id" type="PositiveInteger" />
+		<field name="email" type="SizedRegexString" maxlen="20" pattern="r'[^@]+@[^@]+$'" />
+		<field name="role" type="OneOfString" allowed="('admin', 'user')" />
+		<field name="score" type="RangeFloat" min="0" max="1" />
+	</structure>
+</structures>
+''')
+    try:
+        from typed_structs import User
+
+        user = User(1, 'a@b', 'user', 0.5)
+        assert (user.id, user.email, user.role, user.score) == (1, 'a@b', 'user', 0.5)
+        for args, error in [
+                ((0, 'a@b', 'user', 0.5), ValueError),
+                ((True, 'a@b', 'user', 0.5), TypeError),
+                ((1, 'ab', 'user', 0.5), ValueError),
+                ((1, 'a@b' * 10, 'user', 0.5), ValueError),
+                ((1, 'a@b', 'root', 0.5), ValueError),
+                ((1, 'a@b', 'user', 1.5), ValueError)]:
+            with pytest.raises(error):
+                User(*args)
+    finally:
+        sys.modules.pop('typed_structs', None)